@@ -0,0 +1,648 @@
+"""
+Query backends for explore_db.py: the PostgreSQL warehouse, or an embedded
+DuckDB database built straight from the data/ CSV extracts.
+
+    postgres  the database in secret.py (or NORTHWIND_DATABASE_URL) loaded by
+              etl_northwind.py, read through db.py's pooled engine, the
+              schema catalog, query_cache and query_library's prepared
+              statements
+    duckdb    an in-process DuckDB database: no server and no ETL load
+
+The console, the Tables browser, the Analytics panels, the Saved Queries
+view and the SQL Runner all go through the same few methods, so either
+backend serves every view except the EXPLAIN ANALYZE profiler, which is
+PostgreSQL-only.
+
+DuckDBBackend reads the four CSVs with DuckDB's parallel CSV reader, typed
+by northwind_schema.py. With parquet=True (or NORTHWIND_DUCKDB_PARQUET=1)
+each CSV is converted once to a Parquet file under .cache/parquet, keyed
+by the CSV's content digest, and later backends read that instead. It then
+builds the star schema, customer_segments, sales_cube, customer_order_summary,
+monthly_sales and monthly_sales_summary with the same SQL as the PostgreSQL
+side, so the sql_script/ queries and the cube slices run unchanged. Surrogate keys are
+the natural ids. Queries run vectorized on NORTHWIND_DUCKDB_THREADS threads
+(default: every CPU) and their results are not cached: the data cannot
+change under a backend.
+
+NORTHWIND_BACKEND picks the dashboard's default backend (postgres). To time
+the same queries on both:
+    python backends.py compare [--runs 20] [--data-dir data] [--json out.json]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+try:
+    import duckdb
+except ImportError:  # Only the DuckDB backend needs it.
+    duckdb = None
+
+import create_views
+import csv_cache
+import db
+import metrics
+from mylogger import logger
+import northwind_schema
+import query_library
+import rollup
+import schema_catalog
+import segmentation
+import sql_runner
+import table_browser
+
+BACKENDS = ("postgres", "duckdb")
+
+DEFAULT_BACKEND = os.environ.get("NORTHWIND_BACKEND", "postgres")
+
+DATA_DIR = os.environ.get("NORTHWIND_DUCKDB_DATA", "data")
+PARQUET_DIR = os.environ.get("NORTHWIND_PARQUET_DIR", os.path.join(".cache", "parquet"))
+USE_PARQUET = os.environ.get("NORTHWIND_DUCKDB_PARQUET") == "1"
+THREADS = int(os.environ.get("NORTHWIND_DUCKDB_THREADS", "0")) or os.cpu_count()
+
+# Star schema, built from the raw tables with the natural ids as keys.
+DUCKDB_STAR_SCHEMA = {
+    "dim_date": """
+    CREATE TABLE public.dim_date AS
+    SELECT
+      (EXTRACT(YEAR FROM d) * 10000 + EXTRACT(MONTH FROM d) * 100 + EXTRACT(DAY FROM d))::int
+        AS date_key,
+      d::date AS full_date,
+      EXTRACT(YEAR FROM d)::smallint AS year,
+      EXTRACT(QUARTER FROM d)::smallint AS quarter,
+      EXTRACT(MONTH FROM d)::smallint AS month,
+      DATE_TRUNC('month', d)::date AS month_start,
+      EXTRACT(DAY FROM d)::smallint AS day,
+      EXTRACT(ISODOW FROM d)::smallint AS day_of_week,
+      EXTRACT(ISODOW FROM d) >= 6 AS is_weekend
+    FROM generate_series(
+      (SELECT MIN(order_date) FROM public.orders)::timestamp,
+      (SELECT MAX(order_date) FROM public.orders)::timestamp,
+      INTERVAL '1 day'
+    ) AS g(d)
+    """,
+    "dim_customer": """
+    CREATE TABLE public.dim_customer AS
+    SELECT customer_id AS customer_key, customer_id, name, email, registration_date
+    FROM public.customers
+    """,
+    "dim_product": """
+    CREATE TABLE public.dim_product AS
+    SELECT product_id AS product_key, product_id, name, category, price
+    FROM public.products
+    """,
+    "fact_orders": """
+    CREATE TABLE public.fact_orders AS
+    SELECT
+      o.order_id,
+      (EXTRACT(YEAR FROM o.order_date) * 10000
+        + EXTRACT(MONTH FROM o.order_date) * 100
+        + EXTRACT(DAY FROM o.order_date))::int AS date_key,
+      o.customer_id AS customer_key,
+      o.total_amount
+    FROM public.orders o
+    JOIN public.customers c ON c.customer_id = o.customer_id
+    """,
+    "fact_order_lines": """
+    CREATE TABLE public.fact_order_lines AS
+    SELECT
+      od.order_item_id,
+      od.order_id,
+      (EXTRACT(YEAR FROM o.order_date) * 10000
+        + EXTRACT(MONTH FROM o.order_date) * 100
+        + EXTRACT(DAY FROM o.order_date))::int AS date_key,
+      o.customer_id AS customer_key,
+      od.product_id AS product_key,
+      od.quantity,
+      od.price_at_order AS unit_price,
+      CAST(od.quantity * od.price_at_order AS DECIMAL(14, 2)) AS line_revenue
+    FROM public.order_details od
+    JOIN public.orders o ON o.order_id = od.order_id
+    JOIN public.customers c ON c.customer_id = o.customer_id
+    JOIN public.products p ON p.product_id = od.product_id
+    """,
+}
+
+# DuckDB tables have no declared keys; these drive the table browser's
+# keyset pagination as the PostgreSQL primary keys do.
+PRIMARY_KEYS = {
+    **{table: [spec["primary_key"]] for table, spec in northwind_schema.TABLES.items()},
+    "dim_date": ["date_key"],
+    "dim_customer": ["customer_key"],
+    "dim_product": ["product_key"],
+    "fact_orders": ["order_id"],
+    "fact_order_lines": ["order_item_id"],
+    segmentation.SEGMENT_TABLE: ["customer_key"],
+    create_views.MONTHLY_SUMMARY_TABLE: ["month"],
+}
+
+# Stored as tables in DuckDB but listed with their PostgreSQL kind.
+MATERIALIZED_VIEWS = ("monthly_sales",)
+
+_DUCKDB_RELATIONS = """
+SELECT table_name, 'table', estimated_size FROM duckdb_tables()
+WHERE schema_name = 'public'
+UNION ALL
+SELECT view_name, 'view', NULL FROM duckdb_views()
+WHERE schema_name = 'public' AND NOT internal
+ORDER BY 1
+"""
+
+_DUCKDB_COLUMNS = """
+SELECT table_name, column_name, data_type, is_nullable FROM duckdb_columns()
+WHERE schema_name = 'public'
+ORDER BY table_name, column_index
+"""
+
+# Queries timed by `compare` besides the sql_script/ queries and cube slices.
+ANALYTIC_QUERIES = {
+    "views/customer_order_summary": """
+        SELECT * FROM customer_order_summary
+        ORDER BY total_sales DESC, customer_id LIMIT 20
+    """,
+    "scan/revenue_by_category_year": """
+        SELECT p.category, d.year, COUNT(DISTINCT f.order_id) AS orders_count,
+               SUM(f.quantity) AS units, SUM(f.line_revenue) AS revenue
+        FROM fact_order_lines f
+        JOIN dim_product p ON p.product_key = f.product_key
+        JOIN dim_date d ON d.date_key = f.date_key
+        GROUP BY p.category, d.year
+        ORDER BY p.category, d.year
+    """,
+    "scan/order_details_by_product": """
+        SELECT product_id, COUNT(*) AS lines, SUM(quantity) AS units,
+               AVG(price_at_order) AS avg_price
+        FROM order_details
+        GROUP BY product_id
+        ORDER BY product_id
+    """,
+}
+
+DEFAULT_RUNS = 20
+
+
+def available():
+    """Return True if duckdb is installed and the DuckDB backend can be used."""
+    return duckdb is not None
+
+
+class PostgresBackend:
+    """The PostgreSQL warehouse, through the pooled engine and its caches."""
+
+    name = "postgres"
+    can_profile = True
+
+    def __init__(self, engine=None):
+        self.engine = engine if engine is not None else db.get_engine()
+
+    def table_names(self, kinds=schema_catalog.TABLE_KINDS):
+        return schema_catalog.table_names(self.engine, kinds)
+
+    def table_info(self, table_name):
+        return schema_catalog.table_info(self.engine, table_name)
+
+    def table_browser(self, table_name, **options):
+        return table_browser.TableBrowser(self.engine, table_name, **options)
+
+    def query(self, sql, params=None):
+        """Run one statement with :name parameters and return a DataFrame."""
+        with self.engine.connect() as conn:
+            result = conn.execute(text(sql), params or {})
+            df = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+            conn.rollback()
+        return df
+
+    def run_named(self, name, params=None, cache=True):
+        return query_library.run(self.engine, name, params, cache)
+
+    def run_batch(self, requests, cache=True):
+        return query_library.run_batch(self.engine, requests, cache)
+
+    def query_cube(self, by=(), filters=None):
+        return rollup.query_cube(self.engine, by, filters)
+
+    def segment_counts(self):
+        return segmentation.segment_counts(self.engine)
+
+    def query_run(self, sql, **options):
+        """Return a SQL Runner QueryRun for `sql`, not yet started."""
+        return sql_runner.QueryRun(self.engine, sql, **options)
+
+    def describe(self):
+        return f"PostgreSQL ({self.engine.url.render_as_string(hide_password=True)})"
+
+
+class DuckDBQueryRun(sql_runner.QueryRun):
+    """
+    A SQL Runner statement on the DuckDB backend. Rows are fetched one
+    vector chunk at a time under the same row and memory limits; a timer
+    interrupts the statement at the timeout, and cancel() interrupts it
+    directly. The statement runs in a transaction that is rolled back.
+    """
+
+    def __init__(self, backend, sql, **options):
+        super().__init__(None, sql, **options)
+        self.backend = backend
+        self._cursor = None
+        self._timed_out = threading.Event()
+
+    def _on_timeout(self):
+        self._timed_out.set()
+        self._cursor.interrupt()
+
+    def _run(self):
+        cursor = self._cursor = self.backend.cursor()
+        timer = threading.Timer(self.timeout_ms / 1000, self._on_timeout)
+        timer.daemon = True
+        try:
+            cursor.execute("BEGIN")
+            timer.start()
+            cursor.execute(self.sql)
+            names = [column[0] for column in cursor.description or []]
+            # Statements without rows report their row count in one Count column.
+            if sql_runner.returns_cursor_rows(self.sql) or names not in ([], ["Count"]):
+                self.columns = names
+                while True:
+                    df = cursor.fetch_df_chunk()
+                    if df.empty or not self._keep(df):
+                        break
+            elif names:
+                row = cursor.fetchone()
+                self.rowcount = row[0] if row else None
+            self.status = "cancelled" if self._cancel_requested.is_set() else "done"
+        except Exception as e:
+            if isinstance(e, duckdb.InterruptException):
+                self.status = (
+                    "timeout"
+                    if self._timed_out.is_set() and not self._cancel_requested.is_set()
+                    else "cancelled"
+                )
+            else:
+                self.status = "error"
+            self.error = e
+        finally:
+            timer.cancel()
+            try:
+                cursor.execute("ROLLBACK")
+            except duckdb.Error:
+                pass
+            cursor.close()
+            self.finished = time.monotonic()
+
+    def cancel(self):
+        """Interrupt the statement; fetching also stops at the next chunk."""
+        self._cancel_requested.set()
+        if self.running and self._cursor is not None:
+            self._cursor.interrupt()
+
+
+class DuckDBTableBrowser(table_browser.TableBrowser):
+    """TableBrowser paging through a table of the DuckDB backend."""
+
+    def __init__(self, backend, table_name, **options):
+        super().__init__(
+            None, table_name, info=backend.table_info(table_name), **options
+        )
+        self.backend = backend
+
+    def _fetch_rows(self, sql, params):
+        cursor = self.backend.cursor()
+        try:
+            cursor.execute(_dollar_sql(sql), params)
+            return [column[0] for column in cursor.description], cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+def _dollar_sql(sql):
+    """Rewrite :name placeholders as DuckDB's $name."""
+    return query_library.Query("sql", sql).dollar_sql()
+
+
+def _read_csv_sql(path, table_name):
+    columns = northwind_schema.TABLES[table_name]["columns"]
+    types = ", ".join(
+        f"'{col}': '{sql_type}'" for col, (_, sql_type) in columns.items()
+    )
+    return f"read_csv('{path}', header = true, columns = {{{types}}})"
+
+
+class DuckDBBackend:
+    """
+    An in-memory DuckDB database holding the raw tables of `data_dir` and
+    the model built from them. One backend can serve several threads: each
+    operation runs on its own cursor over the shared database.
+    """
+
+    name = "duckdb"
+    can_profile = False
+
+    def __init__(self, data_dir=DATA_DIR, parquet=USE_PARQUET, threads=THREADS):
+        if duckdb is None:
+            raise RuntimeError("The DuckDB backend needs the duckdb package")
+        self.data_dir = data_dir
+        self.parquet = parquet
+        self.threads = threads
+        self._con = duckdb.connect()
+        self._con.execute(f"SET threads = {int(threads)}")
+        self._con.execute("CREATE SCHEMA public")
+        start = time.perf_counter()
+        with metrics.span("duckdb.build", source="parquet" if parquet else "csv"):
+            self._build()
+        self.build_seconds = time.perf_counter() - start
+        self.catalog = self._load_catalog()
+        logger.info(
+            f"Built the DuckDB backend from {data_dir} "
+            f"({'Parquet' if parquet else 'CSV'}, {threads} threads) "
+            f"in {self.build_seconds:.3f}s."
+        )
+
+    def cursor(self):
+        """Return a new cursor on the shared database, for one thread."""
+        cursor = self._con.cursor()
+        cursor.execute("SET search_path = 'public'")
+        return cursor
+
+    def _source(self, cursor, table_name):
+        """Return the table function reading one table's CSV (or its Parquet copy)."""
+        csv_path = os.path.join(self.data_dir, f"{table_name}.csv")
+        if not self.parquet:
+            return _read_csv_sql(csv_path, table_name)
+        digest = csv_cache.content_digest(csv_path, PARQUET_DIR)
+        path = os.path.join(PARQUET_DIR, f"{table_name}-{digest}.parquet")
+        if not os.path.exists(path):
+            os.makedirs(PARQUET_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            cursor.execute(
+                f"COPY (SELECT * FROM {_read_csv_sql(csv_path, table_name)}) "
+                f"TO '{tmp_path}' (FORMAT PARQUET)"
+            )
+            os.replace(tmp_path, path)
+            logger.info(f"Cached {csv_path} as {path}.")
+        return f"read_parquet('{path}')"
+
+    def _build(self):
+        cursor = self.cursor()
+        try:
+            for table_name in northwind_schema.TABLES:
+                source = self._source(cursor, table_name)
+                cursor.execute(
+                    f"CREATE TABLE public.{table_name} AS SELECT * FROM {source}"
+                )
+            for statement in DUCKDB_STAR_SCHEMA.values():
+                cursor.execute(statement)
+            cursor.execute(segmentation.CREATE_SEGMENT_TABLE)
+            cursor.execute(_dollar_sql(segmentation.segments_sql()), {"as_of": None})
+            cursor.execute(rollup.CREATE_CUBE_TABLE)
+            cursor.execute(rollup.REBUILD_CUBE)
+            cursor.execute(create_views.VIEW_CUSTOMER_ORDER_SUMMARY)
+            cursor.execute(
+                create_views.MATERIALIZED_VIEW_MONTHLY_SALES.replace(
+                    "CREATE MATERIALIZED VIEW", "CREATE TABLE"
+                )
+            )
+            cursor.execute(
+                f"CREATE TABLE public.{create_views.MONTHLY_SUMMARY_TABLE} AS "
+                "SELECT *, now() AS refreshed_at FROM monthly_sales"
+            )
+        finally:
+            cursor.close()
+
+    def _load_catalog(self):
+        """Build schema_catalog-style entries for the public schema."""
+        cursor = self.cursor()
+        try:
+            relations = cursor.execute(_DUCKDB_RELATIONS).fetchall()
+            columns = cursor.execute(_DUCKDB_COLUMNS).fetchall()
+        finally:
+            cursor.close()
+        catalog = {}
+        for name, kind, rows in relations:
+            catalog[name] = {
+                "kind": "materialized view" if name in MATERIALIZED_VIEWS else kind,
+                "columns": [],
+                "primary_key": PRIMARY_KEYS.get(name, []),
+                "indexes": [],
+                "estimated_rows": rows,
+            }
+        for table, column, sql_type, nullable in columns:
+            if table in catalog:
+                catalog[table]["columns"].append(
+                    {
+                        "name": column,
+                        "type": sql_type,
+                        "nullable": nullable,
+                        "description": schema_catalog.COLUMN_DESCRIPTIONS.get(
+                            table, {}
+                        ).get(column, schema_catalog.NO_DESCRIPTION),
+                    }
+                )
+        return catalog
+
+    def table_names(self, kinds=schema_catalog.TABLE_KINDS):
+        return [name for name, info in self.catalog.items() if info["kind"] in kinds]
+
+    def table_info(self, table_name):
+        return self.catalog[table_name]
+
+    def table_browser(self, table_name, **options):
+        return DuckDBTableBrowser(self, table_name, **options)
+
+    def query(self, sql, params=None):
+        """Run one statement with :name parameters and return a DataFrame."""
+        cursor = self.cursor()
+        try:
+            return cursor.execute(_dollar_sql(sql), params or None).df()
+        finally:
+            cursor.close()
+
+    def run_named(self, name, params=None, cache=True):
+        """Run a sql_script/ query; `cache` is accepted for PostgresBackend parity."""
+        query = query_library.get(name)
+        cursor = self.cursor()
+        try:
+            return cursor.execute(query.dollar_sql(), query.bind(params)).df()
+        finally:
+            cursor.close()
+
+    def run_batch(self, requests, cache=True):
+        """Run several named queries; in process, batching saves no round trips."""
+        results = {}
+        for request in requests:
+            name, params = (request, None) if isinstance(request, str) else request
+            results[name] = self.run_named(name, params)
+        return results
+
+    def query_cube(self, by=(), filters=None):
+        return self.query(*rollup.cube_query(by, filters))
+
+    def segment_counts(self):
+        return self.run_named("segment_counts")
+
+    def query_run(self, sql, **options):
+        """Return a SQL Runner DuckDBQueryRun for `sql`, not yet started."""
+        return DuckDBQueryRun(self, sql, **options)
+
+    def describe(self):
+        source = "Parquet cache" if self.parquet else "CSV"
+        return (
+            f"DuckDB {duckdb.__version__} in memory, from {self.data_dir} ({source}), "
+            f"{self.threads} threads"
+        )
+
+
+def get_backend(name=DEFAULT_BACKEND, **options):
+    """Return a new backend by name: "postgres" or "duckdb"."""
+    if name == "postgres":
+        return PostgresBackend(**options)
+    if name == "duckdb":
+        return DuckDBBackend(**options)
+    raise ValueError(f"Unknown backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+
+def get_streamlit_backend(name=DEFAULT_BACKEND):
+    """
+    Return the backend cached with st.cache_resource, so dashboard reruns
+    share it: the pooled engine, or the DuckDB database built once.
+    """
+    import streamlit as st
+
+    if name == "postgres":
+        return PostgresBackend(db.get_streamlit_engine())
+    return st.cache_resource(
+        get_backend, show_spinner="Building the DuckDB database..."
+    )(name)
+
+
+def compare_queries():
+    """
+    Return {name: function(backend)} for the queries timed by `compare`:
+    every sql_script/ query with its defaults, two cube slices and the
+    ANALYTIC_QUERIES. PostgreSQL results bypass query_cache.
+    """
+    queries = {
+        f"sql_script/{name}": lambda backend, name=name: backend.run_named(
+            name, cache=False
+        )
+        for name in query_library.discover()
+    }
+    for by in (["month", "category"], ["segment"]):
+        sql, params = rollup.cube_query(by)
+        queries[f"cube/{'_'.join(by)}"] = (
+            lambda backend, sql=sql, params=params: backend.query(sql, params)
+        )
+    for name, sql in ANALYTIC_QUERIES.items():
+        queries[name] = lambda backend, sql=sql: backend.query(sql)
+    return queries
+
+
+def latency(func, backend, runs):
+    """Run func(backend) once to warm up, then `runs` times; return its percentiles."""
+    rows = len(func(backend))
+    times_ms = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(backend)
+        times_ms.append((time.perf_counter() - start) * 1000)
+    p50, p95 = np.percentile(times_ms, [50, 95])
+    return {
+        "rows": rows,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+    }
+
+
+def compare(backends, runs=DEFAULT_RUNS):
+    """Time every compare_queries() query on each backend; return {query: {backend: stats}}."""
+    results = {}
+    for query_name, func in compare_queries().items():
+        results[query_name] = {}
+        for backend in backends:
+            try:
+                results[query_name][backend.name] = latency(func, backend, runs)
+            except Exception as e:
+                results[query_name][backend.name] = {"error": str(e).splitlines()[0]}
+    return results
+
+
+def print_comparison(results):
+    print(
+        f"{'query':<36} {'postgres p50/p95 ms':>20} {'duckdb p50/p95 ms':>20} "
+        f"{'speedup':>8}  rows"
+    )
+    for query_name, by_backend in results.items():
+        cells = []
+        for name in BACKENDS:
+            stats = by_backend.get(name, {})
+            cells.append(
+                f"{stats['p50_ms']:.2f}/{stats['p95_ms']:.2f}"
+                if "p50_ms" in stats
+                else stats.get("error", "-")[:20]
+            )
+        pg, duck = by_backend.get("postgres", {}), by_backend.get("duckdb", {})
+        speedup = (
+            f"{pg['p50_ms'] / duck['p50_ms']:.1f}x"
+            if "p50_ms" in pg and "p50_ms" in duck and duck["p50_ms"] > 0
+            else "-"
+        )
+        rows = sorted(
+            {stats["rows"] for stats in by_backend.values() if "rows" in stats}
+        )
+        rows = "/".join(str(n) for n in rows) + (" (differ)" if len(rows) > 1 else "")
+        print(f"{query_name:<36} {cells[0]:>20} {cells[1]:>20} {speedup:>8}  {rows}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query backends for explore_db.py.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compare_parser = commands.add_parser(
+        "compare", help="time the same queries on PostgreSQL and DuckDB"
+    )
+    compare_parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    compare_parser.add_argument("--data-dir", default=DATA_DIR)
+    compare_parser.add_argument(
+        "--parquet",
+        action="store_true",
+        default=USE_PARQUET,
+        help=f"read the CSVs through the Parquet cache in {PARQUET_DIR}",
+    )
+    compare_parser.add_argument("--threads", type=int, default=THREADS)
+    compare_parser.add_argument(
+        "--duckdb-only", action="store_true", help="skip the PostgreSQL backend"
+    )
+    compare_parser.add_argument("--json", metavar="PATH", help="also write the results")
+    args = parser.parse_args()
+
+    duck = DuckDBBackend(args.data_dir, args.parquet, args.threads)
+    backends = [duck] if args.duckdb_only else [PostgresBackend(), duck]
+    for backend in backends:
+        print(f"{backend.name}: {backend.describe()}")
+    print(f"DuckDB build: {duck.build_seconds:.3f}s\n")
+    results = compare(backends, args.runs)
+    print_comparison(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "runs": args.runs,
+                    "duckdb": {
+                        "data_dir": args.data_dir,
+                        "parquet": args.parquet,
+                        "threads": args.threads,
+                        "build_seconds": round(duck.build_seconds, 4),
+                    },
+                    "queries": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Import-time report for explore_db.py.
+
+Each entry point's imports are run in a fresh interpreter under
+`python -X importtime`, and the report shows its total import time and
+the modules that cost the most (cumulative time, children included). The
+menu is also timed end to end: the wall time of `python explore_db.py`
+from launch until the Exit choice at the first prompt, over several runs.
+
+    python benchmarks/import_time.py [--top 15] [--runs 5] [--json out.json]
+
+Exits with status 1 if the median menu time is over --budget-ms (200 by
+default).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Code path -> modules it imports before it can do its work.
+ENTRY_POINTS = {
+    "menu": ["explore_db"],
+    "console": [
+        "explore_db",
+        "backends",
+        "query_library",
+    ],
+    "dashboard": [
+        "explore_db",
+        "pandas",
+        "plotly.express",
+        "streamlit",
+        "backends",
+        "dashboard_panels",
+        "query_library",
+        "query_profiler",
+        "rollup",
+        "segmentation",
+        "sql_runner",
+        "table_browser",
+        "mylogger",
+    ],
+}
+
+DEFAULT_BUDGET_MS = 200.0
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output into a list of (module, self_us,
+    cumulative_us, depth), where depth 0 is a top-level import.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def profile_imports(modules, top=15):
+    """Import `modules` in a fresh interpreter and summarise the import times."""
+    statement = "; ".join(f"import {module}" for module in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1]}
+    parsed = parse_importtime(proc.stderr)
+    by_cumulative = sorted(parsed, key=lambda m: m[2], reverse=True)
+    return {
+        "total_ms": round(sum(m[2] for m in parsed if m[3] == 0) / 1000, 1),
+        "modules": len(parsed),
+        "top": [
+            {"module": name, "self_ms": self_us / 1000, "cumulative_ms": cum_us / 1000}
+            for name, self_us, cum_us, _ in by_cumulative[:top]
+        ],
+    }
+
+
+def time_menu(runs=5):
+    """
+    Return the wall times (ms) of `python explore_db.py` showing the menu
+    and exiting on the Exit choice.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(REPO_DIR, "explore_db.py")],
+            cwd=REPO_DIR,
+            input="4\n",
+            capture_output=True,
+            text=True,
+            env={**os.environ, "STREAMLIT_MODE": ""},
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report explore_db.py import times.")
+    parser.add_argument("--top", type=int, default=15, help="modules to list per path")
+    parser.add_argument("--runs", type=int, default=5, help="menu startup runs")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "entry_points": {}}
+    for name, modules in ENTRY_POINTS.items():
+        summary = profile_imports(modules, args.top)
+        report["entry_points"][name] = summary
+        if "error" in summary:
+            print(f"\n{name}: cannot import ({summary['error']})")
+            continue
+        print(f"\n{name}: {summary['total_ms']:.1f} ms, {summary['modules']} modules")
+        print(f"  {'cumulative':>10}  {'self':>8}  module")
+        for entry in summary["top"]:
+            print(
+                f"  {entry['cumulative_ms']:>8.1f}ms  {entry['self_ms']:>6.1f}ms  "
+                f"{entry['module']}"
+            )
+
+    timings = time_menu(args.runs)
+    median = statistics.median(timings)
+    report["menu_startup_ms"] = {
+        "median": round(median, 1),
+        "min": round(min(timings), 1),
+        "max": round(max(timings), 1),
+        "budget": args.budget_ms,
+    }
+    print(
+        f"\nMenu startup: median {median:.0f} ms over {args.runs} runs "
+        f"(min {min(timings):.0f}, max {max(timings):.0f}; budget {args.budget_ms:.0f})"
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if median > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
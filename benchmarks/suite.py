@@ -0,0 +1,484 @@
+"""
+End-to-end benchmark suite: ETL, view builds and dashboard queries at one
+or more scale factors.
+
+For every scale factor the suite:
+- generates the CSVs with generate_big_csv.py (kept under .cache/bench,
+  so later runs with the same seed reuse them);
+- loads them into a throwaway database and times each table's extract,
+  transform, load and index stages (etl_northwind.run_pipeline);
+- times the star schema, RFM segments and sales cube builds;
+- times monthly_sales creation and its concurrent and incremental
+  refreshes;
+- runs every dashboard query and every sql_script/*.sql file --runs times
+  and records p50/p95/p99 latency;
+- records the peak RSS of each phase.
+
+The throwaway database is created on the configured server (secret.py or
+NORTHWIND_DATABASE_URL) and dropped afterwards. With --server embedded it
+is created on a temporary PostgreSQL started by the pgserver package
+instead, so nothing outside the run is touched.
+
+Dashboard queries go through query_cache with caching disabled, so every
+run reaches the database.
+
+    python benchmarks/suite.py run --scales 1 10 100 --out results.json
+    python benchmarks/suite.py compare baseline.json results.json
+
+compare exits with status 1 if any timing or memory figure is worse than
+the baseline by more than --threshold (10% by default).
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+# Time the queries themselves, not cache hits.
+os.environ["NORTHWIND_QUERY_CACHE_ENTRIES"] = "0"
+
+import numpy as np  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.engine import make_url  # noqa: E402
+
+import create_views  # noqa: E402
+import db  # noqa: E402
+import etl_northwind  # noqa: E402
+import generate_big_csv  # noqa: E402
+import metrics  # noqa: E402
+import query_cache  # noqa: E402
+import query_library  # noqa: E402
+import refresh_views  # noqa: E402
+import rollup  # noqa: E402
+import schema_catalog  # noqa: E402
+import segmentation  # noqa: E402
+import star_schema  # noqa: E402
+import table_browser  # noqa: E402
+
+RESULTS_VERSION = 1
+
+DATA_CACHE_DIR = os.path.join(REPO_DIR, ".cache", "bench")
+
+DEFAULT_SCALES = [1, 10]
+DEFAULT_RUNS = 20
+DEFAULT_THRESHOLD = 0.10
+
+# Differences smaller than these are noise, whatever the relative change.
+NOISE_FLOOR = {"_seconds": 0.005, "_ms": 0.5, "_mb": 5.0}
+
+SERVERS = ("throwaway", "embedded")
+
+
+def _browse(engine, table, **kwargs):
+    return len(table_browser.TableBrowser(engine, table, **kwargs).fetch())
+
+
+# name -> function(engine) returning the number of rows read. The first
+# group mirrors what the dashboard runs; sql_script files are added below.
+DASHBOARD_QUERIES = {
+    "dashboard/monthly_sales": lambda engine: len(
+        query_library.run(engine, "monthly_sales")
+    ),
+    "dashboard/segment_counts": lambda engine: len(segmentation.segment_counts(engine)),
+    "dashboard/cube_month_category": lambda engine: len(
+        rollup.query_cube(engine, ["month", "category"])
+    ),
+    "dashboard/cube_segment": lambda engine: len(
+        rollup.query_cube(engine, ["segment"])
+    ),
+    "dashboard/schema_catalog": lambda engine: len(schema_catalog.load_catalog(engine)),
+    "dashboard/browse_order_details": lambda engine: _browse(engine, "order_details"),
+    "dashboard/browse_orders_by_total": lambda engine: _browse(
+        engine, "orders", sort="total_amount", descending=True
+    ),
+}
+
+
+def sql_script_queries():
+    """
+    Return {name: function(engine)} for every sql_script/*.sql query (run
+    with its default parameters as a prepared statement), plus all of them
+    together through query_library.run_batch.
+    """
+    library = query_library.discover()
+    queries = {}
+    for name, query in library.items():
+        queries[f"sql_script/{os.path.basename(query.path)}"] = (
+            lambda engine, name=name: len(query_library.run(engine, name))
+        )
+    queries["sql_script/batch"] = lambda engine: sum(
+        len(df) for df in query_library.run_batch(engine, list(library)).values()
+    )
+    return queries
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _phase_peak_mb():
+    """Peak RSS since the last reset_peak_memory(), then reset it."""
+    peak = metrics.peak_memory_mb()
+    metrics.reset_peak_memory()
+    return round(peak, 1)
+
+
+class ThrowawayDatabase:
+    """
+    A database created for one benchmark and dropped afterwards, on the
+    server at `server_url` (any database on it; only the server is used).
+    """
+
+    def __init__(self, server_url, name):
+        self.admin_url = make_url(server_url).set(database="postgres")
+        self.url = make_url(server_url).set(database=name)
+        self.name = name
+
+    def _admin(self, sql):
+        engine = create_engine(self.admin_url, isolation_level="AUTOCOMMIT")
+        try:
+            with engine.connect() as conn:
+                conn.execute(text(sql))
+        finally:
+            engine.dispose()
+
+    def __enter__(self):
+        self._admin(f'DROP DATABASE IF EXISTS "{self.name}"')
+        self._admin(f'CREATE DATABASE "{self.name}"')
+        os.environ["NORTHWIND_DATABASE_URL"] = self.url.render_as_string(
+            hide_password=False
+        )
+        return self
+
+    def __exit__(self, *exc):
+        db.dispose_engine()
+        query_cache.clear()
+        self._admin(f'DROP DATABASE IF EXISTS "{self.name}" WITH (FORCE)')
+
+
+def start_server(kind):
+    """
+    Return (server URL, cleanup function). "throwaway" uses the configured
+    server; "embedded" starts a temporary one with pgserver.
+    """
+    if kind == "throwaway":
+        return db.database_url(), lambda: None
+    try:
+        import pgserver
+    except ImportError:
+        sys.exit("--server embedded needs the pgserver package (pip install pgserver)")
+    server = pgserver.get_server(
+        tempfile.mkdtemp(prefix="northwind_bench_pg_"), cleanup_mode="delete"
+    )
+    return server.get_uri(), server.cleanup
+
+
+def dataset(scale, seed, workers):
+    """Return (data directory, seconds spent generating it or None if reused)."""
+    out_dir = os.path.join(DATA_CACHE_DIR, f"sf{scale:g}-seed{seed}")
+    # Written once every file is complete, so an interrupted run regenerates.
+    marker = os.path.join(out_dir, ".complete")
+    if os.path.exists(marker):
+        return out_dir, None
+    _, seconds = _timed(generate_big_csv.generate, scale, out_dir, seed, workers)
+    open(marker, "w").close()
+    return out_dir, round(seconds, 3)
+
+
+def latency(func, engine, runs):
+    """Run func(engine) once to warm up, then `runs` times; return its percentiles."""
+    rows = func(engine)
+    times_ms = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(engine)
+        times_ms.append((time.perf_counter() - start) * 1000)
+    p50, p95, p99 = np.percentile(times_ms, [50, 95, 99])
+    return {
+        "rows": rows,
+        "runs": runs,
+        "mean_ms": round(float(np.mean(times_ms)), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+def bench_scale(server_url, scale, args):
+    """Run every phase at one scale factor and return its results."""
+    data_dir, generate_seconds = dataset(scale, args.seed, args.workers)
+    result = {
+        "rows": generate_big_csv.table_sizes(scale),
+        "generate_seconds": generate_seconds,
+    }
+    name = f"northwind_bench_{os.getpid()}_sf{scale:g}".replace(".", "_")
+    with ThrowawayDatabase(server_url, name):
+        engine = db.get_engine()
+        metrics.reset_peak_memory()
+
+        options = {
+            "method": "copy",
+            "chunksize": etl_northwind.DEFAULT_CHUNKSIZE,
+            "mode": "full",
+            "cache": args.csv_cache,
+            "validate": True,
+            "reject_dir": os.path.join(tempfile.gettempdir(), name + "_rejects"),
+            "partition": args.partition,
+        }
+        (load_stats, failed), wall = _timed(
+            etl_northwind.run_pipeline,
+            engine,
+            etl_northwind.csv_paths(data_dir),
+            args.workers,
+            options,
+        )
+        stat_keys = ["rows", "seconds", "peak_mb"] + [
+            f"{stage}_seconds" for stage in etl_northwind.STAGES
+        ]
+        tables = {
+            table: {key: round(stats[key], 4) for key in stat_keys}
+            for table, stats in load_stats.items()
+        }
+        result["etl"] = {
+            "wall_seconds": round(wall, 4),
+            "tables": tables,
+            "failed": failed,
+            "peak_rss_mb": max(
+                [_phase_peak_mb()] + [stats["peak_mb"] for stats in tables.values()]
+            ),
+        }
+
+        _, star_seconds = _timed(star_schema.build_star_schema, engine, "rebuild")
+        _, segment_seconds = _timed(segmentation.build_segments, engine)
+        _, cube_seconds = _timed(rollup.refresh_cube, engine)
+        result["model"] = {
+            "star_schema_seconds": round(star_seconds, 4),
+            "segments_seconds": round(segment_seconds, 4),
+            "cube_seconds": round(cube_seconds, 4),
+            "peak_rss_mb": _phase_peak_mb(),
+        }
+
+        _, create_seconds = _timed(create_views.create_views, engine)
+        _, concurrent_seconds = _timed(refresh_views.refresh_monthly_sales, engine)
+        _, summary_seconds = _timed(refresh_views.refresh_monthly_summary, engine)
+        with engine.connect() as conn:
+            last_month = conn.execute(
+                text("SELECT MAX(month) FROM monthly_sales")
+            ).scalar()
+        _, month_seconds = _timed(
+            refresh_views.refresh_monthly_summary, engine, [last_month]
+        )
+        result["views"] = {
+            "create_seconds": round(create_seconds, 4),
+            "refresh_concurrent_seconds": round(concurrent_seconds, 4),
+            "refresh_incremental_all_seconds": round(summary_seconds, 4),
+            "refresh_incremental_month_seconds": round(month_seconds, 4),
+            "peak_rss_mb": _phase_peak_mb(),
+        }
+
+        with engine.connect() as conn:
+            conn.execute(text("ANALYZE"))
+            conn.commit()
+        queries = {**DASHBOARD_QUERIES, **sql_script_queries()}
+        result["queries"] = {}
+        for query_name, func in queries.items():
+            try:
+                result["queries"][query_name] = latency(func, engine, args.runs)
+            except Exception as e:
+                result["queries"][query_name] = {"error": str(e).splitlines()[0]}
+        result["queries_peak_rss_mb"] = _phase_peak_mb()
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def run(args):
+    server_url, cleanup = start_server(args.server)
+    try:
+        engine = create_engine(server_url)
+        with engine.connect() as conn:
+            server_version = conn.execute(text("SHOW server_version")).scalar()
+        engine.dispose()
+        results = {
+            "version": RESULTS_VERSION,
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "server": args.server,
+            "postgres": server_version,
+            "python": sys.version.split()[0],
+            "seed": args.seed,
+            "workers": args.workers,
+            "runs": args.runs,
+            "scales": {},
+        }
+        for scale in args.scales:
+            print(f"[bench] scale factor {scale:g}")
+            results["scales"][f"{scale:g}"] = bench_scale(server_url, scale, args)
+    finally:
+        cleanup()
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print_summary(results)
+    print(f"[bench] results written to {args.out}")
+
+
+def print_summary(results):
+    for scale, result in results["scales"].items():
+        etl = result["etl"]
+        print(
+            f"\nSF {scale}: ETL {etl['wall_seconds']:.2f}s, peak {etl['peak_rss_mb']} MiB"
+        )
+        for table, stats in etl["tables"].items():
+            stages = ", ".join(
+                f"{stage} {stats[f'{stage}_seconds']:.2f}s"
+                for stage in etl_northwind.STAGES
+            )
+            print(f"  {table:<14} {stats['rows']:>12,} rows  {stages}")
+        for section in ("model", "views"):
+            print(
+                f"  {section}: "
+                + ", ".join(
+                    f"{key[:-8]} {value:.2f}s"
+                    for key, value in result[section].items()
+                    if key.endswith("_seconds")
+                )
+            )
+        print(f"  {'query':<40} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, stats in result["queries"].items():
+            if "error" in stats:
+                print(f"  {name:<40} error: {stats['error']}")
+                continue
+            print(
+                f"  {name:<40} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                f"{stats['p99_ms']:>9.2f}"
+            )
+
+
+def flatten(results, prefix=""):
+    """Return {dotted.path: value} for every lower-is-better figure in `results`."""
+    metrics = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and key.endswith(tuple(NOISE_FLOOR)):
+            metrics[path] = value
+    return metrics
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for key in ("server", "postgres", "seed", "workers"):
+        if baseline.get(key) != current.get(key):
+            print(
+                f"Note: {key} differs (baseline {baseline.get(key)}, "
+                f"current {current.get(key)})"
+            )
+
+    old = flatten(baseline.get("scales", {}))
+    new = flatten(current.get("scales", {}))
+    regressions = []
+    improvements = []
+    for path in sorted(old.keys() & new.keys()):
+        before, after = old[path], new[path]
+        floor = next(v for suffix, v in NOISE_FLOOR.items() if path.endswith(suffix))
+        if abs(after - before) < floor or before <= 0:
+            continue
+        change = (after - before) / before
+        if change > args.threshold:
+            regressions.append((path, before, after, change))
+        elif change < -args.threshold:
+            improvements.append((path, before, after, change))
+
+    for title, rows in (("Regressions", regressions), ("Improvements", improvements)):
+        if rows:
+            print(f"\n{title} (threshold {args.threshold:.0%}):")
+            for path, before, after, change in rows:
+                print(f"  {path:<70} {before:>10.3f} -> {after:>10.3f}  {change:+.0%}")
+    missing = sorted(old.keys() - new.keys())
+    if missing:
+        print(f"\n{len(missing)} baseline figures are missing from the current run.")
+    print(
+        f"\n{len(old.keys() & new.keys())} figures compared: "
+        f"{len(regressions)} regressions, {len(improvements)} improvements."
+    )
+    if regressions:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Northwind benchmark suite.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument(
+        "--scales", type=float, nargs="+", default=DEFAULT_SCALES, metavar="SF"
+    )
+    run_parser.add_argument("--server", choices=SERVERS, default="throwaway")
+    run_parser.add_argument(
+        "--runs", type=int, default=DEFAULT_RUNS, help="timed runs per query"
+    )
+    run_parser.add_argument("--seed", type=int, default=generate_big_csv.DEFAULT_SEED)
+    run_parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="processes for data generation and the ETL",
+    )
+    run_parser.add_argument(
+        "--partition", action="store_true", help="load orders partitioned"
+    )
+    run_parser.add_argument(
+        "--csv-cache",
+        action="store_true",
+        help="let the ETL reuse its Arrow cache (off: every run parses the CSVs)",
+    )
+    run_parser.add_argument(
+        "--out",
+        default=f"bench-{datetime.datetime.now():%Y%m%d-%H%M%S}.json",
+        help="results file (default bench-<timestamp>.json)",
+    )
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser(
+        "compare", help="flag regressions against a baseline results file"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="relative slowdown reported as a regression (default 0.10)",
+    )
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,145 @@
-from sqlalchemy import create_engine, text
-import secret  # Contains DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME
+from sqlalchemy import text
+import db
+import metrics
+from mylogger import logger
+import schema_catalog
+import star_schema
 
+# SQL to create a standard view: customer_order_summary
+# Reads the star schema (see star_schema.py): orders are counted in
+# fact_orders, so orders without lines still count, and sales are the sum
+# of line revenue.
+VIEW_CUSTOMER_ORDER_SUMMARY = """
+CREATE OR REPLACE VIEW customer_order_summary AS
+SELECT 
+  c.customer_id,
+  c.name,
+  COALESCE(o.order_count, 0) AS order_count,
+  COALESCE(s.total_sales, 0) AS total_sales
+FROM 
+  dim_customer c
+LEFT JOIN 
+  (SELECT customer_key, COUNT(*) AS order_count
+   FROM fact_orders GROUP BY customer_key) o ON o.customer_key = c.customer_key
+LEFT JOIN 
+  (SELECT customer_key, SUM(line_revenue) AS total_sales
+   FROM fact_order_lines GROUP BY customer_key) s ON s.customer_key = c.customer_key;
+"""
 
-def main():
-    # Build connection string from secret.py
-    connection_string = (
-        f"postgresql://{secret.DB_USER}:{secret.DB_PASS}"
-        f"@{secret.DB_HOST}:{secret.DB_PORT}/{secret.DB_NAME}"
-    )
-    engine = create_engine(connection_string)
-
-    # SQL to create a standard view: customer_order_summary
-    view_customer_order_summary = """
-    CREATE OR REPLACE VIEW customer_order_summary AS
-    SELECT 
-      c.customer_id,
-      c.name,
-      COUNT(o.order_id) AS order_count,
-      COALESCE(SUM(o.total_amount), 0) AS total_sales
-    FROM 
-      customers c
-    LEFT JOIN 
-      orders o ON c.customer_id = o.customer_id
-    GROUP BY 
-      c.customer_id, c.name;
-    """
+# Orders and sales per month: orders from fact_orders, revenue from
+# fact_order_lines, each month taken from dim_date. Also used by
+# refresh_views.py to rebuild monthly_sales_summary.
+MONTHLY_SALES_QUERY = """
+WITH orders_by_month AS (
+  SELECT d.month_start AS month, COUNT(*) AS orders_count
+  FROM fact_orders o
+  JOIN dim_date d ON d.date_key = o.date_key
+  GROUP BY d.month_start
+),
+sales_by_month AS (
+  SELECT d.month_start AS month, SUM(f.line_revenue) AS total_sales
+  FROM fact_order_lines f
+  JOIN dim_date d ON d.date_key = f.date_key
+  GROUP BY d.month_start
+)
+SELECT 
+  o.month,
+  o.orders_count,
+  COALESCE(s.total_sales, 0) AS total_sales
+FROM 
+  orders_by_month o
+LEFT JOIN 
+  sales_by_month s ON s.month = o.month
+ORDER BY 
+  o.month
+"""
+
+# SQL to create a materialized view: monthly_sales
+MATERIALIZED_VIEW_MONTHLY_SALES = (
+    f"CREATE MATERIALIZED VIEW monthly_sales AS{MONTHLY_SALES_QUERY};\n"
+)
+
+# REFRESH MATERIALIZED VIEW CONCURRENTLY requires a unique index on the view.
+INDEX_MONTHLY_SALES = """
+CREATE UNIQUE INDEX IF NOT EXISTS monthly_sales_month_idx ON monthly_sales (month);
+"""
+
+# The table the dashboard and sql_script/monthly_sales.sql read. Both refresh
+# strategies in refresh_views.py keep it current: the concurrent one syncs it
+# from monthly_sales, the incremental one recomputes the touched months.
+MONTHLY_SUMMARY_TABLE = "monthly_sales_summary"
+
+CREATE_SUMMARY_TABLE = f"""
+CREATE TABLE IF NOT EXISTS public.{MONTHLY_SUMMARY_TABLE} (
+  month DATE PRIMARY KEY,
+  orders_count BIGINT NOT NULL,
+  total_sales NUMERIC NOT NULL,
+  refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+# Copy monthly_sales into the summary table, touching only the months that
+# differ, and drop months the view no longer has.
+SYNC_SUMMARY = f"""
+INSERT INTO public.{MONTHLY_SUMMARY_TABLE} AS s (month, orders_count, total_sales)
+SELECT month, orders_count, total_sales FROM monthly_sales
+ON CONFLICT (month) DO UPDATE
+SET orders_count = EXCLUDED.orders_count,
+    total_sales = EXCLUDED.total_sales,
+    refreshed_at = now()
+WHERE (s.orders_count, s.total_sales)
+  IS DISTINCT FROM (EXCLUDED.orders_count, EXCLUDED.total_sales)
+"""
+
+DELETE_STALE_SUMMARY = f"""
+DELETE FROM public.{MONTHLY_SUMMARY_TABLE}
+WHERE month NOT IN (SELECT month FROM monthly_sales)
+"""
 
-    # Updated SQL to create a materialized view: monthly_sales
-    materialized_view_monthly_sales = """
-    CREATE MATERIALIZED VIEW monthly_sales AS
-    SELECT 
-      DATE_TRUNC('month', order_date::timestamp) AS month,
-      COUNT(order_id) AS orders_count,
-      SUM(total_amount) AS total_sales
-    FROM 
-      orders
-    GROUP BY 
-      DATE_TRUNC('month', order_date::timestamp)
-    ORDER BY 
-      month;
+
+def sync_monthly_summary(conn):
+    """Bring monthly_sales_summary in line with monthly_sales (no commit)."""
+    conn.execute(text(CREATE_SUMMARY_TABLE))
+    conn.execute(text(SYNC_SUMMARY))
+    conn.execute(text(DELETE_STALE_SUMMARY))
+
+
+@metrics.timed("views.create")
+def create_views(engine):
+    """
+    Create customer_order_summary and monthly_sales (with its unique index),
+    and fill monthly_sales_summary from it. monthly_sales is dropped and
+    recreated so it always has the current definition. The star-schema
+    tables the views read are created if needed.
     """
+    star_schema.create_tables(engine)
 
     # Connect to the database and execute the commands
     with engine.connect() as conn:
         try:
-            conn.execute(text(view_customer_order_summary))
-            print("Created view: customer_order_summary")
+            conn.execute(text(VIEW_CUSTOMER_ORDER_SUMMARY))
+            conn.commit()
+            logger.info("Created view: customer_order_summary")
         except Exception as e:
-            print("Error creating view customer_order_summary:", e)
+            conn.rollback()
+            logger.error(f"Error creating view customer_order_summary: {e}")
 
         try:
-            conn.execute(text(materialized_view_monthly_sales))
-            print("Created materialized view: monthly_sales")
+            conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS monthly_sales"))
+            conn.execute(text(MATERIALIZED_VIEW_MONTHLY_SALES))
+            conn.execute(text(INDEX_MONTHLY_SALES))
+            sync_monthly_summary(conn)
+            conn.commit()
+            logger.info("Created materialized view: monthly_sales")
         except Exception as e:
-            print("Error creating materialized view monthly_sales:", e)
+            conn.rollback()
+            logger.error(f"Error creating materialized view monthly_sales: {e}")
 
-        # Commit the changes
-        conn.commit()
+    schema_catalog.bump_schema_version(engine)
+
+
+def main():
+    create_views(db.get_engine())
 
 
 if __name__ == "__main__":
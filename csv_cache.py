@@ -0,0 +1,199 @@
+"""
+Columnar cache of parsed and transformed CSV files.
+
+The first time etl_northwind.py reads a CSV, every transformed chunk is also
+written to an Arrow IPC stream file under the cache directory. Later runs
+memory-map that file and hand back the same chunks without parsing the CSV
+again. Entries are keyed by the file's size, mtime and a BLAKE2 hash of its
+contents, so an edited file is never served stale. The hash is only
+recomputed when the size or mtime changes. The least recently used entries
+are evicted once the cache grows past its size limit.
+
+pyarrow is optional: without it the cache is disabled and the ETL parses
+the CSVs as before.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+
+# Where cache entries and their index files live.
+CACHE_DIR = os.environ.get("NORTHWIND_CACHE_DIR", os.path.join(".cache", "csv"))
+
+# Total size the cache is trimmed back to after each write.
+DEFAULT_MAX_BYTES = 2 * 2**30
+
+# Bump when transform_data() or the declared schema changes, so entries
+# written by older code are no longer matched.
+CACHE_VERSION = 2
+
+_HASH_BLOCK = 2**20
+_SUFFIX = ".arrows"
+
+
+def available():
+    """Return True if pyarrow is installed and the cache can be used."""
+    return pa is not None
+
+
+def _index_path(cache_dir, file_path):
+    name = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()
+    return os.path.join(cache_dir, "index", f"{name}.json")
+
+
+def _write_json(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def content_digest(file_path, cache_dir=CACHE_DIR):
+    """
+    Return the BLAKE2 digest of the file's contents. The digest is stored
+    next to the file's size and mtime, and reused as long as both match.
+    """
+    stat = os.stat(file_path)
+    index_path = _index_path(cache_dir, file_path)
+    try:
+        with open(index_path) as f:
+            entry = json.load(f)
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["digest"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    entry = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "digest": digest.hexdigest(),
+    }
+    _write_json(index_path, entry)
+    return entry["digest"]
+
+
+def cache_path(file_path, table_name, cache_dir=CACHE_DIR):
+    """Return the path of the cache entry for the file's current contents."""
+    digest = content_digest(file_path, cache_dir)
+    return os.path.join(cache_dir, f"{table_name}-v{CACHE_VERSION}-{digest}{_SUFFIX}")
+
+
+def read_chunks(path, chunksize):
+    """
+    Yield the cached chunks as DataFrames, memory-mapping the Arrow file.
+    Batches larger than `chunksize` are sliced (without copying) first.
+    """
+    os.utime(path)  # Mark the entry as recently used for eviction.
+    with pa.memory_map(path) as source:
+        for batch in pa.ipc.open_stream(source):
+            for offset in range(0, batch.num_rows, chunksize):
+                yield batch.slice(offset, chunksize).to_pandas()
+
+
+def _stream_schema(batch):
+    """
+    Widen the first batch's schema so later chunks fit it: dictionary
+    (categorical) columns get int32 indices and all-null columns become
+    strings.
+    """
+    fields = []
+    for field in batch.schema:
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+        elif pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        fields.append(field)
+    return pa.schema(fields, metadata=batch.schema.metadata)
+
+
+def write_through(chunks, path, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Yield each chunk unchanged while appending it to a new cache entry.
+    The entry is only published (renamed into place) if every chunk was
+    consumed; an interrupted or failed run leaves no partial entry.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    writer = None
+    sink = None
+    completed = False
+    try:
+        for df in chunks:
+            if writer is None:
+                batch = pa.RecordBatch.from_pandas(df, preserve_index=False)
+                schema = _stream_schema(batch)
+                sink = pa.OSFile(tmp_path, "wb")
+                writer = pa.ipc.new_stream(sink, schema)
+            batch = pa.RecordBatch.from_pandas(df, schema=schema, preserve_index=False)
+            writer.write_batch(batch)
+            yield df
+        completed = writer is not None
+    finally:
+        if writer is not None:
+            writer.close()
+            sink.close()
+        if completed:
+            os.replace(tmp_path, path)
+            evict(max_bytes, os.path.dirname(path), keep=path)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _entries(cache_dir):
+    try:
+        names = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return []
+    paths = [os.path.join(cache_dir, n) for n in names if n.endswith(_SUFFIX)]
+    return [(p, os.stat(p)) for p in paths]
+
+
+def evict(max_bytes=DEFAULT_MAX_BYTES, cache_dir=CACHE_DIR, keep=None):
+    """
+    Delete the least recently used entries until the cache fits in
+    `max_bytes`. The entry at `keep` (the one just written) is never evicted.
+    Returns the number of entries removed.
+    """
+    entries = sorted(_entries(cache_dir), key=lambda entry: entry[1].st_mtime)
+    total = sum(stat.st_size for _, stat in entries)
+    removed = 0
+    for path, stat in entries:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        os.remove(path)
+        total -= stat.st_size
+        removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the CSV cache.")
+    parser.add_argument("--clear", action="store_true", help="remove every entry")
+    args = parser.parse_args()
+
+    if args.clear:
+        removed = evict(0)
+        print(f"Removed {removed} cache entries from {CACHE_DIR}.")
+        return
+    entries = _entries(CACHE_DIR)
+    for path, stat in sorted(entries):
+        print(f"{os.path.basename(path)}: {stat.st_size / 2**20:.1f} MiB")
+    total = sum(stat.st_size for _, stat in entries)
+    print(f"{len(entries)} entries, {total / 2**20:.1f} MiB in {CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
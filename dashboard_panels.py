@@ -0,0 +1,96 @@
+"""
+Concurrent loading of independent dashboard panels.
+
+A Panel pairs a `load(engine)` function, which runs the panel's queries and
+returns its data, with a `render(data)` function that draws it. run_panels()
+starts every load on a thread pool over the shared pooled engine (or
+whatever source it is given, such as a backends.py backend) and yields
+each panel as soon as its data arrives, so a page waits for its slowest
+panel instead of the sum of all of them. Rendering stays on the calling
+thread, which is where Streamlit expects it. Every panel's load time is
+logged, followed by the page's wall time.
+"""
+
+import concurrent.futures
+import time
+
+import db
+import metrics
+from mylogger import logger
+
+
+class Panel:
+    """
+    One dashboard panel: `load(engine)` fetches its data on a worker thread
+    and `render(data)` draws it on the calling thread.
+    """
+
+    def __init__(self, title, load, render):
+        self.title = title
+        self.load = load
+        self.render = render
+
+
+def _timed_load(panel, engine):
+    start = time.perf_counter()
+    try:
+        return panel.load(engine), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+
+def run_panels(engine, panels, max_workers=None):
+    """
+    Load `panels` concurrently and yield (panel, data, error, seconds) for
+    each one in the order they finish. `error` is the exception raised by
+    the panel's load, or None. At most `max_workers` loads run at once
+    (default: one per panel, up to the connection pool size).
+    """
+    if max_workers is None:
+        max_workers = min(len(panels), db.POOL_SIZE) or 1
+    start = time.perf_counter()
+    timings = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_timed_load, panel, engine): panel for panel in panels}
+        for future in concurrent.futures.as_completed(futures):
+            panel = futures[future]
+            data, error, seconds = future.result()
+            timings[panel.title] = seconds
+            metrics.observe("panel_load_seconds", seconds, panel=panel.title)
+            if error is None:
+                logger.info(f"Panel '{panel.title}' loaded in {seconds:.3f}s")
+            else:
+                logger.error(
+                    f"Panel '{panel.title}' failed after {seconds:.3f}s: {error}"
+                )
+            yield panel, data, error, seconds
+    if timings:
+        slowest = max(timings, key=timings.get)
+        logger.info(
+            f"Loaded {len(timings)} panels in {time.perf_counter() - start:.3f}s "
+            f"(slowest '{slowest}' {timings[slowest]:.3f}s, "
+            f"sum {sum(timings.values()):.3f}s)"
+        )
+
+
+def render_streamlit(engine, panels, max_workers=None):
+    """
+    Lay out one container per panel in the declared order, then fill each
+    as its data arrives. A panel whose load failed shows the error instead.
+    """
+    import streamlit as st
+
+    containers = {}
+    for panel in panels:
+        containers[panel.title] = st.container()
+        with containers[panel.title]:
+            st.markdown(f"### {panel.title}")
+    for panel, data, error, _ in run_panels(engine, panels, max_workers):
+        with containers[panel.title]:
+            if error is not None:
+                st.error(f"Error retrieving {panel.title.lower()} data: {error}")
+                continue
+            try:
+                panel.render(data)
+            except Exception as e:
+                st.error(f"Error rendering {panel.title.lower()}: {e}")
@@ -0,0 +1,294 @@
+"""
+Long-lived background server for the Streamlit dashboard.
+
+Instead of cold-starting `streamlit run` (and re-importing pandas,
+SQLAlchemy, Plotly and Streamlit) every time the dashboard is opened, the
+menu in explore_db.py starts one headless Streamlit server in its own
+session and records it in a small JSON state file. Later opens find the
+server through that file and only point the browser at it. The server
+keeps its imports, pooled engine, schema catalog and query cache warm
+between opens.
+
+The state file holds the server's pid, port, URL and log file. It is
+trusted only while that pid is alive and the server answers its health
+check; a live server that does not answer within START_TIMEOUT is stopped
+and replaced. On Windows, where there are no process groups or POSIX signals,
+the server is started in a new process group and stopped with
+TerminateProcess.
+
+Environment:
+    NORTHWIND_DASHBOARD_PORT   port to serve on (default 8501)
+    NORTHWIND_DASHBOARD_STATE  state file (default northwind_dashboard.json
+                               in the temp directory); the server's output
+                               goes to the same path with a .log suffix
+
+Run directly to manage the server:
+    python dashboard_server.py {start,stop,status,open}
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import webbrowser
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "explore_db.py")
+
+DEFAULT_PORT = int(os.environ.get("NORTHWIND_DASHBOARD_PORT", "8501"))
+
+STATE_PATH = os.environ.get(
+    "NORTHWIND_DASHBOARD_STATE",
+    os.path.join(tempfile.gettempdir(), "northwind_dashboard.json"),
+)
+LOG_PATH = os.path.splitext(STATE_PATH)[0] + ".log"
+
+# Seconds to wait for a new server to answer its health check.
+START_TIMEOUT = 60.0
+
+WINDOWS = os.name == "nt"
+
+
+def read_state():
+    """Return the recorded server state, or None if there is none."""
+    try:
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(state):
+    tmp_path = f"{STATE_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def _clear_state():
+    try:
+        os.remove(STATE_PATH)
+    except FileNotFoundError:
+        pass
+
+
+def _pid_alive(pid):
+    if WINDOWS:
+        # os.kill(pid, 0) would terminate the process on Windows.
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        # Reap the server if this process started it and it has exited.
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except ChildProcessError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _terminate(pid, group=True, force=False):
+    """
+    Ask the process (with its process group, on POSIX) to exit, or kill it
+    with force=True. On Windows both end it with TerminateProcess.
+    """
+    if WINDOWS:
+        os.kill(pid, signal.SIGTERM)
+    else:
+        (os.killpg if group else os.kill)(
+            pid, signal.SIGKILL if force else signal.SIGTERM
+        )
+
+
+def _healthy(url, timeout=1.0):
+    try:
+        with urllib.request.urlopen(f"{url}/_stcore/health", timeout=timeout) as resp:
+            return resp.status == 200
+    except OSError:
+        return False
+
+
+def status():
+    """
+    Return the state of the running server, or None if none is running.
+    A state file left behind by a server that has exited is removed.
+    """
+    state = read_state()
+    if state is None:
+        return None
+    if _pid_alive(state["pid"]) and _healthy(state["url"]):
+        return state
+    if not _pid_alive(state["pid"]):
+        _clear_state()
+    return None
+
+
+def start(port=DEFAULT_PORT, timeout=START_TIMEOUT):
+    """
+    Return the running server's state, starting a headless server first
+    if there is none. A recorded server that is alive but not answering
+    (still starting, or hung) gets `timeout` seconds to become healthy and
+    is stopped if it does not, so two servers never race for the port.
+    Raises RuntimeError if the new server exits or does not become healthy
+    within `timeout` seconds.
+    """
+    state = status()
+    if state is None:
+        # status() only leaves the state file of a live server behind: one
+        # still starting, or hung.
+        state = read_state()
+        if state is not None:
+            deadline = time.monotonic() + timeout
+            while _pid_alive(state["pid"]) and time.monotonic() < deadline:
+                if _healthy(state["url"]):
+                    break
+                time.sleep(0.2)
+            else:
+                stop()
+                state = None
+    if state is not None:
+        state["reused"] = True
+        return state
+
+    url = f"http://localhost:{port}"
+    command = [
+        sys.executable,
+        "-m",
+        "streamlit",
+        "run",
+        APP_PATH,
+        "--server.headless",
+        "true",
+        "--server.port",
+        str(port),
+    ]
+    # Own session (own process group on Windows), so the server outlives the
+    # menu and its terminal.
+    if WINDOWS:
+        detach = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        detach = {"start_new_session": True}
+    started = time.monotonic()
+    with open(LOG_PATH, "ab") as log:
+        proc = subprocess.Popen(
+            command,
+            env={**os.environ, "STREAMLIT_MODE": "1"},
+            cwd=os.path.dirname(APP_PATH),
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            **detach,
+        )
+    state = {"pid": proc.pid, "port": port, "url": url, "log": LOG_PATH}
+    _write_state(state)
+
+    while time.monotonic() - started < timeout:
+        if proc.poll() is not None:
+            _clear_state()
+            raise RuntimeError(
+                f"Dashboard server exited with code {proc.returncode}; see {LOG_PATH}"
+            )
+        if _healthy(url):
+            state["reused"] = False
+            state["startup_seconds"] = round(time.monotonic() - started, 2)
+            return state
+        time.sleep(0.2)
+    stop()
+    raise RuntimeError(
+        f"Dashboard server did not start within {timeout:.0f}s; see {LOG_PATH}"
+    )
+
+
+def stop(timeout=10.0):
+    """Stop the recorded server. Returns True if one was running."""
+    state = read_state()
+    _clear_state()
+    if state is None or not _pid_alive(state["pid"]):
+        return False
+    try:
+        _terminate(state["pid"])
+    except ProcessLookupError:
+        return False
+    if state["pid"] == os.getpid():
+        # Called from inside the server, which cannot wait for itself.
+        return True
+    deadline = time.monotonic() + timeout
+    while _pid_alive(state["pid"]) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    if _pid_alive(state["pid"]):
+        _terminate(state["pid"], force=True)
+    return True
+
+
+def stop_self():
+    """
+    Stop the server this code runs in (the dashboard's Exit button). The
+    recorded server goes through stop(), which also clears the state file;
+    one started by hand with `streamlit run` just terminates. Another
+    recorded server is left alone.
+    """
+    state = read_state()
+    if state is not None and state["pid"] == os.getpid():
+        stop()
+    else:
+        _terminate(os.getpid(), group=False)
+
+
+def open_dashboard(port=DEFAULT_PORT):
+    """Start the server if needed and open the dashboard in a browser."""
+    state = start(port)
+    webbrowser.open(state["url"])
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Manage the background Streamlit dashboard server."
+    )
+    parser.add_argument("command", choices=("start", "stop", "status", "open"))
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    if args.command == "stop":
+        print("Dashboard server stopped." if stop() else "No dashboard server running.")
+        return
+    if args.command == "status":
+        state = status()
+        if state is None:
+            print("No dashboard server running.")
+        else:
+            print(f"Dashboard server running at {state['url']} (pid {state['pid']}).")
+        return
+    try:
+        state = (
+            open_dashboard(args.port) if args.command == "open" else start(args.port)
+        )
+    except RuntimeError as e:
+        sys.exit(str(e))
+    how = (
+        "already running"
+        if state["reused"]
+        else f"started in {state['startup_seconds']}s"
+    )
+    print(f"Dashboard server at {state['url']} (pid {state['pid']}, {how}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Shared database engine for every entry point.
+
+get_engine() builds one pooled SQLAlchemy engine per process and hands the
+same instance to every caller, so connections are opened once and reused
+instead of being set up for each script step or dashboard rerun. The
+Streamlit dashboard goes through get_streamlit_engine(), which registers
+the engine as a Streamlit resource.
+
+The connection string is built from secret.py unless NORTHWIND_DATABASE_URL
+is set. Pool settings come from the environment:
+    NORTHWIND_POOL_SIZE       connections kept open (default 5)
+    NORTHWIND_MAX_OVERFLOW    extra connections allowed under load (default 10)
+    NORTHWIND_POOL_RECYCLE    seconds before a connection is replaced (default 1800)
+    NORTHWIND_POOL_PRE_PING   test connections before use, 0 to disable (default 1)
+    NORTHWIND_POOL_TIMEOUT    seconds to wait for a free connection (default 30)
+    NORTHWIND_QUERY_TIMING    1 to time every statement (metrics.instrument_engine)
+"""
+
+import os
+import threading
+
+from sqlalchemy import create_engine
+
+POOL_SIZE = int(os.environ.get("NORTHWIND_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.environ.get("NORTHWIND_MAX_OVERFLOW", "10"))
+POOL_RECYCLE = int(os.environ.get("NORTHWIND_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.environ.get("NORTHWIND_POOL_PRE_PING", "1") != "0"
+POOL_TIMEOUT = int(os.environ.get("NORTHWIND_POOL_TIMEOUT", "30"))
+QUERY_TIMING = os.environ.get("NORTHWIND_QUERY_TIMING") == "1"
+
+_engine = None
+_engine_pid = None
+_lock = threading.Lock()
+
+
+def database_url():
+    """Return NORTHWIND_DATABASE_URL, or the URL built from secret.py."""
+    url = os.environ.get("NORTHWIND_DATABASE_URL")
+    if url:
+        return url
+    import secret  # Contains DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME
+
+    return (
+        f"postgresql://{secret.DB_USER}:{secret.DB_PASS}"
+        f"@{secret.DB_HOST}:{secret.DB_PORT}/{secret.DB_NAME}"
+    )
+
+
+def get_engine():
+    """
+    Return the process-wide pooled engine, creating it on first use.
+    A process forked after the engine was created (such as an ETL worker)
+    gets its own engine; the pooled connections inherited from the parent
+    are released without being closed, since the parent still uses them.
+    """
+    global _engine, _engine_pid
+    with _lock:
+        if _engine is not None and _engine_pid != os.getpid():
+            _engine.dispose(close=False)
+            _engine = None
+        if _engine is None:
+            _engine = create_engine(
+                database_url(),
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_recycle=POOL_RECYCLE,
+                pool_pre_ping=POOL_PRE_PING,
+                pool_timeout=POOL_TIMEOUT,
+            )
+            _engine_pid = os.getpid()
+            if QUERY_TIMING:
+                import metrics
+
+                metrics.instrument_engine(_engine)
+        return _engine
+
+
+def get_streamlit_engine():
+    """
+    Return get_engine() cached with st.cache_resource, so dashboard reruns
+    share the engine and it can be cleared from Streamlit's cache.
+    """
+    import streamlit as st
+
+    return st.cache_resource(get_engine, show_spinner=False)()
+
+
+def dispose_engine():
+    """Close every pooled connection; the next get_engine() starts afresh."""
+    global _engine
+    with _lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
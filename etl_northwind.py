@@ -1,39 +1,108 @@
+import argparse
+import concurrent.futures
+import io
 import os
+import sys
+import time
 import pandas as pd
-from sqlalchemy import create_engine, text
-import secret  # Contains DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME
+from sqlalchemy import text
+import csv_cache
+import db
+import metrics
+import northwind_schema
+import partitions
+import query_cache
+import refresh_views
+import rollup
+import schema_catalog
+import segmentation
+import star_schema
+import validation
+from mylogger import logger
 
+# Strategies accepted by load_data(): bulk COPY or pandas' to_sql inserts.
+LOAD_METHODS = ("copy", "to_sql")
 
-def get_engine():
-    """Construct the SQLAlchemy engine using credentials from secret.py."""
-    connection_string = (
-        f"postgresql://{secret.DB_USER}:{secret.DB_PASS}"
-        f"@{secret.DB_HOST}:{secret.DB_PORT}/{secret.DB_NAME}"
-    )
-    engine = create_engine(connection_string)
-    return engine
+# Rows read from a CSV per chunk; bounds the memory used by each table's load.
+DEFAULT_CHUNKSIZE = 100_000
+
+# full = drop and rebuild every table, incremental = upsert new/changed rows.
+LOAD_MODES = ("full", "incremental")
+
+# Stages of a table's load timed by run_table(), reported as <stage>_seconds.
+STAGES = ("extract", "transform", "load", "index")
+
+# CSV file of each table, inside the data directory.
+CSV_FILES = {
+    "customers": "customers.csv",
+    "products": "products.csv",
+    "orders": "orders.csv",
+    "order_details": "order_details.csv",
+}
+
+# Primary key of each table, used as the ON CONFLICT target for upserts.
+PRIMARY_KEYS = {
+    table_name: spec["primary_key"]
+    for table_name, spec in northwind_schema.TABLES.items()
+}
 
+# Tables each table must wait for when foreign keys tie them together:
+# dimensions first, then orders, then order_details.
+TABLE_DEPENDENCIES = {
+    "customers": [],
+    "products": [],
+    "orders": ["customers"],
+    "order_details": ["orders", "products"],
+}
 
-def extract_data(file_path):
-    """Extract data from a CSV file using Pandas."""
+# High-water marks kept per table as (column, comparison). In incremental mode
+# a row is reloaded if any of its watermark columns passes the comparison
+# against the stored mark ("gt" = newer ids, "ge" = same day or later, so late
+# same-day rows are merged again). Tables without an entry are small
+# dimensions: all rows are staged and only changed ones are written.
+WATERMARKS = {
+    "orders": [("order_id", "gt"), ("order_date", "ge")],
+    "order_details": [("order_item_id", "gt")],
+}
+
+
+def extract_chunks(file_path, table_name=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Extract data from a CSV file using Pandas, one chunk at a time.
+    Yields DataFrames of at most `chunksize` rows so the whole file never
+    has to fit in memory. Columns of tables declared in northwind_schema are
+    read with their declared dtypes and dates are parsed.
+    Parse errors are reported and re-raised, so callers never mistake a
+    partly read file for a complete one.
+    """
+    options = {}
+    if table_name in northwind_schema.TABLES:
+        options = northwind_schema.read_csv_options(table_name)
+    total_rows = 0
     try:
-        df = pd.read_csv(file_path)
-        print(f"Extracted {len(df)} rows from {file_path}")
-        return df
+        with pd.read_csv(file_path, chunksize=chunksize, **options) as reader:
+            for chunk in reader:
+                total_rows += len(chunk)
+                yield chunk
+        logger.info(f"Extracted {total_rows} rows from {file_path}")
     except Exception as e:
-        print(f"Error extracting {file_path}: {e}")
-        return None
+        logger.error(f"Error extracting {file_path}: {e}")
+        raise
 
 
 def transform_data(df):
     """
     Perform data transformation and cleaning.
-    For example: strip whitespace from all string columns.
+    For example: strip whitespace from all string and categorical columns.
     """
     if df is None:
         return None
     for col in df.select_dtypes(include="object").columns:
         df[col] = df[col].str.strip()
+    for col in df.select_dtypes(include="category").columns:
+        categories = df[col].cat.categories
+        if not categories.str.strip().equals(categories):
+            df[col] = df[col].astype("object").str.strip().astype("category")
     return df
 
 
@@ -46,46 +115,882 @@ def drop_table_cascade(engine, table_name):
         with engine.connect() as conn:
             conn.execute(text(f"DROP TABLE IF EXISTS public.{table_name} CASCADE"))
             conn.commit()  # Commit the DDL change
-        print(f"Dropped table {table_name} with CASCADE.")
+        logger.info(f"Dropped table {table_name} with CASCADE.")
     except Exception as e:
-        print(f"Error dropping table {table_name}: {e}")
+        logger.error(f"Error dropping table {table_name}: {e}")
+
+
+def copy_to_cursor(cursor, target, df):
+    """
+    Stream the DataFrame into `target` with COPY ... FROM STDIN on a psycopg2
+    cursor. The rows are serialized to CSV in an in-memory buffer, so
+    PostgreSQL parses them in one bulk operation.
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    columns = ", ".join(f'"{col}"' for col in df.columns)
+    cursor.copy_expert(f"COPY {target} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def copy_dataframe(engine, table_name, df):
+    """Bulk-load the DataFrame into an existing table with COPY."""
+    raw_conn = engine.raw_connection()
+    try:
+        with raw_conn.cursor() as cursor:
+            copy_to_cursor(cursor, f"public.{table_name}", df)
+        raw_conn.commit()
+    finally:
+        raw_conn.close()
 
 
-def load_data(engine, table_name, df):
+def create_table(engine, table_name, df, partitioned=False):
+    """
+    Create the table with the DDL declared in northwind_schema, or from the
+    DataFrame's columns for tables the schema does not know about. With
+    partitioned=True the table is range-partitioned by month (see partitions).
+    """
+    if table_name in northwind_schema.TABLES:
+        if partitioned:
+            sql = partitions.create_table_sql(table_name)
+        else:
+            sql = northwind_schema.create_table_sql(table_name)
+        with engine.connect() as conn:
+            conn.execute(text(sql))
+            conn.commit()
+    else:
+        df.head(0).to_sql(table_name, engine, schema="public", index=False)
+
+
+def build_indexes(engine, table_name, partitioned=False):
+    """
+    Add the table's primary key (if it has none yet) and create its
+    secondary indexes. Run after the bulk load so the rows are not indexed
+    one at a time while they are copied in. On a partitioned table the
+    primary key includes the partition key and every index is created on
+    each partition.
+    """
+    if table_name not in northwind_schema.TABLES:
+        return
+    with engine.connect() as conn:
+        has_pk = conn.execute(
+            text(
+                "SELECT 1 FROM information_schema.table_constraints "
+                "WHERE table_schema = 'public' AND table_name = :table "
+                "AND constraint_type = 'PRIMARY KEY'"
+            ),
+            {"table": table_name},
+        ).first()
+        if has_pk is None:
+            if partitioned:
+                conn.execute(text(partitions.primary_key_sql(table_name)))
+            else:
+                conn.execute(text(northwind_schema.primary_key_sql(table_name)))
+        for statement in northwind_schema.index_sql(table_name):
+            conn.execute(text(statement))
+        conn.commit()
+
+
+def load_data(engine, table_name, df, method="copy", replace=True, partitioned=False):
     """
     Load the DataFrame into the specified table in the database.
-    Drops the table with CASCADE first, then creates it fresh.
+    With replace=True the table is dropped with CASCADE first and created
+    fresh from the declared schema; with replace=False the rows are
+    appended to the existing table. With partitioned=True the table is
+    range-partitioned and the monthly partitions the rows need are created
+    before they are written.
+
+    method="copy" bulk-loads the rows with COPY; method="to_sql" inserts
+    them with DataFrame.to_sql.
+    Returns the number of rows loaded, or None if the load failed.
+    """
+    try:
+        if replace:
+            drop_table_cascade(engine, table_name)
+            create_table(engine, table_name, df, partitioned)
+        if partitioned:
+            partitions.ensure_partitions(
+                engine, table_name, df[partitions.PARTITION_KEY]
+            )
+        if method == "copy":
+            copy_dataframe(engine, table_name, df)
+        else:
+            df.to_sql(
+                table_name, engine, schema="public", if_exists="append", index=False
+            )
+    except Exception as e:
+        logger.error(f"Error loading data into table {table_name}: {e}")
+        return None
+    return len(df)
+
+
+def ensure_target_table(engine, table_name, df, partitioned=False):
+    """
+    Make sure the table exists with its primary key and indexes so it can
+    be upserted. A missing table is created from the declared schema.
+    """
+    with engine.connect() as conn:
+        exists = conn.execute(
+            text("SELECT to_regclass(:name) IS NOT NULL"), {"name": f"public.{table_name}"}
+        ).scalar()
+    if not exists:
+        create_table(engine, table_name, df, partitioned)
+    build_indexes(engine, table_name, partitioned)
+
+
+def upsert_data(engine, table_name, df, partitioned=False):
+    """
+    Merge the DataFrame into the table: COPY it into a temporary staging
+    table, then INSERT ... ON CONFLICT DO UPDATE into the target. Rows whose
+    values are unchanged are skipped by the WHERE clause, so only new or
+    changed rows are written.
+    On a partitioned table the conflict target includes the partition key,
+    so rows whose order_date changed are deleted from their old partition
+    before the merge re-inserts them into the new one. The order ids of
+    staged orders and order lines are queued for star_schema's next append.
+    Returns the number of rows inserted or updated, or None on failure.
+    """
+    key = PRIMARY_KEYS[table_name]
+    df = df.drop_duplicates(subset=key, keep="last")
+    stage = f"stage_{table_name}"
+    key_columns = [key]
+    if partitioned:
+        key_columns = partitions.primary_key_columns(table_name)
+    columns = [f'"{col}"' for col in df.columns]
+    non_keys = [f'"{col}"' for col in df.columns if col not in key_columns]
+    conflict = ", ".join(f'"{col}"' for col in key_columns)
+    column_list = ", ".join(columns)
+    updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in non_keys)
+    current = ", ".join(f"t.{col}" for col in non_keys)
+    incoming = ", ".join(f"EXCLUDED.{col}" for col in non_keys)
+    merge_sql = (
+        f"INSERT INTO public.{table_name} AS t ({column_list}) "
+        f"SELECT {column_list} FROM {stage} "
+        f"ON CONFLICT ({conflict}) DO UPDATE SET {updates} "
+        f"WHERE ({current}) IS DISTINCT FROM ({incoming})"
+    )
+
+    if partitioned:
+        partitions.ensure_partitions(engine, table_name, df[partitions.PARTITION_KEY])
+    raw_conn = engine.raw_connection()
+    try:
+        with raw_conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE {stage} "
+                f"(LIKE public.{table_name} INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            copy_to_cursor(cursor, stage, df)
+            if partitioned:
+                partition_key = f'"{partitions.PARTITION_KEY}"'
+                cursor.execute(
+                    f"DELETE FROM public.{table_name} AS t USING {stage} AS s "
+                    f'WHERE t."{key}" = s."{key}" '
+                    f"AND t.{partition_key} IS DISTINCT FROM s.{partition_key}"
+                )
+            cursor.execute(merge_sql)
+            merged = cursor.rowcount
+            # The star schema's next append picks these orders up again.
+            star_schema.queue_pending_orders(cursor, table_name, stage)
+        raw_conn.commit()
+    except Exception as e:
+        raw_conn.rollback()
+        logger.error(f"Error upserting data into table {table_name}: {e}")
+        return None
+    finally:
+        raw_conn.close()
+    return merged
+
+
+def ensure_watermark_table(engine):
+    """Create the etl_watermarks bookkeeping table if it does not exist."""
+    with engine.connect() as conn:
+        conn.execute(
+            text(
+                """
+                CREATE TABLE IF NOT EXISTS public.etl_watermarks (
+                  table_name TEXT NOT NULL,
+                  column_name TEXT NOT NULL,
+                  high_water TEXT NOT NULL,
+                  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                  PRIMARY KEY (table_name, column_name)
+                )
+                """
+            )
+        )
+        conn.commit()
+
+
+def read_watermarks(engine, table_name):
+    """Return {column: high_water} stored for the table (values are text)."""
+    ensure_watermark_table(engine)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT column_name, high_water FROM public.etl_watermarks "
+                "WHERE table_name = :table"
+            ),
+            {"table": table_name},
+        ).all()
+    return dict(rows)
+
+
+def write_watermarks(engine, table_name, high_water):
+    """Store the new high-water mark of each watermark column of the table."""
+    ensure_watermark_table(engine)
+    with engine.connect() as conn:
+        for column, value in high_water.items():
+            conn.execute(
+                text(
+                    "INSERT INTO public.etl_watermarks (table_name, column_name, high_water) "
+                    "VALUES (:table, :column, :value) "
+                    "ON CONFLICT (table_name, column_name) DO UPDATE "
+                    "SET high_water = EXCLUDED.high_water, updated_at = now()"
+                ),
+                {"table": table_name, "column": column, "value": str(value)},
+            )
+        conn.commit()
+
+
+def filter_new_rows(df, table_name, watermarks):
+    """
+    Keep only the rows past the stored high-water marks of the table.
+    Tables without watermark columns, or without a stored mark yet, are
+    returned unchanged.
+    """
+    mask = None
+    for column, op in WATERMARKS.get(table_name, []):
+        if column not in watermarks:
+            return df
+        bound = pd.Series([watermarks[column]]).astype(df[column].dtype).iloc[0]
+        # Rows without a value are kept, for validation to reject.
+        passed = getattr(df[column], op)(bound).fillna(True)
+        mask = passed if mask is None else mask | passed
+    return df if mask is None else df[mask]
+
+
+def update_high_water(high_water, table_name, df, watermarks):
+    """
+    Fold each watermark column's maximum over the loaded rows into
+    `high_water`. A column starts from its stored mark in `watermarks`, so
+    loading only older rows never moves the mark back.
+    """
+    for column, _ in WATERMARKS.get(table_name, []):
+        if df.empty:
+            continue
+        if column not in high_water and column in watermarks:
+            stored = pd.Series([watermarks[column]]).astype(df[column].dtype)
+            high_water[column] = stored.iloc[0]
+        chunk_max = df[column].max()
+        if pd.isna(chunk_max):
+            continue
+        if column not in high_water or chunk_max > high_water[column]:
+            high_water[column] = chunk_max
+
+
+def touched_months(dates):
+    """Return the distinct first-of-month dates ('YYYY-MM-01') of a date column."""
+    dates = pd.to_datetime(dates).dropna()
+    return set(dates.dt.to_period("M").unique().strftime("%Y-%m-01"))
+
+
+def order_months(engine, order_ids):
+    """
+    Return the first-of-month dates ('YYYY-MM-01') the given orders currently
+    have in the orders table. Orders not loaded yet are ignored.
+    """
+    ids = [int(order_id) for order_id in pd.unique(order_ids.dropna())]
+    if not ids:
+        return set()
+    with engine.connect() as conn:
+        return set(
+            conn.execute(
+                text(
+                    "SELECT DISTINCT to_char(order_date, 'YYYY-MM-01') "
+                    "FROM public.orders "
+                    "WHERE order_id = ANY(:ids) AND order_date IS NOT NULL"
+                ),
+                {"ids": ids},
+            ).scalars()
+        )
+
+
+def timed_chunks(chunks, timings, stage):
+    """Yield the items of `chunks`, adding the time taken to produce each to timings[stage]."""
+    chunks = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        timings[stage] += time.perf_counter() - start
+        if chunk is None:
+            return
+        yield chunk
+
+
+def timed_call(timings, stage, func, *args, **kwargs):
+    """Return func(*args, **kwargs), adding its run time to timings[stage]."""
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        timings[stage] += time.perf_counter() - start
+
+
+def run_table(
+    engine,
+    file_path,
+    table_name,
+    method="copy",
+    chunksize=DEFAULT_CHUNKSIZE,
+    mode="full",
+    cache=True,
+    validate=True,
+    reject_dir=validation.REJECT_DIR,
+    partition=False,
+):
     """
+    Stream one CSV through extract -> transform -> load, chunk by chunk.
+
+    In full mode the first chunk recreates the table and later chunks are
+    appended. In incremental mode nothing is dropped: each chunk is cut down
+    to the rows past the table's high-water marks and upserted through a
+    staging table. Either way only one chunk is held in memory at a time and
+    the table's watermarks are saved once all of its chunks have loaded.
+    A full load builds the primary key and indexes after the last chunk.
+    With cache=True (and pyarrow installed) the transformed chunks of an
+    unchanged CSV are read back from csv_cache instead of being re-parsed.
+    With validate=True each chunk is checked by validation.TableValidator
+    before it is loaded and failing rows go to `reject_dir` instead.
+    With partition=True, orders and order_details are created range-
+    partitioned by order month (an incremental load keeps whatever layout
+    the existing table has) and order_details rows get their order's date.
+    Returns a dict with the rows loaded, rows rejected, the size of the CSV
+    in bytes, elapsed seconds
+    (everything included) and the seconds spent in each stage: extract
+    (reading the CSV or cache), transform (transform_data, filtering and
+    validation), load and index build. It also holds the peak RSS in MiB
+    and, for orders and order_details in incremental mode, the months whose
+    sales the load changed: both the old and the new month of each upserted
+    order, and the month of each order that gained or changed a line.
+    "failed" is True when the load stopped on an error; the watermarks are
+    then left as they were.
+    """
+    metrics.reset_peak_memory()
+    start = time.perf_counter()
+    rows = 0
+    watermarks = read_watermarks(engine, table_name) if mode == "incremental" else {}
+    high_water = {}
+    timings = dict.fromkeys(STAGES, 0.0)
+    rejected = 0
+    months = set()
+    validator = None
+    partitioned = False
+    if table_name in partitions.PARTITIONED_TABLES:
+        kind = partitions.table_kind(engine, table_name)
+        if mode == "incremental" and kind is not None:
+            partitioned = kind == "partitioned"
+        else:
+            partitioned = partition
+    order_dates = None
+    if partitioned and table_name == "order_details":
+        order_dates = partitions.load_order_dates(engine)
+    if validate:
+        validator = validation.TableValidator(
+            engine, table_name, reject_dir, reconcile=(mode == "full")
+        )
+
+    chunks = None
+    if cache and csv_cache.available():
+        entry = csv_cache.cache_path(file_path, table_name)
+        if os.path.exists(entry):
+            logger.info(f"Reading {file_path} from cache {entry}")
+            chunks = timed_chunks(
+                csv_cache.read_chunks(entry, chunksize), timings, "extract"
+            )
+    if chunks is None:
+        chunks = (
+            timed_call(timings, "transform", transform_data, chunk)
+            for chunk in timed_chunks(
+                extract_chunks(file_path, table_name, chunksize), timings, "extract"
+            )
+        )
+        if cache and csv_cache.available():
+            chunks = csv_cache.write_through(chunks, entry)
+
+    completed = True
+    chunk_count = 0
     try:
-        drop_table_cascade(engine, table_name)
-        df.to_sql(table_name, engine, schema="public", if_exists="replace", index=False)
-        print(f"Loaded data into table: {table_name}")
+        for i, df in enumerate(chunks):
+            chunk_count += 1
+            if mode == "incremental":
+                new_rows = timed_call(
+                    timings, "transform", filter_new_rows, df, table_name, watermarks
+                )
+            else:
+                new_rows = df
+            if validator is not None:
+                new_rows = timed_call(
+                    timings, "transform", validator.validate, new_rows
+                )
+            if order_dates is not None:
+                new_rows = timed_call(
+                    timings,
+                    "transform",
+                    partitions.attach_order_dates,
+                    new_rows,
+                    order_dates,
+                )
+            if mode == "incremental":
+                if i == 0:
+                    ensure_target_table(engine, table_name, new_rows, partitioned)
+                if table_name == "orders":
+                    # An order that moves month also changes the month it left.
+                    months.update(order_months(engine, new_rows["order_id"]))
+                loaded = timed_call(
+                    timings,
+                    "load",
+                    upsert_data,
+                    engine,
+                    table_name,
+                    new_rows,
+                    partitioned,
+                )
+            else:
+                loaded = timed_call(
+                    timings,
+                    "load",
+                    load_data,
+                    engine,
+                    table_name,
+                    new_rows,
+                    method=method,
+                    replace=(i == 0),
+                    partitioned=partitioned,
+                )
+            if loaded is None:
+                completed = False
+                break
+            rows += loaded
+            if mode == "incremental" and loaded:
+                if table_name == "orders":
+                    months.update(touched_months(new_rows["order_date"]))
+                elif table_name == "order_details":
+                    months.update(order_months(engine, new_rows["order_id"]))
+            # Only rows that were written move the mark: a row filtered out
+            # or rejected by validation is looked at again on the next run.
+            update_high_water(high_water, table_name, new_rows, watermarks)
     except Exception as e:
-        print(f"Error loading data into table {table_name}: {e}")
+        logger.error(f"Error loading data into table {table_name}: {e}")
+        completed = False
+    finally:
+        chunks.close()
+
+    if completed and chunk_count == 0 and mode == "full":
+        # A cached header-only CSV yields no chunks at all; the table must
+        # still end up empty, like the file.
+        try:
+            drop_table_cascade(engine, table_name)
+            create_table(engine, table_name, pd.DataFrame(), partitioned)
+        except Exception as e:
+            logger.error(f"Error creating empty table {table_name}: {e}")
+            completed = False
+
+    if completed:
+        if validator is not None:
+            rejected = validator.finish()
+        if mode == "full":
+            timed_call(timings, "index", build_indexes, engine, table_name, partitioned)
+        if high_water:
+            write_watermarks(engine, table_name, high_water)
+        if rows:
+            logger.info(f"Loaded data into table: {table_name}")
+        elif mode == "full":
+            logger.warning(f"No rows in {file_path}; table {table_name} is empty.")
+        else:
+            logger.info(f"No new rows for table: {table_name}")
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "rejected": rejected,
+        "bytes": os.path.getsize(file_path) if os.path.exists(file_path) else 0,
+        "seconds": seconds,
+        **{f"{stage}_seconds": timings[stage] for stage in STAGES},
+        "peak_mb": metrics.peak_memory_mb(),
+        "months": sorted(months),
+        "failed": not completed,
+    }
+
+
+def log_load_summary(load_stats):
+    """
+    Log rows loaded, rows/second, stage times and peak memory for each
+    table. Each table's figures are also attached to its log record for the
+    JSON-lines handler in metrics.py.
+    """
+    logger.info("Load summary:")
+    for table_name, stats in load_stats.items():
+        seconds = stats["seconds"]
+        rate = stats["rows"] / seconds if seconds > 0 else 0.0
+        stages = ", ".join(
+            f"{stage} {stats[f'{stage}_seconds']:.2f}s" for stage in STAGES
+        )
+        logger.info(
+            f"  {table_name}: {stats['rows']} rows in {seconds:.2f}s "
+            f"({stats['rejected']} rejected, {rate:,.0f} rows/s; {stages}; "
+            f"peak {stats['peak_mb']:.1f} MiB)",
+            extra={
+                "metrics": {
+                    "table": table_name,
+                    **{k: v for k, v in stats.items() if k != "months"},
+                }
+            },
+        )
+
+
+def record_load_metrics(load_stats):
+    """
+    Add each table's load figures to the metrics registry: rows, rejected
+    rows and CSV bytes as counters, the time of each stage and of the whole
+    load as summaries, and the loading process's peak RSS as a gauge. The
+    tables may have loaded in worker processes, so the figures are taken
+    from their returned stats rather than recorded where they were measured.
+    """
+    if not metrics.enabled():
+        return
+    for table_name, stats in load_stats.items():
+        metrics.count("etl_rows", stats["rows"], table=table_name)
+        metrics.count("etl_rejected_rows", stats["rejected"], table=table_name)
+        metrics.count("etl_bytes", stats["bytes"], table=table_name)
+        metrics.observe("etl_table_seconds", stats["seconds"], table=table_name)
+        for stage in STAGES:
+            metrics.observe(
+                "etl_stage_seconds",
+                stats[f"{stage}_seconds"],
+                table=table_name,
+                stage=stage,
+            )
+        metrics.gauge(
+            "process_peak_rss_bytes",
+            int(stats["peak_mb"] * 2**20),
+            process="etl",
+            table=table_name,
+        )
+
+
+def has_foreign_keys(engine, tables):
+    """Return True if any foreign key constraint exists on the given tables."""
+    with engine.connect() as conn:
+        row = conn.execute(
+            text(
+                "SELECT 1 FROM information_schema.table_constraints "
+                "WHERE table_schema = 'public' AND constraint_type = 'FOREIGN KEY' "
+                "AND table_name = ANY(:tables) LIMIT 1"
+            ),
+            {"tables": list(tables)},
+        ).first()
+    return row is not None
+
+
+def load_table_job(file_path, table_name, options):
+    """
+    Process-pool entry point: load one table over the worker's own pooled
+    engine, which is reused by the later jobs the worker runs.
+    """
+    return run_table(db.get_engine(), file_path, table_name, **options)
+
+
+def critical_path_seconds(load_stats, dependencies):
+    """Length of the longest chain of dependent table loads, in seconds."""
+    finish = {}
+
+    def finish_time(table_name):
+        if table_name not in finish:
+            upstream = [
+                finish_time(dep)
+                for dep in dependencies[table_name]
+                if dep in load_stats
+            ]
+            finish[table_name] = load_stats[table_name]["seconds"] + max(
+                upstream, default=0.0
+            )
+        return finish[table_name]
+
+    return max((finish_time(table_name) for table_name in load_stats), default=0.0)
+
+
+def run_pipeline(engine, table_files, workers, options):
+    """
+    Load every table in `table_files` ({table_name: csv_path}) across a pool
+    of `workers` processes. When foreign keys exist between the tables, a
+    table is only started once the tables in TABLE_DEPENDENCIES have loaded.
+    The same order is kept when rows are validated, since foreign keys are
+    checked against the parent tables already in the database, and when
+    tables are partitioned, since order_details reads its order dates
+    from orders. Otherwise
+    all tables are independent and start immediately. A table whose
+    dependency failed (run_table reported "failed" or raised) is skipped.
+    Returns ({table_name: stats} for the tables that completed, sorted list
+    of the tables that failed or were skipped).
+    """
+    if (
+        options.get("validate")
+        or options.get("partition")
+        or any(partitions.table_kind(engine, t) == "partitioned" for t in table_files)
+        or has_foreign_keys(engine, table_files)
+    ):
+        dependencies = {
+            t: [d for d in TABLE_DEPENDENCIES[t] if d in table_files]
+            for t in table_files
+        }
+    else:
+        dependencies = {t: [] for t in table_files}
+
+    load_stats = {}
+    failed = set()
+    pending = list(table_files)
+    start = time.perf_counter()
+
+    def record(table_name, stats):
+        if stats["failed"]:
+            failed.add(table_name)
+        else:
+            load_stats[table_name] = stats
+
+    if workers <= 1:
+        for table_name in pending:
+            if failed.intersection(dependencies[table_name]):
+                logger.warning(
+                    f"Skipping {table_name}: a table it depends on failed to load."
+                )
+                failed.add(table_name)
+                continue
+            record(
+                table_name,
+                run_table(engine, table_files[table_name], table_name, **options),
+            )
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            running = {}
+            while pending or running:
+                for table_name in list(pending):
+                    deps = dependencies[table_name]
+                    if failed.intersection(deps):
+                        logger.warning(
+                            f"Skipping {table_name}: a table it depends on failed to load."
+                        )
+                        failed.add(table_name)
+                        pending.remove(table_name)
+                    elif all(dep in load_stats for dep in deps):
+                        future = pool.submit(
+                            load_table_job, table_files[table_name], table_name, options
+                        )
+                        running[future] = table_name
+                        pending.remove(table_name)
+                if not running:
+                    break
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    table_name = running.pop(future)
+                    try:
+                        record(table_name, future.result())
+                    except Exception as e:
+                        logger.error(f"Error loading table {table_name}: {e}")
+                        failed.add(table_name)
+
+    wall = time.perf_counter() - start
+    stage_total = sum(stats["seconds"] for stats in load_stats.values())
+    logger.info(
+        f"Wall time {wall:.2f}s with {workers} worker(s); "
+        f"critical path {critical_path_seconds(load_stats, dependencies):.2f}s; "
+        f"sum of table loads {stage_total:.2f}s."
+    )
+    return load_stats, sorted(failed)
+
+
+def csv_paths(data_dir):
+    """Return {table_name: csv_path} for the CSVs in `data_dir`."""
+    return {
+        table_name: os.path.join(data_dir, filename)
+        for table_name, filename in CSV_FILES.items()
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load the Northwind CSVs into PostgreSQL.")
+    parser.add_argument(
+        "--load-method",
+        choices=LOAD_METHODS,
+        default="copy",
+        help="copy = bulk COPY FROM STDIN (default), to_sql = DataFrame.to_sql inserts",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=DEFAULT_CHUNKSIZE,
+        help=f"rows read, transformed and loaded per chunk (default {DEFAULT_CHUNKSIZE})",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=LOAD_MODES,
+        default="full",
+        help="full = drop and rebuild every table (default), "
+        "incremental = upsert only rows past each table's watermark",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="cache",
+        action="store_false",
+        help="always parse the CSVs instead of reusing the Arrow cache in csv_cache",
+    )
+    parser.add_argument(
+        "--no-validate",
+        dest="validate",
+        action="store_false",
+        help="load rows without the data-quality checks in validation.py",
+    )
+    parser.add_argument(
+        "--reject-dir",
+        default=validation.REJECT_DIR,
+        help=f"where rows failing validation are written (default {validation.REJECT_DIR})",
+    )
+    parser.add_argument(
+        "--partition",
+        action="store_true",
+        help="create orders and order_details range-partitioned by order month "
+        "(see partitions.py)",
+    )
+    parser.add_argument(
+        "--model",
+        choices=star_schema.MODEL_MODES,
+        help="after loading, rebuild or append the star schema in star_schema.py "
+        "(default: rebuild for full loads, append for incremental loads), none = skip",
+    )
+    parser.add_argument(
+        "--segment-method",
+        choices=segmentation.SEGMENT_METHODS,
+        default="quantile",
+        help="how RFM scores are binned when customer_segments is rebuilt "
+        "(see segmentation.py, default quantile)",
+    )
+    parser.add_argument(
+        "--refresh",
+        choices=refresh_views.REFRESH_STRATEGIES,
+        default="concurrent",
+        help="after loading: concurrent = REFRESH MATERIALIZED VIEW CONCURRENTLY "
+        "monthly_sales (default), incremental = recompute only the months touched by "
+        "the loaded orders into monthly_sales_summary, none = skip",
+    )
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="directory holding the four CSVs (default data; generate_big_csv.py "
+        "writes larger ones to data/sf<scale>)",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        metavar="PATH",
+        help="record timing spans and append every log record to PATH as JSON "
+        "lines (see metrics.py; default $NORTHWIND_METRICS_JSON)",
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        metavar="PATH",
+        help="record metrics and write them to PATH in the Prometheus text format "
+        "when the run ends (default $NORTHWIND_METRICS_PROM)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(os.cpu_count() or 1, len(TABLE_DEPENDENCIES)),
+        help="processes loading tables in parallel (default: one per table, up to the CPU count)",
+    )
+    return parser.parse_args()
 
 
 def main():
-    # Directory where CSV files are stored
-    data_dir = "data"
-
-    # Mapping of CSV filenames to database table names
-    files_to_tables = {
-        "customers.csv": "customers",
-        "products.csv": "products",
-        "orders.csv": "orders",
-        "order_details.csv": "order_details",
+    args = parse_args()
+    metrics.configure(json_path=args.metrics_json, prometheus_path=args.metrics_prom)
+
+    table_files = csv_paths(args.data_dir)
+    options = {
+        "method": args.load_method,
+        "chunksize": args.chunksize,
+        "mode": args.mode,
+        "cache": args.cache,
+        "validate": args.validate,
+        "reject_dir": args.reject_dir,
+        "partition": args.partition,
     }
 
-    engine = get_engine()
+    engine = db.get_engine()
+    with metrics.span("etl.pipeline", mode=args.mode, workers=args.workers):
+        load_stats, failed = run_pipeline(engine, table_files, args.workers, options)
 
-    for filename, table_name in files_to_tables.items():
-        file_path = os.path.join(data_dir, filename)
-        df = extract_data(file_path)
-        df = transform_data(df)
-        if df is not None:
-            load_data(engine, table_name, df)
+    model = args.model or ("append" if args.mode == "incremental" else "rebuild")
+    try:
+        star_schema.build_star_schema(engine, model)
+    except Exception as e:
+        logger.error(f"Error building star schema ({model}): {e}")
+    if model != "none":
+        try:
+            segmentation.build_segments(engine, args.segment_method)
+        except Exception as e:
+            logger.error(f"Error building {segmentation.SEGMENT_TABLE}: {e}")
+        try:
+            rollup.refresh_cube(engine)
+        except Exception as e:
+            logger.error(f"Error refreshing {rollup.CUBE_TABLE}: {e}")
+
+    months = None
+    if args.mode == "incremental":
+        months = sorted(
+            {
+                month
+                for table_name in ("orders", "order_details")
+                for month in load_stats.get(table_name, {}).get("months", [])
+            }
+        )
+    with metrics.span("etl.refresh_views", strategy=args.refresh):
+        refresh_views.refresh_after_load(engine, args.refresh, months)
+
+    # Invalidate cached dashboard results that read the tables just changed.
+    changed = [
+        table_name
+        for table_name, stats in load_stats.items()
+        if args.mode == "full" or stats["rows"]
+    ]
+    try:
+        bumped = query_cache.bump_versions(engine, changed)
+        if bumped:
+            logger.info(f"Bumped data versions of: {', '.join(bumped)}")
+    except Exception as e:
+        logger.error(f"Error bumping data versions: {e}")
+
+    # Tables may have been created or altered and their row estimates have
+    # changed, so cached schema catalogs are reloaded on next use.
+    try:
+        schema_catalog.bump_schema_version(engine)
+    except Exception as e:
+        logger.error(f"Error bumping schema version: {e}")
 
-    print("ETL process completed successfully.")
+    log_load_summary(load_stats)
+    record_load_metrics(load_stats)
+    rejected = sum(stats["rejected"] for stats in load_stats.values())
+    if rejected:
+        logger.warning(
+            f"{rejected} row(s) failed validation and were not loaded; "
+            f"see {args.reject_dir}."
+        )
+    if failed:
+        logger.error(f"ETL process failed; tables not loaded: {', '.join(failed)}.")
+        sys.exit(1)
+    if rejected:
+        logger.warning("ETL process completed with rejected rows.")
+    else:
+        logger.info("ETL process completed successfully.")
 
 
 if __name__ == "__main__":
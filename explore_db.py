@@ -1,20 +1,10 @@
 import sys
 import os
-import datetime
-import subprocess
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sqlalchemy import create_engine, inspect, text
-import secret  # Contains DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME
-
-# Import our custom logger from mylogger.py
-from mylogger import logger
-
-# For console output using Rich:
+
+# Only what the text menu needs is imported here, so it comes up quickly.
+# pandas, SQLAlchemy, Streamlit and the project modules built on them are
+# imported inside the functions that use them (see benchmarks/import_time.py).
 from rich.console import Console
-from rich.table import Table
 from rich.panel import Panel
 from rich.text import Text
 
@@ -24,22 +14,28 @@ console = Console()
 # GLOBAL FUNCTIONS (Console Mode)
 ##########################################
 def get_pivot_advanced_global():
-    connection_string = f"postgresql://{secret.DB_USER}:{secret.DB_PASS}@{secret.DB_HOST}:{secret.DB_PORT}/{secret.DB_NAME}"
-    engine = create_engine(connection_string)
-    inspector = inspect(engine)
-    return inspector, engine
+    import db
+    import schema_catalog
+
+    engine = db.get_engine()
+    catalog = schema_catalog.get_catalog(engine)
+    return catalog, engine
 
 def get_pivot_traditional_global():
     return get_pivot_advanced_global()
 
 def run_console_mode():
-    connection_string = f"postgresql://{secret.DB_USER}:{secret.DB_PASS}@{secret.DB_HOST}:{secret.DB_PORT}/{secret.DB_NAME}"
-    engine = create_engine(connection_string)
-    inspector = inspect(engine)
+    from rich.table import Table
+    import backends
+    import query_library
+
+    # PostgreSQL unless NORTHWIND_BACKEND=duckdb (see backends.py).
+    backend = backends.get_backend()
     
     console.print(Panel.fit("[bold blue]Exploring the Database[/bold blue]"))
+    console.print(f"[bold]Backend:[/bold] {backend.describe()}")
     
-    tables = inspector.get_table_names(schema="public")
+    tables = backend.table_names()
     if not tables:
         console.print("[bold red]No tables found in the database.[/bold red]")
         return
@@ -50,27 +46,59 @@ def run_console_mode():
     
     for table in tables:
         console.print(Panel.fit(f"[bold green]Details for table: {table}[/bold green]"))
-        columns = inspector.get_columns(table, schema="public")
+        columns = backend.table_info(table)["columns"]
         table_obj = Table(title=f"Columns in {table}", show_lines=True)
         table_obj.add_column("Column Name", style="bold cyan")
+        table_obj.add_column("Type")
         for col in columns:
-            table_obj.add_row(col["name"])
+            table_obj.add_row(col["name"], col["type"])
         console.print(table_obj)
         try:
-            df = pd.read_sql_table(table, engine, schema="public")
-            console.print("[bold green]Sample Data:[/bold green]")
-            console.print(df.head().to_string())
+            browser = backend.table_browser(table, page_size=5)
+            df = browser.fetch()
+            console.print(f"[bold green]Sample Data:[/bold green] {browser.describe()}")
+            console.print(df.to_string())
         except Exception as e:
             console.print(f"[bold red]Error retrieving data for table {table}: {e}[/bold red]")
         console.print("\n" + "-"*50 + "\n")
 
+    # The sql_script/ queries with their default parameters, in one round trip.
+    # Queries marked "-- batch: no" return a row per order or similar, too many
+    # to fetch for a five-row preview; they are only listed.
+    library = query_library.discover()
+    if library:
+        console.print(Panel.fit("[bold green]Saved Queries (sql_script/):[/bold green]"))
+        try:
+            results = backend.run_batch([name for name, query in library.items() if query.batch])
+        except Exception as e:
+            console.print(f"[bold red]Error running saved queries: {e}[/bold red]")
+            results = {}
+        for name, df in results.items():
+            description = library[name].description
+            console.print(f"[bold cyan]{name}[/bold cyan] {description} ({len(df)} rows)")
+            console.print(df.head(5).to_string())
+        for name, query in library.items():
+            if not query.batch:
+                console.print(f"[bold cyan]{name}[/bold cyan] {query.description} "
+                              f"(not previewed; run: python query_library.py run {name})")
+
 ##########################################
 # STREAMLIT DASHBOARD FUNCTIONS
 ##########################################
 def run_streamlit_app():
-    import streamlit as st
     import time
+    import pandas as pd
     import plotly.express as px
+    import streamlit as st
+    import backends
+    import dashboard_panels
+    import query_library
+    import query_profiler
+    import rollup
+    import segmentation
+    import sql_runner
+    import table_browser
+    from mylogger import logger
 
     # Inject custom CSS for styling
     st.markdown(
@@ -105,126 +133,274 @@ def run_streamlit_app():
     st.title("Northwind Database Explorer Dashboard")
     st.write("Use the sidebar to choose a view.")
 
-    # Build connection
-    connection_string = f"postgresql://{secret.DB_USER}:{secret.DB_PASS}@{secret.DB_HOST}:{secret.DB_PORT}/{secret.DB_NAME}"
-    engine = create_engine(connection_string)
-    inspector = inspect(engine)
+    # The shared pooled engine, or the DuckDB database built from the CSVs;
+    # either is cached across reruns.
+    backend_names = list(backends.BACKENDS)
+    backend_name = st.sidebar.selectbox(
+        "Backend", backend_names,
+        index=backend_names.index(backends.DEFAULT_BACKEND) if backends.DEFAULT_BACKEND in backend_names else 0
+    )
+    try:
+        backend = backends.get_streamlit_backend(backend_name)
+    except Exception as e:
+        st.error(f"Error opening the {backend_name} backend: {e}")
+        return
+    st.sidebar.caption(backend.describe())
 
-    tables = inspector.get_table_names(schema="public")
+    # Dictionary reads from the cached catalog; on PostgreSQL it is reloaded
+    # only after the ETL or create_views.py bump the schema version.
+    tables = backend.table_names()
     if not tables:
         st.error("No tables found in the database.")
         return
 
     # Create a sidebar selectbox to choose a view.
-    available_views = ["Tables", "Analytics", "SQL Runner"]
+    available_views = ["Tables", "Analytics", "Saved Queries", "SQL Runner"]
     selected_view = st.sidebar.selectbox("Choose a view", available_views)
 
     if selected_view == "Tables":
         st.header("Table Details")
         selected_table = st.selectbox("Select a table", tables)
-        # Column descriptions dictionary
-        column_descriptions = {
-            "customers": {
-                "customer_id": "Unique ID for each customer",
-                "name": "Customer's full name",
-                "email": "Customer email address",
-                "registration_date": "Date when the customer registered"
-            },
-            "products": {
-                "product_id": "Unique product identifier",
-                "name": "Name of the product",
-                "category": "Product category",
-                "price": "Unit price",
-                "stock_quantity": "Quantity in stock"
-            },
-            "orders": {
-                "order_id": "Unique order identifier",
-                "customer_id": "ID of the customer who placed the order",
-                "order_date": "Order placement date",
-                "total_amount": "Total order amount"
-            },
-            "order_details": {
-                "order_item_id": "Unique ID for each order line",
-                "order_id": "Associated order ID",
-                "product_id": "Product identifier",
-                "quantity": "Quantity ordered",
-                "price_at_order": "Price at the time of order"
-            }
-        }
         st.subheader(f"Details for table: {selected_table}")
-        columns = inspector.get_columns(selected_table, schema="public")
+        columns = backend.table_info(selected_table)["columns"]
         cols_info = ""
         for col in columns:
-            desc = column_descriptions.get(selected_table, {}).get(col["name"], "No description available")
-            cols_info += f"- **{col['name']}**: {desc}\n"
+            cols_info += f"- **{col['name']}** (`{col['type']}`): {col['description']}\n"
         st.markdown("### Columns:")
         st.markdown(cols_info)
         try:
-            df = pd.read_sql_table(selected_table, engine, schema="public")
-            st.markdown("### Sample Data:")
-            st.dataframe(df.head())
+            st.markdown("### Data:")
+            col_size, col_sort, col_desc = st.columns(3)
+            page_size = col_size.selectbox(
+                "Rows per page", table_browser.PAGE_SIZES,
+                index=table_browser.PAGE_SIZES.index(table_browser.DEFAULT_PAGE_SIZE)
+            )
+            sort = col_sort.selectbox("Sort by", ["(primary key)"] + [col["name"] for col in columns])
+            descending = col_desc.checkbox("Descending")
+            sort = None if sort == "(primary key)" else sort
+            # Keep the browser (and its page position) across reruns until
+            # the table or the ordering changes.
+            browser_key = (backend.name, selected_table, page_size, sort, descending)
+            if st.session_state.get("table_browser_key") != browser_key:
+                st.session_state["table_browser"] = backend.table_browser(
+                    selected_table, page_size=page_size, sort=sort, descending=descending
+                )
+                st.session_state["table_browser_key"] = browser_key
+                st.session_state["table_browser_page"] = None
+            browser = st.session_state["table_browser"]
+
+            # Button callbacks run before the next rerun, so the new page is
+            # fetched (one keyset query) before the buttons are drawn.
+            def turn_page(move):
+                move()
+                st.session_state["table_browser_page"] = None
+
+            if st.session_state["table_browser_page"] is None:
+                st.session_state["table_browser_page"] = browser.fetch()
+            col_prev, col_next = st.columns(2)
+            col_prev.button("Previous page", disabled=not browser.has_prev,
+                            on_click=turn_page, args=(browser.prev_page,))
+            col_next.button("Next page", disabled=not browser.has_next,
+                            on_click=turn_page, args=(browser.next_page,))
+            st.caption(browser.describe())
+            st.dataframe(st.session_state["table_browser_page"])
         except Exception as e:
             st.error(f"Error retrieving data for table {selected_table}: {e}")
 
     elif selected_view == "Analytics":
         st.header("Advanced Analytics")
-        st.markdown("### Monthly Sales")
-        try:
-            query = "SELECT month, orders_count, total_sales FROM monthly_sales ORDER BY month;"
-            df_sales = pd.read_sql_query(query, engine)
-            df_sales['month'] = pd.to_datetime(df_sales['month'])
+        # Widgets stay on the script thread; the panels below only read their values.
+        by = st.multiselect(
+            "Sales cube: break down by", list(rollup.DIMENSIONS), default=["month", "category"]
+        )
+        segments = st.multiselect(
+            "Sales cube: customer segments",
+            segmentation.SEGMENT_NAMES,
+        )
+        filters = {"segment": segments} if segments else None
+
+        def load_monthly_sales(backend):
+            # sql_script/monthly_sales.sql; on PostgreSQL, prepared once per pooled connection.
+            return backend.run_named("monthly_sales")
+
+        def render_monthly_sales(df_sales):
             fig = px.line(df_sales, x='month', y='total_sales', title="Monthly Sales")
             st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error retrieving monthly sales data: {e}")
 
-        st.markdown("### Customer Segmentation")
-        try:
-            query = """
-            WITH customer_orders AS (
-                SELECT customer_id, COUNT(order_id) AS order_count
-                FROM orders
-                GROUP BY customer_id
-            )
-            SELECT customer_id, order_count,
-                   CASE 
-                     WHEN order_count >= 10 THEN 'High Frequency'
-                     WHEN order_count >= 5 THEN 'Medium Frequency'
-                     ELSE 'Low Frequency'
-                   END AS segment
-            FROM customer_orders
-            ORDER BY order_count DESC;
-            """
-            df_seg = pd.read_sql_query(query, engine)
-            df_grouped = df_seg.groupby("segment").size().reset_index(name="count")
-            fig2 = px.pie(df_grouped, names='segment', values='count', title="Customer Segmentation")
+        def load_segmentation(backend):
+            # One aggregated row per RFM segment (see segmentation.py).
+            return backend.segment_counts()
+
+        def render_segmentation(df_segments):
+            fig2 = px.pie(df_segments, names='segment', values='customers', title="Customer Segmentation")
             st.plotly_chart(fig2, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error retrieving customer segmentation data: {e}")
+            st.dataframe(df_segments)
+
+        def load_sales_cube(backend):
+            df_cube = backend.query_cube(by, filters)
+            df_cube['revenue'] = df_cube['revenue'].astype(float)
+            if "month" in df_cube.columns:
+                df_cube['month'] = pd.to_datetime(df_cube['month'])
+            return df_cube
+
+        def render_sales_cube(df_cube):
+            dims = [dim for dim in rollup.DIMENSIONS if dim in df_cube.columns]
+            color = next((dim for dim in dims if dim != "month"), None)
+            if "month" in dims:
+                fig3 = px.line(df_cube, x='month', y='revenue', color=color, title="Revenue by Month")
+                st.plotly_chart(fig3, use_container_width=True)
+            elif dims:
+                fig3 = px.bar(df_cube, x=dims[0], y='revenue', color=color, barmode='group', title="Revenue")
+                st.plotly_chart(fig3, use_container_width=True)
+            st.dataframe(df_cube)
+
+        # Independent panels: their queries run concurrently and each is drawn
+        # as soon as its data arrives.
+        dashboard_panels.render_streamlit(backend, [
+            dashboard_panels.Panel("Monthly Sales", load_monthly_sales, render_monthly_sales),
+            dashboard_panels.Panel("Customer Segmentation", load_segmentation, render_segmentation),
+            dashboard_panels.Panel("Sales Cube", load_sales_cube, render_sales_cube),
+        ])
+
+    elif selected_view == "Saved Queries":
+        st.header("Saved Queries")
+        library = query_library.discover()
+        if not library:
+            st.info(f"No .sql files in {query_library.SCRIPT_DIR}.")
+        selected = st.multiselect("Queries", list(library), default=list(library)[:1])
+        requests = []
+        for name in selected:
+            query = library[name]
+            st.subheader(name)
+            if query.description:
+                st.caption(query.description)
+            params = {}
+            cols = st.columns(max(len(query.params), 1))
+            for col, (param, (sql_type, default)) in zip(cols, query.params.items()):
+                key = f"saved_query_{name}_{param}"
+                if sql_type == "date":
+                    params[param] = col.date_input(param, value=default, key=key)
+                elif sql_type in ("integer", "bigint", "smallint"):
+                    params[param] = col.number_input(param, value=default, step=1, key=key)
+                    if params[param] is not None:
+                        params[param] = int(params[param])
+                else:
+                    params[param] = col.text_input(param, value=default or "", key=key) or None
+            requests.append((name, params))
+        # Every selected query is answered in one round trip (cached results
+        # are reused) and the results stay in the query cache.
+        if requests and st.button("Run queries"):
+            try:
+                start = time.perf_counter()
+                results = backend.run_batch(requests)
+                st.caption(f"{len(results)} queries in {time.perf_counter() - start:.3f}s")
+                for name, df in results.items():
+                    st.markdown(f"**{name}** ({len(df):,} rows)")
+                    st.dataframe(df)
+            except Exception as e:
+                st.error(f"Error running saved queries: {e}")
 
     elif selected_view == "SQL Runner":
         st.header("SQL Runner")
-        st.markdown("Enter your SQL query below and click **Run SQL**.")
+        st.markdown(
+            "Enter your SQL query below and click **Run SQL**, or **Profile** to see its plan "
+            "under EXPLAIN (ANALYZE, BUFFERS) with flagged nodes and candidate indexes "
+            "(PostgreSQL backend only)."
+        )
         sql_query = st.text_area("SQL Query", height=200)
-        if st.button("Run SQL"):
+        col_rows, col_timeout = st.columns(2)
+        max_rows = col_rows.number_input(
+            "Row limit", min_value=1, max_value=1_000_000, value=sql_runner.DEFAULT_MAX_ROWS
+        )
+        timeout_s = col_timeout.number_input(
+            "Timeout (seconds)", min_value=1, max_value=3600,
+            value=sql_runner.DEFAULT_TIMEOUT_MS // 1000
+        )
+        col_run, col_profile, col_cancel = st.columns(3)
+        if col_run.button("Run SQL"):
+            st.session_state.pop("sql_profile", None)
+            previous = st.session_state.get("sql_run")
+            if previous is not None and previous.running:
+                previous.cancel()
+            st.session_state["sql_run"] = backend.query_run(
+                sql_query, max_rows=int(max_rows), timeout_ms=int(timeout_s) * 1000
+            ).start()
+        if col_profile.button("Profile", disabled=not backend.can_profile):
+            st.session_state.pop("sql_run", None)
             try:
-                with engine.connect() as conn:
-                    result = conn.execute(text(sql_query))
-                    try:
-                        df = pd.DataFrame(result.fetchall(), columns=result.keys())
-                        st.dataframe(df)
-                    except Exception as e:
-                        st.write("Query executed successfully, but no tabular result to display.")
+                with st.spinner("Running EXPLAIN ANALYZE..."):
+                    st.session_state["sql_profile"] = query_profiler.profile(
+                        backend.engine, sql_query, timeout_ms=int(timeout_s) * 1000
+                    )
             except Exception as e:
-                st.error(f"Error executing SQL query: {e}")
+                st.session_state.pop("sql_profile", None)
+                st.error(f"Error profiling SQL query: {e}")
+        profile = st.session_state.get("sql_profile")
+        if profile is not None:
+            st.caption(
+                f"Planning {profile['planning_ms']:.2f} ms, "
+                f"execution {profile['execution_ms']:.2f} ms (changes rolled back)"
+            )
+            for flag in profile["flags"]:
+                st.warning(flag)
+            st.dataframe(pd.DataFrame([
+                {
+                    "node": "\u2003" * node["depth"] + query_profiler.node_label(node),
+                    "total ms": node["total_ms"],
+                    "self ms": node["self_ms"],
+                    "rows": node["rows"],
+                    "estimated rows": node["estimated_rows"],
+                    "actual / estimated": node["estimate_error"],
+                    "buffers hit": node["buffers_hit"],
+                    "buffers read": node["buffers_read"],
+                    "flags": "; ".join(node["flags"]),
+                }
+                for node in profile["nodes"]
+            ]))
+            with st.expander("Plan tree"):
+                st.code(query_profiler.render_text(profile), language="text")
+            if profile["indexes"]:
+                st.markdown("**Candidate indexes**")
+                st.code(
+                    "\n".join(f"{index['statement']}  -- {index['reason']}" for index in profile["indexes"]),
+                    language="sql",
+                )
+        run = st.session_state.get("sql_run")
+        if run is not None:
+            # Clicking Cancel reruns the script, which stops the polling loop
+            # below; the query itself is cancelled on the server.
+            if col_cancel.button("Cancel query", disabled=not run.running):
+                run.cancel()
+                run.wait(5)
+            status = st.empty()
+            results = st.empty()
+            shown = -1
+            while True:
+                status.caption(run.describe())
+                if run.rows != shown:
+                    shown = run.rows
+                    results.dataframe(run.result())
+                if not run.running:
+                    break
+                time.sleep(0.25)
+            status.caption(run.describe())
+            if run.status == "error":
+                st.error(f"Error executing SQL query: {run.error}")
+            elif run.status == "timeout":
+                st.error(f"Query cancelled after the {run.timeout_ms // 1000}s timeout.")
+            elif run.status == "cancelled":
+                st.warning("Query cancelled.")
+            elif run.columns is None:
+                st.write("Query executed successfully, but no tabular result to display.")
     
     st.markdown("---")
-    st.write("Click the button below to exit the dashboard and return to the text-based menu.")
+    st.write("Click the button below to stop the dashboard server and return to the text-based menu.")
     if st.button("Exit Dashboard"):
+        import dashboard_server
         st.write("Exiting dashboard...")
         logger.info("Dashboard exit triggered by user.")
         time.sleep(1)
-        os._exit(0)
+        dashboard_server.stop_self()
 
 ##########################################
 # TEXT-BASED MENU FUNCTIONS
@@ -236,14 +412,32 @@ def run_text_menu():
         console.print("Select an option:")
         console.print("1. Console Output (Explore Database)")
         console.print("2. Launch Interactive Dashboard (Streamlit)")
-        console.print("3. Exit")
-        choice = input("Enter your choice (1/2/3): ").strip()
+        console.print("3. Stop Dashboard Server")
+        console.print("4. Exit")
+        choice = input("Enter your choice (1/2/3/4): ").strip()
         if choice == "1":
             run_console_mode()
         elif choice == "2":
+            # Attach to the background server, starting it only if it is not
+            # already running (see dashboard_server.py).
+            import dashboard_server
             console.print(Panel.fit(Text("Launching Streamlit Dashboard...", style="bold green"), title="Dashboard", border_style="green"))
-            subprocess.run(["streamlit", "run", __file__], env={**os.environ, "STREAMLIT_MODE": "1"})
+            try:
+                state = dashboard_server.open_dashboard()
+            except RuntimeError as e:
+                console.print(Panel.fit(Text(str(e), style="bold red"), title="Error", border_style="red"))
+                continue
+            if state["reused"]:
+                console.print(f"Dashboard already running at {state['url']}")
+            else:
+                console.print(f"Dashboard started at {state['url']} in {state['startup_seconds']}s")
         elif choice == "3":
+            import dashboard_server
+            if dashboard_server.stop():
+                console.print("Dashboard server stopped.")
+            else:
+                console.print("No dashboard server running.")
+        elif choice == "4":
             console.print(Panel.fit(Text("Goodbye!", style="bold blue"), title="Exit", border_style="blue"))
             sys.exit(0)
         else:
@@ -253,11 +447,12 @@ def run_text_menu():
 # TERMINAL MODE FUNCTIONS (Dummy Recommendations)
 ##########################################
 def terminal_recommendation(console):
+    import db
+    import schema_catalog
+
     console.print(Panel.fit(Text("Generating traditional recommendations...", style="bold blue"), title="Engine", border_style="blue"))
-    connection_string = f"postgresql://{secret.DB_USER}:{secret.DB_PASS}@{secret.DB_HOST}:{secret.DB_PORT}/{secret.DB_NAME}"
-    engine = create_engine(connection_string)
-    inspector = inspect(engine)
-    tables = inspector.get_table_names(schema="public")
+    engine = db.get_engine()
+    tables = schema_catalog.table_names(engine)
     console.print("\nEnter a table name for recommendations (partial names accepted):")
     table_query = input("Table Name: ").strip()
     from thefuzz import process
@@ -274,8 +469,10 @@ def terminal_recommendation(console):
 
 def terminal_advanced_recommendation(console):
     console.print(Panel.fit(Text("Generating advanced recommendations using NMF...", style="bold blue"), title="Advanced Engine", border_style="blue"))
-    inspector, engine = get_pivot_advanced_global()
-    tables = inspector.get_table_names(schema="public")
+    import schema_catalog
+
+    _, engine = get_pivot_advanced_global()
+    tables = schema_catalog.table_names(engine)
     console.print("\nEnter a table name for advanced recommendations (partial names accepted):")
     table_query = input("Table Name: ").strip()
     from thefuzz import process
@@ -294,7 +491,6 @@ def terminal_advanced_recommendation(console):
 # MAIN EXECUTION
 ##########################################
 if __name__ == "__main__":
-    import subprocess
     if os.environ.get("STREAMLIT_MODE") == "1":
         run_streamlit_app()
     else:
@@ -0,0 +1,404 @@
+"""
+Synthetic Northwind CSVs at a chosen scale factor.
+
+Scale factor 1 is the size of the bundled data/ files: 1,000 customers,
+200 products, 5,000 orders and 10,000 order lines. Customers, orders and
+order lines grow linearly with the scale factor, and products with its
+square root. SF 10000 therefore has 10M customers, 50M orders, 100M order
+lines and 20,000 products.
+
+Columns are generated with NumPy, CHUNK_ROWS rows at a time. Every chunk is
+generated and written by a pool of processes, each into its own part file,
+and the parts are then concatenated in order. Parts are written with
+pyarrow's CSV writer when pyarrow is installed, else with DataFrame.to_csv.
+Each chunk draws from its own random stream, derived from the seed, the
+table and the chunk number, so a seed always produces the same files
+whatever the number of processes.
+
+The data is consistent:
+- Customers and products are picked with Zipf-like popularity (weight
+  1/rank**s over a seeded shuffle of the ids), so a few customers order
+  often and a few products sell most.
+- Every customer_id and product_id referenced exists.
+- Orders are dated between their customer's registration and END_DATE.
+- orders.total_amount is exactly the sum of quantity * price_at_order of
+  the order's lines (computed in integer cents).
+
+Usage:
+    python generate_big_csv.py --scale 100 [--seed 42] [--workers 8] [--out data/sf100]
+    python etl_northwind.py --data-dir data/sf100
+"""
+
+import argparse
+import concurrent.futures
+import functools
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+
+MAX_SCALE = 10_000
+
+# Rows of each table at scale factor 1 (the bundled data/ files).
+BASE_ROWS = {"customers": 1_000, "products": 200, "orders": 5_000}
+LINES_PER_ORDER = 2
+
+# Rows generated and written per task.
+CHUNK_ROWS = 1_000_000
+
+DEFAULT_SEED = 42
+
+# Zipf exponents of customer and product popularity.
+CUSTOMER_SKEW = 0.7
+PRODUCT_SKEW = 1.0
+
+REGISTRATION_START = np.datetime64("2020-02-14")
+ORDER_START = np.datetime64("2022-02-15")
+END_DATE = np.datetime64("2025-02-13")
+
+CATEGORIES = np.array(["Widgets", "Accessories", "Doohickeys", "Gadgets"], dtype=object)
+PRICE_CENTS = (500, 10_000)
+STOCK = (50, 501)
+QUANTITY = (1, 11)
+# Discount applied to a line's price, in percent; most lines pay full price.
+DISCOUNTS = np.array([0, 0, 0, 0, 0, 5, 10, 15, 20])
+
+FIRST_NAMES = np.array(
+    "James Mary John Patricia Robert Jennifer Michael Linda David Elizabeth "
+    "William Barbara Richard Susan Joseph Jessica Thomas Sarah Charles Karen "
+    "Daniel Lisa Matthew Nancy Anthony Betty Mark Sandra Steven Ashley Paul "
+    "Cynthia Andrew Donna Joshua Emily Kevin Michelle Brian Carol George Amanda".split(),
+    dtype=object,
+)
+LAST_NAMES = np.array(
+    "Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez Martinez "
+    "Hernandez Lopez Gonzalez Wilson Anderson Thomas Taylor Moore Jackson Martin "
+    "Lee Perez Thompson White Harris Sanchez Clark Ramirez Lewis Robinson Walker "
+    "Young Allen King Wright Scott Torres Nguyen Hill Flores Green Adams Aguilar".split(),
+    dtype=object,
+)
+EMAIL_DOMAINS = np.array(["example.com", "example.org", "example.net"], dtype=object)
+PRODUCT_WORDS = np.array(
+    "Ahead Forward Everything Down Quickly Out Truth Day Mention Coach Office "
+    "Type Group Base Accept Learn Might Until Item Indicate Bright Steady Prime "
+    "Solid Swift Clear Major Simple Select Smart Classic Modern Compact Royal "
+    "Silver Golden Rapid Urban Nova Peak Core Edge Pulse Spark Orbit Field".split(),
+    dtype=object,
+)
+
+COLUMNS = {
+    "customers": ["customer_id", "name", "email", "registration_date"],
+    "products": ["product_id", "name", "category", "price", "stock_quantity"],
+    "orders": ["order_id", "customer_id", "order_date", "total_amount"],
+    "order_details": [
+        "order_item_id",
+        "order_id",
+        "product_id",
+        "quantity",
+        "price_at_order",
+    ],
+}
+
+# Random stream ids, so each table and chunk draws independent numbers.
+_STREAMS = {
+    "registration": 0,
+    "customers": 1,
+    "products": 2,
+    "orders": 3,
+    "customer_rank": 4,
+    "product_rank": 5,
+    "product_price": 6,
+}
+
+
+def table_sizes(scale):
+    """Return the number of rows of each table at `scale`."""
+    if not 0 < scale <= MAX_SCALE:
+        raise ValueError(f"Scale factor must be in (0, {MAX_SCALE}], got {scale}")
+    orders = max(1, round(BASE_ROWS["orders"] * scale))
+    return {
+        "customers": max(1, round(BASE_ROWS["customers"] * scale)),
+        "products": max(1, round(BASE_ROWS["products"] * scale**0.5)),
+        "orders": orders,
+        "order_details": orders * LINES_PER_ORDER,
+    }
+
+
+def _rng(seed, stream, chunk=0):
+    return np.random.default_rng([seed, _STREAMS[stream], chunk])
+
+
+def _days(dates):
+    return dates.astype("datetime64[D]").astype(np.int64)
+
+
+def _dates(days):
+    return days.astype("datetime64[D]")
+
+
+def _money(cents):
+    return cents / 100
+
+
+@functools.lru_cache(maxsize=None)
+def _popularity(seed, stream, n, skew):
+    """
+    Return (cdf, ids): the cumulative Zipf weights of the popularity ranks
+    and the id holding each rank. Cached, as every chunk of a worker uses it.
+    """
+    weights = 1.0 / np.arange(1, n + 1, dtype=np.float64) ** skew
+    cdf = np.cumsum(weights)
+    cdf /= cdf[-1]
+    ids = _rng(seed, stream).permutation(n).astype(np.int32) + 1
+    return cdf, ids
+
+
+def _pick(rng, popularity, size):
+    """Draw `size` ids according to their popularity."""
+    cdf, ids = popularity
+    ranks = np.searchsorted(cdf, rng.random(size), side="right")
+    return ids[np.minimum(ranks, len(ids) - 1)]
+
+
+@functools.lru_cache(maxsize=None)
+def _registration_days(seed, customers):
+    """Registration day (days since the epoch) of every customer."""
+    start, end = _days(REGISTRATION_START), _days(END_DATE)
+    return _rng(seed, "registration").integers(start, end + 1, customers)
+
+
+@functools.lru_cache(maxsize=None)
+def _product_prices(seed, products):
+    """Price in cents of every product, indexed by product_id - 1."""
+    return _rng(seed, "product_price").integers(*PRICE_CENTS, products)
+
+
+def _write_part(columns, path):
+    """Write a chunk, given as {column: array}, to `path` without a header."""
+    # pyarrow's CSV writer is several times faster than DataFrame.to_csv.
+    if pa is not None:
+        table = pa.table(columns)
+        pa_csv.write_csv(table, path, pa_csv.WriteOptions(include_header=False))
+    else:
+        pd.DataFrame(columns).to_csv(path, index=False, header=False)
+    return len(next(iter(columns.values())))
+
+
+def customers_chunk(seed, sizes, chunk, part_path):
+    start = chunk * CHUNK_ROWS
+    stop = min(start + CHUNK_ROWS, sizes["customers"])
+    rng = _rng(seed, "customers", chunk)
+    n = stop - start
+    ids = np.arange(start + 1, stop + 1, dtype=np.int64)
+    first = FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), n)]
+    last = LAST_NAMES[rng.integers(0, len(LAST_NAMES), n)]
+    domains = EMAIL_DOMAINS[rng.integers(0, len(EMAIL_DOMAINS), n)]
+    first_lower = pd.Series(first).str.lower()
+    last_lower = pd.Series(last).str.lower()
+    email = first_lower + "." + last_lower + pd.Series(ids.astype(str)) + "@" + domains
+    email = email.to_numpy()
+    registered = _registration_days(seed, sizes["customers"])[start:stop]
+    columns = {
+        "customer_id": ids,
+        "name": first + " " + last,
+        "email": email,
+        "registration_date": _dates(registered),
+    }
+    return {"customers": _write_part(columns, part_path["customers"])}
+
+
+def products_chunk(seed, sizes, chunk, part_path):
+    n = sizes["products"]
+    rng = _rng(seed, "products", chunk)
+    words = PRODUCT_WORDS[rng.integers(0, len(PRODUCT_WORDS), (2, n))]
+    columns = {
+        "product_id": np.arange(1, n + 1),
+        "name": words[0] + " " + words[1],
+        "category": CATEGORIES[rng.integers(0, len(CATEGORIES), n)],
+        "price": _money(_product_prices(seed, n)),
+        "stock_quantity": rng.integers(*STOCK, n),
+    }
+    return {"products": _write_part(columns, part_path["products"])}
+
+
+def orders_chunk(seed, sizes, chunk, part_path):
+    """Write one chunk of orders and all of their order lines."""
+    start = chunk * CHUNK_ROWS
+    stop = min(start + CHUNK_ROWS, sizes["orders"])
+    n = stop - start
+    rng = _rng(seed, "orders", chunk)
+
+    customers = _pick(
+        rng,
+        _popularity(seed, "customer_rank", sizes["customers"], CUSTOMER_SKEW),
+        n,
+    )
+    # Each order is dated between its customer's registration (or the start
+    # of the order history) and END_DATE.
+    registered = _registration_days(seed, sizes["customers"])[customers - 1]
+    first_day = np.maximum(registered, _days(ORDER_START))
+    span = _days(END_DATE) - first_day + 1
+    order_days = first_day + (rng.random(n) * span).astype(np.int64)
+
+    # Every order has at least one line; the remaining lines of the chunk
+    # are spread over its orders at random.
+    lines_per_order = 1 + rng.multinomial(
+        n * (LINES_PER_ORDER - 1), np.full(n, 1.0 / n)
+    )
+    n_lines = n * LINES_PER_ORDER
+    order_ids = np.arange(start + 1, stop + 1, dtype=np.int64)
+    line_orders = np.repeat(order_ids, lines_per_order)
+    products = _pick(
+        rng,
+        _popularity(seed, "product_rank", sizes["products"], PRODUCT_SKEW),
+        n_lines,
+    )
+    quantity = rng.integers(*QUANTITY, n_lines)
+    list_price = _product_prices(seed, sizes["products"])[products - 1]
+    discount = DISCOUNTS[rng.integers(0, len(DISCOUNTS), n_lines)]
+    price_at_order = list_price * (100 - discount) // 100
+    order_starts = np.concatenate(([0], np.cumsum(lines_per_order)[:-1]))
+    total_cents = np.add.reduceat(quantity * price_at_order, order_starts)
+
+    orders = {
+        "order_id": order_ids,
+        "customer_id": customers,
+        "order_date": _dates(order_days),
+        "total_amount": _money(total_cents),
+    }
+    first_item = start * LINES_PER_ORDER + 1
+    lines = {
+        "order_item_id": np.arange(first_item, first_item + n_lines),
+        "order_id": line_orders,
+        "product_id": products,
+        "quantity": quantity,
+        "price_at_order": _money(price_at_order),
+    }
+    return {
+        "orders": _write_part(orders, part_path["orders"]),
+        "order_details": _write_part(lines, part_path["order_details"]),
+    }
+
+
+# Task per chunk: function, the table whose rows it chunks, files it writes.
+TASKS = [
+    (customers_chunk, "customers", ["customers"]),
+    (products_chunk, "products", ["products"]),
+    (orders_chunk, "orders", ["orders", "order_details"]),
+]
+
+
+def plan_tasks(sizes, parts_dir):
+    """Return (function, chunk, {table: part file}) for every chunk to write."""
+    tasks = []
+    for func, table, outputs in TASKS:
+        chunks = 1 if table == "products" else -(-sizes[table] // CHUNK_ROWS)
+        for chunk in range(chunks):
+            part_path = {
+                out: os.path.join(parts_dir, f"{out}.{chunk:05d}.csv")
+                for out in outputs
+            }
+            tasks.append((func, chunk, part_path))
+    return tasks
+
+
+def _run_task(func, seed, sizes, chunk, part_path):
+    start = time.perf_counter()
+    rows = func(seed, sizes, chunk, part_path)
+    return rows, time.perf_counter() - start
+
+
+def concatenate(parts, header, path):
+    """Write `header` and then each part file, in order, to `path`."""
+    with open(path, "wb") as out:
+        out.write((",".join(header) + "\n").encode())
+        for part in parts:
+            with open(part, "rb") as f:
+                shutil.copyfileobj(f, out, 16 * 2**20)
+            os.remove(part)
+
+
+def generate(scale, out_dir, seed=DEFAULT_SEED, workers=None):
+    """
+    Write customers.csv, products.csv, orders.csv and order_details.csv for
+    `scale` into `out_dir`. Returns the number of rows written per table.
+    """
+    sizes = table_sizes(scale)
+    parts_dir = os.path.join(out_dir, ".parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    tasks = plan_tasks(sizes, parts_dir)
+    workers = workers or os.cpu_count() or 1
+    print(
+        f"Generating SF {scale:g} (seed {seed}) into {out_dir}: "
+        + ", ".join(f"{rows:,} {table}" for table, rows in sizes.items())
+        + f"; {len(tasks)} chunks on {workers} processes."
+    )
+
+    start = time.perf_counter()
+    written = dict.fromkeys(COLUMNS, 0)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_run_task, func, seed, sizes, chunk, part_path)
+            for func, chunk, part_path in tasks
+        ]
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            rows, seconds = future.result()
+            for table, count in rows.items():
+                written[table] += count
+            print(f"  chunk {done}/{len(futures)} done in {seconds:.1f}s")
+
+    for table, header in COLUMNS.items():
+        parts = sorted(
+            path
+            for _, _, part_path in tasks
+            for out, path in part_path.items()
+            if out == table
+        )
+        concatenate(parts, header, os.path.join(out_dir, f"{table}.csv"))
+    os.rmdir(parts_dir)
+    print(
+        f"Wrote {sum(written.values()):,} rows in {time.perf_counter() - start:.1f}s."
+    )
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic Northwind CSVs at a scale factor."
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1,
+        help=f"scale factor, 1 = size of the bundled data (max {MAX_SCALE})",
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="processes generating chunks (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--out",
+        help="output directory (default data/sf<scale>); existing CSVs are replaced",
+    )
+    args = parser.parse_args()
+
+    try:
+        table_sizes(args.scale)
+    except ValueError as e:
+        parser.error(str(e))
+    out_dir = args.out or os.path.join("data", f"sf{args.scale:g}")
+    generate(args.scale, out_dir, args.seed, args.workers)
+
+
+if __name__ == "__main__":
+    main()
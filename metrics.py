@@ -0,0 +1,392 @@
+"""
+Timing spans, counters and metric export built on the northwind_explorer
+logger from mylogger.py.
+
+    with metrics.span("etl.star_schema", mode="rebuild"):
+        ...
+    @metrics.timed("views.refresh")
+    def refresh(...): ...
+    metrics.count("etl_rows", 5000, table="orders")
+    metrics.observe("etl_stage_seconds", 0.42, table="orders", stage="load")
+    metrics.sample_peak_memory(table="orders")
+
+Every finished span is logged at DEBUG, with its name, labels and duration
+attached to the record. The JSON-lines handler (NORTHWIND_METRICS_JSON)
+writes those fields as one JSON object per line, next to every other log
+record. The values are also aggregated in memory: counters, gauges and
+summaries (count and sum) keyed by name and labels. export_prometheus()
+writes them in the Prometheus text format, or OpenMetrics, for
+node_exporter's textfile collector.
+
+Nothing is recorded unless metrics are enabled. While disabled, span()
+returns a shared no-op context and the recording functions return at
+once, so instrumented code costs one flag check per call. configure()
+enables them, as do these environment variables:
+    NORTHWIND_METRICS=1            record spans and metrics
+    NORTHWIND_METRICS_JSON=path    also append log records as JSON lines
+    NORTHWIND_METRICS_PROM=path    write a Prometheus textfile at exit
+    NORTHWIND_QUERY_TIMING=1       time every SQL statement run by
+                                   db.get_engine()'s engine (see
+                                   instrument_engine)
+"""
+
+import atexit
+import contextlib
+import datetime
+import functools
+import json
+import logging
+import os
+import re
+import resource
+import sys
+import threading
+import time
+
+from mylogger import logger
+
+PREFIX = "northwind_"
+
+HELP = {
+    "span_seconds": "Duration of instrumented code spans.",
+    "etl_rows": "Rows loaded per table.",
+    "etl_rejected_rows": "Rows rejected by validation per table.",
+    "etl_bytes": "Bytes of CSV input processed per table.",
+    "etl_stage_seconds": "Time per ETL stage and table.",
+    "etl_table_seconds": "Time to load each table, stages included.",
+    "process_peak_rss_bytes": "Peak resident set size of the process.",
+    "db_query_seconds": "Duration of SQL statements, by statement type.",
+    "panel_load_seconds": "Time to load each dashboard panel's data.",
+}
+
+_lock = threading.Lock()
+_enabled = False
+_prometheus_path = None
+_openmetrics = False
+# (kind, name, labels) -> value; summaries hold [count, sum].
+_values = {}
+
+
+def enabled():
+    """Return True if spans and metrics are being recorded."""
+    return _enabled
+
+
+def configure(enabled=None, json_path=None, prometheus_path=None, openmetrics=False):
+    """
+    Enable (or disable) recording. Arguments left as None fall back to the
+    NORTHWIND_METRICS* environment variables. A JSON-lines path attaches a
+    JsonLinesHandler to the logger; a Prometheus path is written at exit.
+    Either path implies enabled=True.
+    """
+    global _enabled, _prometheus_path, _openmetrics
+    json_path = json_path or os.environ.get("NORTHWIND_METRICS_JSON")
+    prometheus_path = prometheus_path or os.environ.get("NORTHWIND_METRICS_PROM")
+    if enabled is None:
+        enabled = bool(
+            os.environ.get("NORTHWIND_METRICS") == "1" or json_path or prometheus_path
+        )
+    _enabled = enabled
+    if json_path and not any(
+        isinstance(h, JsonLinesHandler) and h.path == json_path for h in logger.handlers
+    ):
+        logger.addHandler(JsonLinesHandler(json_path))
+    if prometheus_path and _prometheus_path is None:
+        atexit.register(_export_at_exit)
+    _prometheus_path = prometheus_path or _prometheus_path
+    _openmetrics = openmetrics
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def count(name, value=1, **labels):
+    """Add `value` to the counter `name`."""
+    if not _enabled:
+        return
+    key = ("counter", name, _labels_key(labels))
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+
+
+def gauge(name, value, **labels):
+    """Set the gauge `name` to `value`."""
+    if not _enabled:
+        return
+    with _lock:
+        _values[("gauge", name, _labels_key(labels))] = value
+
+
+def observe(name, value, **labels):
+    """Record one observation (such as a duration) of the summary `name`."""
+    if not _enabled:
+        return
+    key = ("summary", name, _labels_key(labels))
+    with _lock:
+        summary = _values.setdefault(key, [0, 0.0])
+        summary[0] += 1
+        summary[1] += value
+
+
+class Span:
+    """A timed block; see span()."""
+
+    __slots__ = ("name", "labels", "start", "seconds")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.seconds = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        observe("span_seconds", self.seconds, span=self.name, **self.labels)
+        status = "failed" if exc_type else "ok"
+        logger.debug(
+            f"{self.name} {status} in {self.seconds:.3f}s",
+            extra={
+                "metrics": {
+                    "span": self.name,
+                    "seconds": self.seconds,
+                    "status": status,
+                    **self.labels,
+                }
+            },
+        )
+        return False
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name, **labels):
+    """
+    Return a context manager timing its block as `name`. The duration goes
+    to the span_seconds summary and a DEBUG log record.
+    """
+    if not _enabled:
+        return _NO_SPAN
+    return Span(name, labels)
+
+
+def timed(name=None, **labels):
+    """Decorator running the function inside span(name or its qualified name)."""
+
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def reset_peak_memory():
+    """
+    Reset the process's peak resident set size so the next reading covers
+    only the work done from here on. Supported on Linux only; elsewhere the
+    peak stays the high-water mark for the whole process.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_memory_mb():
+    """Return the process's peak resident set size in MiB."""
+    try:
+        with open("/proc/self/status") as f:
+            match = re.search(r"VmHWM:\s+(\d+) kB", f.read())
+        if match:
+            return int(match.group(1)) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is reported in bytes on macOS and in KiB on Linux.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def sample_peak_memory(**labels):
+    """Record the process's peak RSS as the process_peak_rss_bytes gauge."""
+    if not _enabled:
+        return
+    gauge("process_peak_rss_bytes", int(peak_memory_mb() * 2**20), **labels)
+
+
+def snapshot():
+    """Return a copy of every recorded value as {(kind, name, labels): value}."""
+    with _lock:
+        return {
+            key: list(value) if isinstance(value, list) else value
+            for key, value in _values.items()
+        }
+
+
+def reset():
+    """Forget every recorded value."""
+    with _lock:
+        _values.clear()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def render_prometheus(openmetrics=False):
+    """
+    Return the recorded values in the Prometheus text exposition format,
+    or in OpenMetrics (counters as _total, terminated by # EOF).
+    """
+    families = {}
+    for (kind, name, labels), value in sorted(snapshot().items()):
+        families.setdefault((name, kind), []).append((labels, value))
+    lines = []
+    for (name, kind), samples in families.items():
+        metric = PREFIX + name
+        lines.append(f"# HELP {metric} {HELP.get(name, name.replace('_', ' '))}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for labels, value in samples:
+            label_text = _format_labels(labels)
+            if kind == "summary":
+                lines.append(f"{metric}_count{label_text} {value[0]}")
+                lines.append(f"{metric}_sum{label_text} {value[1]:.6f}")
+            elif kind == "counter" and openmetrics:
+                lines.append(f"{metric}_total{label_text} {value}")
+            else:
+                lines.append(f"{metric}{label_text} {value}")
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def export_prometheus(path=None, openmetrics=None):
+    """
+    Write the recorded values to `path` (default: the configured
+    NORTHWIND_METRICS_PROM file). The file is replaced atomically, as the
+    textfile collector requires. Returns the path written, or None.
+    """
+    path = path or _prometheus_path
+    if path is None:
+        return None
+    if openmetrics is None:
+        openmetrics = _openmetrics
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_prometheus(openmetrics))
+    os.replace(tmp_path, path)
+    return path
+
+
+def _export_at_exit():
+    try:
+        export_prometheus()
+    except OSError as e:
+        logger.error(f"Could not write metrics to {_prometheus_path}: {e}")
+
+
+class JsonLinesHandler(logging.Handler):
+    """
+    Appends every log record to `path` as one JSON object per line: time,
+    level, logger, pid, message and any fields passed as extra={"metrics":
+    {...}}. Each line is written with a single append, so processes
+    sharing the file (such as ETL workers) do not interleave.
+    """
+
+    def __init__(self, path, level=logging.DEBUG):
+        super().__init__(level)
+        self.path = path
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def emit(self, record):
+        try:
+            payload = {
+                "time": datetime.datetime.fromtimestamp(
+                    record.created, datetime.timezone.utc
+                ).isoformat(timespec="milliseconds"),
+                "level": record.levelname,
+                "logger": record.name,
+                "pid": record.process,
+                "message": record.getMessage(),
+            }
+            payload.update(getattr(record, "metrics", None) or {})
+            line = json.dumps(payload, default=str) + "\n"
+            os.write(self.fd, line.encode())
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        super().close()
+
+
+def _statement_type(statement):
+    match = re.match(r"\s*(\w+)", statement)
+    return match.group(1).upper() if match else "UNKNOWN"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is discarded with the statement,
+    # so a statement that fails leaves nothing behind on the connection.
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    seconds = time.perf_counter() - start
+    kind = _statement_type(statement)
+    observe("db_query_seconds", seconds, statement=kind)
+    logger.debug(
+        f"{kind} took {seconds * 1000:.1f} ms",
+        extra={
+            "metrics": {
+                "query": " ".join(statement.split())[:200],
+                "statement": kind,
+                "seconds": seconds,
+            }
+        },
+    )
+
+
+def instrument_engine(engine):
+    """
+    Time every statement `engine` runs: each one adds to the
+    db_query_seconds summary (labelled by statement type) and logs a DEBUG
+    record with the first 200 characters of its SQL. Opt-in, since it adds
+    two event callbacks to every execution; db.get_engine() calls it when
+    NORTHWIND_QUERY_TIMING=1. Safe to call more than once.
+    """
+    from sqlalchemy import event
+
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+configure()
@@ -0,0 +1,108 @@
+"""
+Declared schema of the four Northwind tables loaded by etl_northwind.py.
+
+Each column maps to a (pandas dtype, PostgreSQL type) pair: the pandas side
+drives pd.read_csv so ids are read as compact Int32, categories as
+categoricals and dates as datetimes instead of whatever pandas infers; the
+PostgreSQL side drives the CREATE TABLE statements. Primary keys and
+secondary indexes are declared here too and built after the bulk load.
+
+Integer columns use the nullable Int32 extension type rather than numpy's
+int32: it parses slower, but a blank id reaches validation.py as a null to
+reject instead of failing the whole read. Money columns are kept as the
+CSV's text, so COPY hands PostgreSQL the exact decimal instead of a float.
+"""
+
+# pandas dtype used for columns that hold dates. They are parsed by read_csv
+# through parse_dates rather than the dtype mapping.
+DATE = "date"
+
+# pandas dtype of money columns: the text as written in the CSV.
+MONEY = "object"
+
+TABLES = {
+    "customers": {
+        "columns": {
+            "customer_id": ("Int32", "INTEGER"),
+            "name": ("object", "TEXT"),
+            "email": ("object", "TEXT"),
+            "registration_date": (DATE, "DATE"),
+        },
+        "primary_key": "customer_id",
+        "indexes": [],
+    },
+    "products": {
+        "columns": {
+            "product_id": ("Int32", "INTEGER"),
+            "name": ("object", "TEXT"),
+            "category": ("category", "TEXT"),
+            "price": (MONEY, "NUMERIC(12, 2)"),
+            "stock_quantity": ("Int32", "INTEGER"),
+        },
+        "primary_key": "product_id",
+        "indexes": [],
+    },
+    "orders": {
+        "columns": {
+            "order_id": ("Int32", "INTEGER"),
+            "customer_id": ("Int32", "INTEGER"),
+            "order_date": (DATE, "DATE"),
+            "total_amount": (MONEY, "NUMERIC(12, 2)"),
+        },
+        "primary_key": "order_id",
+        # customer_order_summary joins on customer_id; monthly_sales and
+        # order_summary.sql group and order by order_date.
+        "indexes": [["customer_id"], ["order_date"]],
+    },
+    "order_details": {
+        "columns": {
+            "order_item_id": ("Int32", "INTEGER"),
+            "order_id": ("Int32", "INTEGER"),
+            "product_id": ("Int32", "INTEGER"),
+            "quantity": ("Int32", "INTEGER"),
+            "price_at_order": (MONEY, "NUMERIC(12, 2)"),
+        },
+        "primary_key": "order_item_id",
+        # top_products.sql joins order_details to products on product_id.
+        "indexes": [["order_id"], ["product_id"]],
+    },
+}
+
+
+def read_csv_options(table_name):
+    """Return the dtype/parse_dates keyword arguments for pd.read_csv."""
+    columns = TABLES[table_name]["columns"]
+    dtypes = {col: dtype for col, (dtype, _) in columns.items() if dtype != DATE}
+    dates = [col for col, (dtype, _) in columns.items() if dtype == DATE]
+    options = {"dtype": dtypes}
+    if dates:
+        options["parse_dates"] = dates
+        options["date_format"] = "%Y-%m-%d"
+    return options
+
+
+def create_table_sql(table_name):
+    """Return the CREATE TABLE statement for the table, without constraints."""
+    columns = ",\n  ".join(
+        f'"{col}" {sql_type}'
+        for col, (_, sql_type) in TABLES[table_name]["columns"].items()
+    )
+    return f"CREATE TABLE public.{table_name} (\n  {columns}\n)"
+
+
+def primary_key_sql(table_name):
+    """Return the ALTER TABLE statement adding the table's primary key."""
+    key = TABLES[table_name]["primary_key"]
+    return f'ALTER TABLE public.{table_name} ADD PRIMARY KEY ("{key}")'
+
+
+def index_sql(table_name):
+    """Return CREATE INDEX IF NOT EXISTS statements for the table's indexes."""
+    statements = []
+    for columns in TABLES[table_name]["indexes"]:
+        name = f"idx_{table_name}_{'_'.join(columns)}"
+        column_list = ", ".join(f'"{col}"' for col in columns)
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS {name} ON public.{table_name} ({column_list})"
+        )
+    return statements
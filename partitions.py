@@ -0,0 +1,263 @@
+"""
+Range partitioning of orders and order_details by order month.
+
+With `etl_northwind.py --partition`, orders and order_details are created
+as PARTITION BY RANGE (order_date) tables with one partition per month,
+named <table>_pYYYY_MM. order_details has no date of its own, so each line
+gets its order's order_date copied in while it is loaded (see
+attach_order_dates), which also means orders must load first. Partitions
+for the months in a chunk are created just before the chunk is written, and
+a DEFAULT partition catches rows without a date. Date-bounded queries then
+only scan the months they ask for.
+
+PostgreSQL requires the partition key in every unique constraint, so the
+primary keys become (order_id, order_date) and (order_item_id, order_date).
+order_details.order_date is set when a line is loaded and is not updated
+if its order later moves to another month.
+
+Run directly to list partitions or retire old months:
+    python partitions.py                        # list partitions
+    python partitions.py --detach-before 2023-01
+    python partitions.py --drop-before 2023-01
+Detached partitions are kept as plain tables renamed
+<partition>_detached_<YYYYMMDDHHMMSS>, so retiring a month that was
+reloaded after an earlier detach keeps both copies.
+"""
+
+import argparse
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+import db
+import northwind_schema
+
+PARTITION_KEY = "order_date"
+
+PARTITIONED_TABLES = ("orders", "order_details")
+
+_PARTITION_NAME = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def partition_name(table_name, month):
+    """Return the name of the table's partition for a 'YYYY-MM-DD' month."""
+    return f"{table_name}_p{month[:4]}_{month[5:7]}"
+
+
+def table_kind(engine, table_name):
+    """
+    Return "partitioned" or "regular" for an existing public table, or None
+    if it does not exist.
+    """
+    with engine.connect() as conn:
+        relkind = conn.execute(
+            text(
+                "SELECT c.relkind FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = 'public' AND c.relname = :table"
+            ),
+            {"table": table_name},
+        ).scalar()
+    if relkind is None:
+        return None
+    return "partitioned" if relkind == "p" else "regular"
+
+
+def create_table_sql(table_name):
+    """
+    Return the CREATE TABLE statement for the partitioned parent table.
+    order_details gets an extra order_date column holding its order's date.
+    """
+    columns = {
+        col: sql_type
+        for col, (_, sql_type) in northwind_schema.TABLES[table_name]["columns"].items()
+    }
+    columns.setdefault(PARTITION_KEY, "DATE")
+    column_list = ",\n  ".join(
+        f'"{col}" {sql_type}' for col, sql_type in columns.items()
+    )
+    return (
+        f"CREATE TABLE public.{table_name} (\n  {column_list}\n) "
+        f'PARTITION BY RANGE ("{PARTITION_KEY}")'
+    )
+
+
+def primary_key_columns(table_name):
+    """Return the primary key columns of the partitioned table."""
+    return [northwind_schema.TABLES[table_name]["primary_key"], PARTITION_KEY]
+
+
+def primary_key_sql(table_name):
+    """Return the ALTER TABLE statement adding the partitioned primary key."""
+    columns = ", ".join(f'"{col}"' for col in primary_key_columns(table_name))
+    return f"ALTER TABLE public.{table_name} ADD PRIMARY KEY ({columns})"
+
+
+def list_partitions(conn, table_name):
+    """Return {partition name: 'YYYY-MM-01'} for the table's monthly partitions."""
+    names = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table)"
+        ),
+        {"table": f"public.{table_name}"},
+    ).scalars()
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.search(name)
+        if match:
+            partitions[name] = f"{match.group(1)}-{match.group(2)}-01"
+    return partitions
+
+
+def ensure_partitions(engine, table_name, dates):
+    """
+    Create the missing monthly partitions (and the DEFAULT partition) needed
+    to hold `dates`. Returns the number of partitions created.
+    """
+    dates = pd.to_datetime(pd.Series(dates)).dropna()
+    months = sorted(set(dates.dt.to_period("M").unique().strftime("%Y-%m-01")))
+    created = 0
+    with engine.connect() as conn:
+        existing = set(list_partitions(conn, table_name))
+        for month in months:
+            name = partition_name(table_name, month)
+            if name in existing:
+                continue
+            conn.execute(
+                text(
+                    f"CREATE TABLE public.{name} PARTITION OF public.{table_name} "
+                    f"FOR VALUES FROM ('{month}') TO "
+                    f"(DATE '{month}' + INTERVAL '1 month')"
+                )
+            )
+            created += 1
+        conn.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS public.{table_name}_pdefault "
+                f"PARTITION OF public.{table_name} DEFAULT"
+            )
+        )
+        conn.commit()
+    return created
+
+
+def load_order_dates(engine):
+    """
+    Read every order's order_date into a dense array indexed by order_id
+    (NaT where there is no such order), for attach_order_dates.
+    """
+    orders = pd.read_sql_query(
+        f'SELECT order_id, "{PARTITION_KEY}" FROM public.orders', engine
+    )
+    size = int(orders["order_id"].max()) + 1 if len(orders) else 0
+    order_dates = np.full(size, np.datetime64("NaT"), dtype="datetime64[ns]")
+    order_dates[orders["order_id"].to_numpy()] = pd.to_datetime(
+        orders[PARTITION_KEY]
+    ).to_numpy()
+    return order_dates
+
+
+def attach_order_dates(df, order_dates):
+    """Return order_details rows with their order's order_date added."""
+    order_ids = df["order_id"].to_numpy(dtype="int64", na_value=-1)
+    known = (order_ids >= 0) & (order_ids < len(order_dates))
+    dates = np.full(len(df), np.datetime64("NaT"), dtype="datetime64[ns]")
+    dates[known] = order_dates[order_ids[known]]
+    return df.assign(**{PARTITION_KEY: dates})
+
+
+def _detached_name(conn, name, stamp):
+    """Return a free <name>_detached_<stamp>[_<n>] table name."""
+    candidate = f"{name}_detached_{stamp}"
+    counter = 1
+    while conn.execute(
+        text("SELECT to_regclass(:name)"), {"name": f"public.{candidate}"}
+    ).scalar():
+        counter += 1
+        candidate = f"{name}_detached_{stamp}_{counter}"
+    return candidate
+
+
+def retire_partitions(engine, before, action="detach", tables=PARTITIONED_TABLES):
+    """
+    Detach or drop every monthly partition of `tables` for months before
+    `before` ('YYYY-MM'). Detached partitions are renamed
+    <partition>_detached_<timestamp> so a later load can recreate the month
+    and retire it again. Returns the names of the partitions retired.
+    """
+    cutoff = f"{before}-01"
+    stamp = time.strftime("%Y%m%d%H%M%S")
+    retired = []
+    with engine.connect() as conn:
+        for table_name in tables:
+            for name, month in sorted(list_partitions(conn, table_name).items()):
+                if month >= cutoff:
+                    continue
+                if action == "drop":
+                    conn.execute(text(f"DROP TABLE public.{name}"))
+                else:
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE public.{table_name} DETACH PARTITION public.{name}"
+                        )
+                    )
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE public.{name} "
+                            f"RENAME TO {_detached_name(conn, name, stamp)}"
+                        )
+                    )
+                retired.append(name)
+        conn.commit()
+    return retired
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="List or retire monthly partitions of orders and order_details."
+    )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--detach-before",
+        metavar="YYYY-MM",
+        help="detach partitions for months before this one (kept as tables)",
+    )
+    group.add_argument(
+        "--drop-before",
+        metavar="YYYY-MM",
+        help="drop partitions for months before this one",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    engine = db.get_engine()
+    if args.detach_before or args.drop_before:
+        action = "drop" if args.drop_before else "detach"
+        retired = retire_partitions(
+            engine, args.drop_before or args.detach_before, action
+        )
+        verb = "Dropped" if action == "drop" else "Detached"
+        print(f"{verb} {len(retired)} partition(s): {', '.join(retired) or '-'}")
+        return
+
+    with engine.connect() as conn:
+        for table_name in PARTITIONED_TABLES:
+            months = sorted(list_partitions(conn, table_name).values())
+            if months:
+                print(
+                    f"{table_name}: {len(months)} monthly partitions, "
+                    f"{months[0][:7]} to {months[-1][:7]}"
+                )
+            else:
+                print(f"{table_name}: not partitioned or no partitions")
+
+
+if __name__ == "__main__":
+    main()
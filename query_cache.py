@@ -0,0 +1,257 @@
+"""
+In-process result cache for the dashboard's analytic queries.
+
+Results are kept in memory, bounded by entry count, total size and a TTL,
+with the least recently used entries evicted first. Every cache key
+includes the data version of each table the query reads. Versions live in
+the data_versions table and etl_northwind.py bumps them at the end of a
+load, for the raw tables it changed and everything derived from them
+(DERIVED_FROM). A load therefore invalidates exactly the entries that read
+changed data; everything else keeps being served from memory. Versions are
+re-read from the database at most every VERSION_CHECK_SECONDS.
+
+Limits come from the environment:
+    NORTHWIND_QUERY_CACHE_ENTRIES  maximum cached results (default 256, 0 = no caching)
+    NORTHWIND_QUERY_CACHE_MB       maximum total size in MiB (default 256)
+    NORTHWIND_QUERY_CACHE_TTL      seconds a result is kept (default 3600)
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+VERSIONS_TABLE = "data_versions"
+
+MAX_ENTRIES = int(os.environ.get("NORTHWIND_QUERY_CACHE_ENTRIES", "256"))
+MAX_BYTES = int(os.environ.get("NORTHWIND_QUERY_CACHE_MB", "256")) * 2**20
+TTL_SECONDS = float(os.environ.get("NORTHWIND_QUERY_CACHE_TTL", "3600"))
+
+# How long versions read from data_versions are trusted before re-reading.
+VERSION_CHECK_SECONDS = 5.0
+
+# Tables and views built from other tables: bumping a source bumps these.
+DERIVED_FROM = {
+    "dim_customer": ["customers"],
+    "dim_product": ["products"],
+    "dim_date": ["orders"],
+    "fact_orders": ["customers", "orders"],
+    "fact_order_lines": ["customers", "products", "orders", "order_details"],
+    "customer_order_summary": ["dim_customer", "fact_orders", "fact_order_lines"],
+    "monthly_sales": ["fact_orders", "fact_order_lines", "dim_date"],
+    "monthly_sales_summary": ["fact_orders", "fact_order_lines", "dim_date"],
+    "customer_segments": [
+        "fact_orders",
+        "fact_order_lines",
+        "dim_customer",
+        "dim_date",
+    ],
+    "sales_cube": ["fact_order_lines", "dim_date", "dim_product", "customer_segments"],
+}
+
+CREATE_VERSIONS_TABLE = f"""
+CREATE TABLE IF NOT EXISTS public.{VERSIONS_TABLE} (
+  table_name TEXT PRIMARY KEY,
+  version BIGINT NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+
+def affected_tables(tables):
+    """Return `tables` plus every table derived from them, directly or not."""
+    affected = set(tables)
+    changed = True
+    while changed:
+        changed = False
+        for derived, sources in DERIVED_FROM.items():
+            if derived not in affected and affected.intersection(sources):
+                affected.add(derived)
+                changed = True
+    return affected
+
+
+def bump_versions(engine, tables):
+    """
+    Increment the data version of `tables` and of everything derived from
+    them. Called by etl_northwind.py once a load has finished.
+    Returns the sorted list of tables bumped.
+    """
+    bumped = sorted(affected_tables(tables))
+    if not bumped:
+        return bumped
+    with engine.connect() as conn:
+        conn.execute(text(CREATE_VERSIONS_TABLE))
+        conn.execute(
+            text(
+                f"INSERT INTO public.{VERSIONS_TABLE} AS v (table_name, version) "
+                "SELECT unnest(CAST(:tables AS text[])), 1 "
+                "ON CONFLICT (table_name) DO UPDATE "
+                "SET version = v.version + 1, updated_at = now()"
+            ),
+            {"tables": bumped},
+        )
+        conn.commit()
+    _versions.clear()
+    return bumped
+
+
+class _VersionCache:
+    """Data versions read from the database, re-read once they are stale."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions = {}
+        self.read_at = None
+
+    def clear(self):
+        with self.lock:
+            self.read_at = None
+
+    def get(self, engine, tables):
+        with self.lock:
+            now = time.monotonic()
+            if self.read_at is None or now - self.read_at > VERSION_CHECK_SECONDS:
+                try:
+                    with engine.connect() as conn:
+                        rows = conn.execute(
+                            text(
+                                f"SELECT table_name, version FROM public.{VERSIONS_TABLE}"
+                            )
+                        ).all()
+                    self.versions = dict(rows)
+                except Exception:
+                    # No load has recorded versions yet.
+                    self.versions = {}
+                self.read_at = now
+            return tuple(self.versions.get(table, 0) for table in tables)
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache of DataFrames, bounded by entry count and total
+    size in bytes, whose entries expire `ttl` seconds after they are stored.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached DataFrame for `key`, or None if missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            df, nbytes, expires = entry
+            if time.monotonic() > expires:
+                del self.entries[key]
+                self.size -= nbytes
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return df
+
+    def put(self, key, df, ttl=None):
+        """Store `df` under `key`, evicting least recently used entries to fit."""
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (df, nbytes, expires)
+            self.size += nbytes
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, evicted_bytes, _) = self.entries.popitem(last=False)
+                self.size -= evicted_bytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """Return entry count, size in bytes, hits and misses."""
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_versions = _VersionCache()
+_cache = QueryCache()
+
+
+def data_versions(engine, tables):
+    """
+    Return the current data version of each of `tables` (0 if never
+    bumped), re-reading data_versions at most every VERSION_CHECK_SECONDS.
+    """
+    return _versions.get(engine, list(tables))
+
+
+def make_key(engine, sql, tables, params=None):
+    """Return the cache key for a query: its text, parameters and data versions."""
+    tables = sorted(tables)
+    return (
+        str(engine.url),
+        sql,
+        json.dumps(params or {}, sort_keys=True, default=str),
+        tuple(tables),
+        data_versions(engine, tables),
+    )
+
+
+def lookup(key):
+    """Return the cached DataFrame for a make_key() key, or None. Not a copy."""
+    return _cache.get(key)
+
+
+def store(key, df, ttl=None):
+    """Cache `df` under a make_key() key."""
+    _cache.put(key, df, ttl)
+
+
+def cached_query(engine, sql, tables, params=None, ttl=None):
+    """
+    Run `sql` (with bound `params`) and return the result as a DataFrame,
+    served from the cache while the data versions of `tables` (the tables
+    and views the query reads) are unchanged and the entry has not expired.
+    Callers get their own copy and may modify it.
+    """
+    key = make_key(engine, sql, tables, params)
+    df = _cache.get(key)
+    if df is None:
+        with engine.connect() as conn:
+            result = conn.execute(text(sql), params or {})
+            df = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+        _cache.put(key, df, ttl)
+    return df.copy()
+
+
+def clear():
+    """Drop every cached result."""
+    _cache.clear()
+    _versions.clear()
+
+
+def stats():
+    """Return the shared cache's entry count, size, hits and misses."""
+    return _cache.stats()
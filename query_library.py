@@ -0,0 +1,439 @@
+"""
+Named queries loaded from sql_script/*.sql.
+
+Each file holds one statement. Optional `-- key: value` comment lines at
+the top describe it:
+
+    -- name: top_products          (default: the file name without .sql)
+    -- description: Best-selling products by revenue
+    -- tables: fact_order_lines, dim_product, dim_date
+    -- param: top_n integer = 10
+    -- param: start_date date
+    -- batch: no
+
+`tables` lists what the query reads, so its results are cached in
+query_cache until a load bumps one of them. When the line is missing,
+the tables are taken from the query's FROM and JOIN clauses. Each `param`
+line gives a parameter's name, its PostgreSQL type and an optional
+default; parameters without a default are NULL unless given, and the
+queries treat a NULL bound as "no limit". The statement refers to
+parameters as :name. `batch: no` marks a query whose result is not
+bounded (one row per order, say), so run_batch() fetches it with run()
+instead of folding it into the batch's single JSON value.
+
+run() executes a query as a prepared statement. It is PREPAREd the first
+time a pooled connection runs it and EXECUTEd from then on, so its SQL is
+parsed and planned once per connection rather than on every call. The
+names prepared on a connection are kept in its `info` dict, which lives as
+long as the DBAPI connection does.
+
+run_batch() answers a list of queries in a single round trip. The queries
+not already cached are sent as one SELECT returning each result as a JSON
+array, and every result is stored in the result cache. Queries marked
+`batch: no` are run one by one with run(). Results from run()
+and run_batch() therefore share cache entries, and both return
+numeric columns as floats and date columns as datetime64.
+
+    python query_library.py list
+    python query_library.py run top_products --param top_n=5
+    python query_library.py batch monthly_sales segment_counts
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+import db
+import query_cache
+
+SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql_script")
+
+# conn.info key holding the statement names prepared on a DBAPI connection.
+PREPARED_KEY = "query_library_prepared"
+
+# SQLSTATEs after which a statement is prepared again: it no longer exists
+# on the connection, or its cached plan's result type changed (a table it
+# reads was recreated with other columns).
+_REPREPARE_CODES = ("26000", "0A000")
+
+# Result column type OIDs converted to float and datetime64.
+_NUMERIC_TYPES = {700, 701, 1700}
+_DATE_TYPES = {1082, 1114, 1184}
+
+_HEADER = re.compile(r"^\s*--\s*(\w+)\s*:\s*(.*?)\s*$")
+_PARAM = re.compile(r"^(\w+)\s+([\w ]+?(?:\[\])?)(?:\s*=\s*(.*))?$")
+_PLACEHOLDER = re.compile(r"(?<![:\w]):(\w+)\b")
+_TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN)\s+(?:public\.)?(\w+)", re.I)
+_NON_IDENTIFIER = re.compile(r"[^a-z0-9_]")
+
+
+class Query:
+    """One named statement and its parameters."""
+
+    def __init__(
+        self,
+        name,
+        sql,
+        params=None,
+        tables=None,
+        description="",
+        path=None,
+        batch=True,
+    ):
+        self.name = name
+        self.sql = sql.strip().rstrip(";").strip()
+        # {name: (type, default)} in declaration order.
+        self.params = dict(params or {})
+        for placeholder in _PLACEHOLDER.findall(self.sql):
+            self.params.setdefault(placeholder, (None, None))
+        ctes = set(re.findall(r"\b(\w+)\s+AS\s*\(", self.sql, re.I))
+        self.tables = tables or sorted(set(_TABLE_REFERENCE.findall(self.sql)) - ctes)
+        self.description = description
+        self.path = path
+        self.batch = batch
+        digest = hashlib.sha1(self.sql.encode()).hexdigest()[:10]
+        # File names like top-products.sql are not valid SQL identifiers.
+        identifier = _NON_IDENTIFIER.sub("_", name.lower())[:40]
+        self.statement_name = f"nw_{identifier}_{digest}"
+        self.columns = None
+
+    def bind(self, params=None):
+        """Return every parameter's value: `params` over the defaults."""
+        params = params or {}
+        unknown = set(params) - set(self.params)
+        if unknown:
+            raise ValueError(
+                f"Unknown parameters for {self.name}: {', '.join(sorted(unknown))}"
+            )
+        return {
+            name: params.get(name, default)
+            for name, (_, default) in self.params.items()
+        }
+
+    def positional_sql(self):
+        """The statement with $1, $2, ... in place of :name placeholders."""
+        positions = {name: i for i, name in enumerate(self.params, 1)}
+        return _PLACEHOLDER.sub(lambda m: f"${positions[m.group(1)]}", self.sql)
+
+    def pyformat_sql(self):
+        """The statement with %(name)s placeholders, for a DBAPI cursor."""
+        escaped = self.sql.replace("%", "%%")
+        return _PLACEHOLDER.sub(lambda m: f"%({m.group(1)})s", escaped)
+
+    def dollar_sql(self):
+        """
+        The statement with $name placeholders, for DuckDB. Parameters with
+        a declared type are cast to it.
+        """
+
+        def placeholder(match):
+            sql_type = self.params[match.group(1)][0]
+            if sql_type is None:
+                return f"${match.group(1)}"
+            return f"CAST(${match.group(1)} AS {sql_type})"
+
+        return _PLACEHOLDER.sub(placeholder, self.sql)
+
+    def prepare_sql(self):
+        types = [sql_type for sql_type, _ in self.params.values()]
+        # Parameter types are inferred by the server unless all are declared.
+        type_list = f" ({', '.join(types)})" if types and all(types) else ""
+        return f"PREPARE {self.statement_name}{type_list} AS {self.positional_sql()}"
+
+    def execute_sql(self):
+        if not self.params:
+            return f"EXECUTE {self.statement_name}"
+        return (
+            f"EXECUTE {self.statement_name}({', '.join(':' + p for p in self.params)})"
+        )
+
+    def __repr__(self):
+        return f"Query({self.name!r}, params={list(self.params)})"
+
+
+def parse_query(sql, name, path=None):
+    """Build a Query from a file's text, reading its `-- key: value` header."""
+    header = {"name": name, "tables": None, "description": "", "batch": True}
+    params = {}
+    for line in sql.splitlines():
+        match = _HEADER.match(line)
+        if not match:
+            if line.strip() and not line.strip().startswith("--"):
+                break
+            continue
+        key, value = match.group(1).lower(), match.group(2)
+        if key == "param":
+            param = _PARAM.match(value)
+            if param is None:
+                raise ValueError(f"{path or name}: bad param line: {value}")
+            param_name, sql_type, default = param.groups()
+            params[param_name] = (sql_type.strip(), _parse_default(default))
+        elif key == "tables":
+            header["tables"] = [t.strip() for t in value.split(",") if t.strip()]
+        elif key in ("name", "description"):
+            header[key] = value
+        elif key == "batch":
+            header["batch"] = value.lower() not in ("no", "false", "0")
+    return Query(
+        header["name"],
+        sql,
+        params,
+        header["tables"],
+        header["description"],
+        path,
+        header["batch"],
+    )
+
+
+def _parse_default(value):
+    if value is None or value.upper() == "NULL":
+        return None
+    value = value.strip("'\"")
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+_lock = threading.Lock()
+_library = None
+_library_dir = None
+
+
+def discover(script_dir=None):
+    """
+    Return {name: Query} for every .sql file in `script_dir` (default
+    sql_script/). The files are parsed once per process; files added or
+    edited later are picked up by reload().
+    """
+    global _library, _library_dir
+    script_dir = script_dir or SCRIPT_DIR
+    with _lock:
+        if _library is None or _library_dir != script_dir:
+            library = {}
+            for path in sorted(glob.glob(os.path.join(script_dir, "*.sql"))):
+                with open(path) as f:
+                    query = parse_query(
+                        f.read(), os.path.splitext(os.path.basename(path))[0], path
+                    )
+                library[query.name] = query
+            _library, _library_dir = library, script_dir
+        return _library
+
+
+def reload():
+    """Re-read the query files on next use."""
+    global _library
+    with _lock:
+        _library = None
+
+
+def get(name):
+    """Return the named Query; raises KeyError for unknown names."""
+    library = discover()
+    if name not in library:
+        raise KeyError(f"No query named {name!r} in {_library_dir}")
+    return library[name]
+
+
+def _pgcode(error):
+    return getattr(getattr(error, "orig", None), "pgcode", None)
+
+
+def _prepare(conn, query):
+    prepared = conn.info.setdefault(PREPARED_KEY, set())
+    if query.statement_name in prepared:
+        return
+    # A DBAPI cursor with no parameters, so a % in the SQL is sent as is.
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(query.prepare_sql())
+    finally:
+        cursor.close()
+    prepared.add(query.statement_name)
+
+
+def _execute(conn, query, values):
+    """EXECUTE the prepared query on `conn`, preparing it first if needed."""
+    for attempt in range(2):
+        _prepare(conn, query)
+        try:
+            return conn.execute(text(query.execute_sql()), values)
+        except DBAPIError as e:
+            if attempt or _pgcode(e) not in _REPREPARE_CODES:
+                raise
+            conn.rollback()
+            conn.info[PREPARED_KEY].discard(query.statement_name)
+            if _pgcode(e) == "0A000":
+                conn.exec_driver_sql(f"DEALLOCATE {query.statement_name}")
+
+
+def _normalize(df, columns):
+    """Convert numeric columns to float and date columns to datetime64."""
+    for name, type_code in columns:
+        if name not in df.columns:
+            continue
+        if type_code in _NUMERIC_TYPES:
+            df[name] = pd.to_numeric(df[name], errors="coerce").astype("float64")
+        elif type_code in _DATE_TYPES:
+            df[name] = pd.to_datetime(df[name])
+    return df
+
+
+def _columns(result):
+    return [(column[0], column[1]) for column in result.cursor.description]
+
+
+def _cache_key(engine, query, values):
+    return query_cache.make_key(engine, query.sql, query.tables, values)
+
+
+def run(engine, name, params=None, cache=True):
+    """
+    Run the named query with `params` (merged over its defaults) and return
+    the result as a DataFrame, served from query_cache while the tables it
+    reads are unchanged. Callers get their own copy.
+    """
+    query = get(name)
+    values = query.bind(params)
+    key = _cache_key(engine, query, values) if cache else None
+    df = query_cache.lookup(key) if cache else None
+    if df is None:
+        with engine.connect() as conn:
+            result = _execute(conn, query, values)
+            query.columns = _columns(result)
+            df = pd.DataFrame(
+                result.fetchall(), columns=[name for name, _ in query.columns]
+            )
+            conn.rollback()
+        df = _normalize(df, query.columns)
+        if cache:
+            query_cache.store(key, df)
+    return df.copy()
+
+
+def _describe(conn, query):
+    """Read the query's result columns (name, type OID) without fetching rows."""
+    values = dict.fromkeys(query.params)
+    result = conn.execute(text(f"SELECT * FROM ({query.sql}) q LIMIT 0"), values)
+    query.columns = _columns(result)
+    result.close()
+
+
+def batch_sql(queries):
+    """
+    Return one SELECT (with :q<i>_<param> placeholders) whose single row is
+    a JSON array holding each query's rows as an array of objects.
+    """
+    parts = []
+    for i, query in enumerate(queries):
+        sql = _PLACEHOLDER.sub(lambda m: f":q{i}_{m.group(1)}", query.sql)
+        # json_agg keeps the order the subquery's ORDER BY produces.
+        parts.append(f"(SELECT COALESCE(json_agg(q{i}), '[]') FROM ({sql}) q{i})")
+    return "SELECT json_build_array(\n  " + ",\n  ".join(parts) + "\n)"
+
+
+def run_batch(engine, requests, cache=True):
+    """
+    Run several named queries and return {name: DataFrame}. `requests` is a
+    list of names or (name, params) pairs; names must be unique. Cached
+    results are used as they are. All the others are fetched in one
+    statement and stored in the cache, except queries marked `batch: no`,
+    which go through run().
+    """
+    resolved = []
+    for request in requests:
+        name, params = (request, None) if isinstance(request, str) else request
+        query = get(name)
+        resolved.append((query, query.bind(params)))
+    results = {}
+    missing = []
+    for query, values in resolved:
+        key = _cache_key(engine, query, values) if cache else None
+        df = query_cache.lookup(key) if cache else None
+        if df is None and not query.batch:
+            results[query.name] = run(engine, query.name, values, cache)
+        elif df is None:
+            missing.append((query, values, key))
+        else:
+            results[query.name] = df
+    if missing:
+        bound = {
+            f"q{i}_{param}": value
+            for i, (_, values, _) in enumerate(missing)
+            for param, value in values.items()
+        }
+        with engine.connect() as conn:
+            for query, _, _ in missing:
+                if query.columns is None:
+                    _describe(conn, query)
+            payload = conn.execute(
+                text(batch_sql([query for query, _, _ in missing])), bound
+            ).scalar()
+            conn.rollback()
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        for (query, _, key), rows in zip(missing, payload):
+            df = pd.DataFrame(rows, columns=[name for name, _ in query.columns])
+            df = _normalize(df, query.columns)
+            if cache:
+                query_cache.store(key, df)
+            results[query.name] = df
+    return {name: df.copy() for name, df in results.items()}
+
+
+def parse_params(pairs):
+    """Turn ["name=value", ...] command-line pairs into a params dict."""
+    params = {}
+    for pair in pairs or []:
+        name, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"--param needs name=value, got {pair!r}")
+        params[name] = _parse_default(value)
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List and run the sql_script queries.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list the queries and their parameters")
+    run_parser = commands.add_parser("run", help="run one query")
+    run_parser.add_argument("name")
+    run_parser.add_argument(
+        "--param", action="append", metavar="NAME=VALUE", help="repeatable"
+    )
+    batch_parser = commands.add_parser("batch", help="run queries in one round trip")
+    batch_parser.add_argument("names", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for query in discover().values():
+            params = ", ".join(
+                f"{name} {sql_type or '?'}"
+                + (f" = {default}" if default is not None else "")
+                for name, (sql_type, default) in query.params.items()
+            )
+            print(f"{query.name}({params}): {query.description or '-'}")
+            print(f"    reads {', '.join(query.tables)}")
+        return
+
+    engine = db.get_engine()
+    if args.command == "run":
+        results = {args.name: run(engine, args.name, parse_params(args.param))}
+    else:
+        results = run_batch(engine, args.names)
+    for name, df in results.items():
+        print(f"== {name} ({len(df)} rows)")
+        print(df.head(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
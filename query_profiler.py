@@ -0,0 +1,608 @@
+"""
+EXPLAIN ANALYZE profiler and index advisor.
+
+profile() runs a statement under EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+and turns the plan into a flat list of nodes (depth-first, with their
+depth), each with:
+- its total time (per-loop time times loops; below a Gather, the loops
+  of one process) and self time (minus its children);
+- actual and estimated rows, and the estimate error as actual/estimated;
+- shared buffer hits and reads;
+- its filter, index and join conditions.
+
+Nodes are flagged when they:
+- sequentially scan a table the catalog estimates at LARGE_TABLE_ROWS
+  rows or more (a partition by the rows it read itself, so each partition
+  is not held to the whole table's estimate);
+- sort or hash in more memory than work_mem allows and spill to disk;
+- misestimate their rows by MISESTIMATE_FACTOR or more. Nodes never
+  executed (partitions pruned at run time) are not compared, nor are
+  partition scans under an Append whose own estimate was right: an empty
+  or unanalyzed partition is often misjudged without affecting the plan.
+
+advise_indexes() suggests candidate indexes for the large sequential
+scans. The keys come from each scan's filter (equality columns first,
+then range columns) and from the join conditions the scanned table takes
+part in, whichever side of a comparison the column is on. lower(col) and
+upper(col) get an expression index and a LIKE with a fixed prefix a
+text_pattern_ops one; other expressions are skipped. Keys that already
+lead an index are left out.
+
+As in the SQL Runner, the statement runs in a transaction that is rolled
+back, so profiling an INSERT, UPDATE or DELETE changes nothing. ANALYZE
+does execute it, though; pass analyze=False for the estimated plan only.
+
+    python query_profiler.py sql_script/top_products.sql [more.sql ...]
+    python query_profiler.py top_products --param top_n=5
+    python query_profiler.py --sql "SELECT * FROM orders WHERE customer_id = 7"
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+import db
+import query_library
+import schema_catalog
+import sql_runner
+
+# Sequential scans of tables with at least this many (estimated) rows are
+# flagged and considered for an index.
+LARGE_TABLE_ROWS = 10_000
+
+# Nodes whose actual rows differ from the estimate by this factor or more
+# (either way) are flagged. Nodes below a Limit, which stop early, and
+# nodes with fewer rows than MISESTIMATE_MIN_ROWS both ways are not.
+MISESTIMATE_FACTOR = 10
+MISESTIMATE_MIN_ROWS = 100
+
+# Comparison operators in plan conditions, by the index use they allow.
+# ~~ (LIKE) can use a text_pattern_ops index when its pattern does not
+# start with a wildcard; the others (<>, ILIKE, NOT LIKE, ...) cannot.
+_EQUALITY_OPERATORS = ("= ANY", "=", "IS NULL", "IS NOT NULL")
+_RANGE_OPERATORS = ("<=", ">=", "<", ">")
+_LIKE_OPERATOR = "~~"
+_OPERATOR = re.compile(r"= ANY|IS NOT NULL|IS NULL|!~~\*?|~~\*?|<>|<=|>=|!=|=|<|>")
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_CAST = re.compile(r"::[\w ]+?(?:\[\])?$")
+_COLUMN_OPERAND = re.compile(r"^(?:(\w+)\.)?(\w+)$")
+# Expressions worth an expression index: case-folding a column.
+_FOLDED_OPERAND = re.compile(r"^(lower|upper)\((.*)\)$")
+_CONDITION_KEYS = ("Filter", "Index Cond", "Recheck Cond", "Join Filter")
+_JOIN_KEYS = ("Hash Cond", "Merge Cond", "Join Filter")
+# Monthly partitions (see partitions.py) and the DEFAULT one.
+_PARTITION_SUFFIX = re.compile(r"_p(?:\d{4}_\d{2}|default)$")
+_INDEX_COLUMNS = re.compile(r"USING \w+ \((.*)\)")
+_KEY_NOISE = re.compile(
+    r'::(?:character varying|double precision|\w+)(?:\[\])?|[()"\s]'
+)
+
+
+def explain(
+    engine, sql, analyze=True, timeout_ms=sql_runner.DEFAULT_TIMEOUT_MS, params=None
+):
+    """
+    Return the JSON plan of `sql` ({"Plan": ..., "Planning Time": ...,
+    "Execution Time": ...}). With `params`, the statement's :name
+    placeholders are bound to them. The statement runs with a statement
+    timeout in a transaction that is rolled back.
+    """
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    statement = sql.strip().rstrip(";")
+    if params is not None:
+        statement = query_library.Query("explain", statement).pyformat_sql()
+    # A DBAPI cursor with no parameters, so a % in the SQL is sent as is.
+    with engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+            cursor.execute(f"EXPLAIN ({options}) {statement}", params)
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+            conn.connection.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def _table_of(relation, catalog):
+    """Return the catalog table a scanned relation belongs to (partitions map to their parent)."""
+    if relation in catalog:
+        return relation
+    parent = _PARTITION_SUFFIX.sub("", relation)
+    return parent if parent in catalog else None
+
+
+def _operand_bounds(masked, start, end):
+    """Return the (start, end) of the operands left and right of an operator."""
+    depth, left = 0, start
+    while left > 0:
+        char = masked[left - 1]
+        if char == "(" and depth == 0:
+            break
+        depth += {")": 1, "(": -1}.get(char, 0)
+        left -= 1
+    depth, right = 0, end
+    while right < len(masked):
+        char = masked[right]
+        if char == ")" and depth == 0:
+            break
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        right += 1
+    return left, right
+
+
+def _strip_operand(operand):
+    """Drop the casts and redundant parentheses around an operand."""
+    while True:
+        stripped = _CAST.sub("", operand.strip()).strip()
+        if stripped.startswith("(") and stripped.endswith(")"):
+            depth = 0
+            for i, char in enumerate(stripped):
+                depth += {"(": 1, ")": -1}.get(char, 0)
+                if depth == 0 and i < len(stripped) - 1:
+                    break
+            else:
+                stripped = stripped[1:-1]
+        if stripped == operand:
+            return operand
+        operand = stripped
+
+
+def _operand_key(operand, alias, columns):
+    """
+    Return the index key for one side of a comparison, if it is a column of
+    the relation (`alias`, unqualified names allowed) or lower()/upper() of
+    one: "column" or "(lower(column))". Anything else gives None.
+    """
+    operand = _strip_operand(operand)
+    function = None
+    folded = _FOLDED_OPERAND.match(operand)
+    if folded:
+        function, operand = folded.group(1), _strip_operand(folded.group(2))
+    match = _COLUMN_OPERAND.match(operand)
+    if not match:
+        return None
+    qualifier, column = match.groups()
+    if column not in columns or (qualifier and qualifier != alias):
+        return None
+    return f"({function}({column}))" if function else column
+
+
+def _condition_columns(condition, alias, columns):
+    """
+    Return [(key, kind)] for the columns of one relation compared in
+    `condition`, on either side of each comparison. kind is "equality" or
+    "range"; key is the index key serving it, which is an expression for
+    lower()/upper() and uses text_pattern_ops for a LIKE with a fixed prefix.
+    """
+    condition = condition or ""
+    # Blank out string literals so operators and parentheses in them are not matched.
+    masked = _LITERAL.sub(lambda m: "'" + "x" * (len(m.group()) - 2) + "'", condition)
+    found = []
+    for match in _OPERATOR.finditer(masked):
+        operator = match.group()
+        left, right = _operand_bounds(masked, match.start(), match.end())
+        sides = [condition[left : match.start()], condition[match.end() : right]]
+        if operator == _LIKE_OPERATOR:
+            key = _operand_key(sides[0], alias, columns)
+            pattern = _strip_operand(sides[1])
+            if key and pattern[:1] == "'" and pattern[1:2] not in ("%", "_", "'"):
+                found.append((f"{key} text_pattern_ops", "range"))
+            continue
+        if operator in _EQUALITY_OPERATORS:
+            kind = "equality"
+        elif operator in _RANGE_OPERATORS:
+            kind = "range"
+        else:
+            continue
+        for side in sides:
+            key = _operand_key(side, alias, columns)
+            if key:
+                found.append((key, kind))
+    return found
+
+
+def flatten_plan(plan, catalog=None, large_rows=LARGE_TABLE_ROWS):
+    """
+    Return the nodes of a JSON plan depth-first as dicts: depth, node
+    (type), relation, alias, table (catalog table scanned), total_ms,
+    self_ms, rows, estimated_rows, estimate_error, rows_removed (by the
+    filter), loops, buffers_hit, buffers_read, conditions, flags, index
+    (name, for index scans), parent (position of the parent node), limited
+    (below a Limit node) and covered (a partition scan, or below one,
+    under an Append estimated within MISESTIMATE_FACTOR). Times and actual
+    rows are None for plans run without ANALYZE.
+    """
+    catalog = catalog or {}
+    nodes = []
+
+    def visit(node, depth, parent_index, limited, processes, covered):
+        loops = node.get("Actual Loops")
+        total_ms = None
+        if "Actual Total Time" in node:
+            # Below a Gather each process counts its own loops and the
+            # processes run side by side, so only the loops of one count.
+            total_ms = node["Actual Total Time"] * max((loops or 1) / processes, 1)
+        rows = None
+        if "Actual Rows" in node:
+            rows = node["Actual Rows"] * max(loops or 1, 1)
+        estimated = node.get("Plan Rows", 0) * max(loops or 1, 1)
+        removed = node.get("Rows Removed by Filter", 0) * max(loops or 1, 1)
+        relation = node.get("Relation Name")
+        entry = {
+            "depth": depth,
+            "node": node["Node Type"],
+            "relation": relation,
+            "alias": node.get("Alias"),
+            "index": node.get("Index Name"),
+            "table": _table_of(relation, catalog) if relation else None,
+            "total_ms": total_ms,
+            "self_ms": total_ms,
+            "rows": rows,
+            "estimated_rows": estimated,
+            # A node never executed (loops 0) has nothing to compare.
+            "estimate_error": (
+                max(rows, 1) / max(estimated, 1)
+                if rows is not None and loops != 0
+                else None
+            ),
+            "rows_removed": removed,
+            "loops": loops,
+            "buffers_hit": node.get("Shared Hit Blocks"),
+            "buffers_read": node.get("Shared Read Blocks"),
+            "conditions": {
+                key: node[key] for key in _CONDITION_KEYS + _JOIN_KEYS if key in node
+            },
+            "flags": [],
+            "parent": parent_index,
+            "limited": limited,
+            "covered": covered,
+        }
+        for key in ("Sort Method", "Sort Space Type", "Sort Space Used"):
+            if key in node:
+                entry[key.lower().replace(" ", "_")] = node[key]
+        for key in ("Hash Batches", "Original Hash Batches", "Peak Memory Usage"):
+            if key in node:
+                entry[key.lower().replace(" ", "_")] = node[key]
+        index = len(nodes)
+        nodes.append(entry)
+        if entry["node"] in ("Gather", "Gather Merge"):
+            # The leader takes part as well as the workers.
+            processes = node.get("Workers Launched", node.get("Workers Planned", 0)) + 1
+        # Partition scans take the cover of an Append whose estimate held.
+        accurate_append = entry["node"] in ("Append", "Merge Append") and not (
+            _misestimated(entry)
+        )
+        for child in node.get("Plans", []):
+            relation = child.get("Relation Name")
+            table = _table_of(relation, catalog) if relation else None
+            partition = table is not None and table != relation
+            child_entry = visit(
+                child,
+                depth + 1,
+                index,
+                limited or entry["node"] == "Limit",
+                processes,
+                covered or (accurate_append and partition),
+            )
+            if entry["self_ms"] is not None and child_entry["total_ms"] is not None:
+                entry["self_ms"] -= child_entry["total_ms"]
+        if entry["self_ms"] is not None:
+            entry["self_ms"] = max(entry["self_ms"], 0.0)
+        return entry
+
+    visit(plan["Plan"], 0, None, False, 1, False)
+    for entry in nodes:
+        entry["flags"] = node_flags(entry, catalog, large_rows)
+    return nodes
+
+
+def _misestimated(entry):
+    """Return True if the node's rows are off by MISESTIMATE_FACTOR or more."""
+    error = entry["estimate_error"]
+    return (
+        error is not None
+        and not entry["limited"]
+        and max(entry["rows"], entry["estimated_rows"]) >= MISESTIMATE_MIN_ROWS
+        and (error >= MISESTIMATE_FACTOR or error <= 1 / MISESTIMATE_FACTOR)
+    )
+
+
+def _scanned_rows(entry, catalog):
+    """
+    Return the rows a scan node reads: the catalog estimate of its table,
+    or for a partition the rows it read (its estimate without ANALYZE).
+    """
+    if entry["table"] is None:
+        return None
+    if entry["relation"] == entry["table"]:
+        return catalog[entry["table"]].get("estimated_rows")
+    if entry["rows"] is not None:
+        return entry["rows"] + entry["rows_removed"]
+    return entry["estimated_rows"]
+
+
+def _large_scan(entry, catalog, large_rows):
+    if entry["node"] != "Seq Scan":
+        return False
+    scanned = _scanned_rows(entry, catalog)
+    return scanned is not None and scanned >= large_rows
+
+
+def node_flags(entry, catalog, large_rows=LARGE_TABLE_ROWS):
+    """
+    Return the problems seen at one flattened plan node, as short strings.
+    Sequential scans are flagged on tables of `large_rows` rows or more.
+    """
+    flags = []
+    if _large_scan(entry, catalog, large_rows):
+        scanned = _scanned_rows(entry, catalog)
+        if entry["relation"] == entry["table"]:
+            flags.append(f"sequential scan of {entry['table']} (~{scanned:,} rows)")
+        else:
+            flags.append(
+                f"sequential scan of {entry['relation']} "
+                f"(partition of {entry['table']}, ~{scanned:,} rows)"
+            )
+    if entry.get("sort_space_type") == "Disk" or "external" in entry.get(
+        "sort_method", ""
+    ):
+        flags.append(
+            f"sort spilled to disk ({entry.get('sort_method')}, "
+            f"{entry.get('sort_space_used', 0):,} kB)"
+        )
+    if entry.get("hash_batches", 1) > 1:
+        flags.append(f"hash spilled to disk ({entry['hash_batches']} batches)")
+    if _misestimated(entry) and not entry.get("covered"):
+        error = entry["estimate_error"]
+        direction = "under" if error > 1 else "over"
+        factor = error if error > 1 else 1 / error
+        flags.append(f"rows {direction}-estimated {factor:,.0f}x")
+    return flags
+
+
+def _key_text(key):
+    """Normalize an index key for comparison: "(lower((name)::text))" -> "lower(name)"."""
+    return _KEY_NOISE.sub("", key).lower()
+
+
+def _indexed_leading_columns(table_info):
+    leading = set()
+    for index in table_info.get("indexes", []):
+        match = _INDEX_COLUMNS.search(index["definition"])
+        if match:
+            leading.add(_key_text(match.group(1).split(",")[0]))
+    return leading
+
+
+def advise_indexes(nodes, catalog, large_rows=LARGE_TABLE_ROWS):
+    """
+    Return candidate indexes for the sequential scans in `nodes` reading
+    `large_rows` rows or more, as dicts: table, columns (index keys),
+    reason and a CREATE INDEX statement. Partition scans suggest an index
+    on the partitioned table.
+    """
+    suggestions = []
+    seen = set()
+    for entry in nodes:
+        if not _large_scan(entry, catalog, large_rows):
+            continue
+        info = catalog[entry["table"]]
+        columns = {column["name"] for column in info["columns"]}
+        alias = entry["alias"] or entry["relation"]
+        indexed = _indexed_leading_columns(info)
+
+        candidates = []
+        filtered = _condition_columns(entry["conditions"].get("Filter"), alias, columns)
+        if filtered:
+            ordered = [c for c, kind in filtered if kind == "equality"] + [
+                c for c, kind in filtered if kind == "range"
+            ]
+            candidates.append((list(dict.fromkeys(ordered)), "filter"))
+        # Join conditions of the scan's ancestors that compare its columns.
+        parent = entry["parent"]
+        while parent is not None:
+            for key in _JOIN_KEYS:
+                for column, _ in _condition_columns(
+                    nodes[parent]["conditions"].get(key), alias, columns
+                ):
+                    candidates.append(([column], f"join ({nodes[parent]['node']})"))
+            parent = nodes[parent]["parent"]
+
+        for index_columns, reason in candidates:
+            key = (entry["table"], tuple(index_columns))
+            if _key_text(index_columns[0]) in indexed or key in seen:
+                continue
+            seen.add(key)
+            suggestions.append(
+                {
+                    "table": entry["table"],
+                    "columns": index_columns,
+                    "reason": reason,
+                    "statement": f"CREATE INDEX ON public.{entry['table']} "
+                    f"({', '.join(index_columns)});",
+                }
+            )
+    return suggestions
+
+
+def profile(
+    engine,
+    sql,
+    analyze=True,
+    timeout_ms=sql_runner.DEFAULT_TIMEOUT_MS,
+    catalog=None,
+    params=None,
+    large_rows=LARGE_TABLE_ROWS,
+):
+    """
+    Profile one statement, with `params` bound to its :name placeholders
+    if given. Sequential scans are flagged and considered for an index on
+    tables of `large_rows` rows or more. Returns a dict with the raw JSON plan, the
+    planning and execution times (ms), the flattened nodes, every flag
+    raised and the suggested indexes.
+    """
+    if catalog is None:
+        catalog = schema_catalog.get_catalog(engine)
+    plan = explain(engine, sql, analyze=analyze, timeout_ms=timeout_ms, params=params)
+    nodes = flatten_plan(plan, catalog, large_rows)
+    return {
+        "sql": sql,
+        "plan": plan,
+        "planning_ms": plan.get("Planning Time"),
+        "execution_ms": plan.get("Execution Time"),
+        "nodes": nodes,
+        "flags": [flag for entry in nodes for flag in entry["flags"]],
+        "indexes": advise_indexes(nodes, catalog, large_rows),
+    }
+
+
+def node_label(entry):
+    """Return a plan node's type with the index and relation it reads."""
+    label = entry["node"]
+    if entry["index"]:
+        label += f" using {entry['index']}"
+    if entry["relation"]:
+        label += f" on {entry['relation']}"
+        if entry["alias"] and entry["alias"] != entry["relation"]:
+            label += f" {entry['alias']}"
+    return label
+
+
+def describe_node(entry):
+    """Return a one-line summary of a flattened plan node."""
+    label = node_label(entry)
+    parts = []
+    if entry["total_ms"] is not None:
+        parts.append(f"{entry['total_ms']:.2f} ms (self {entry['self_ms']:.2f})")
+        parts.append(f"rows {entry['rows']:,} est {entry['estimated_rows']:,}")
+        if entry["loops"] and entry["loops"] > 1:
+            parts.append(f"loops {entry['loops']:,}")
+    else:
+        parts.append(f"est rows {entry['estimated_rows']:,}")
+    if entry["buffers_hit"] is not None:
+        parts.append(
+            f"buffers hit {entry['buffers_hit']:,} read {entry['buffers_read']:,}"
+        )
+    return f"{label}  ({', '.join(parts)})"
+
+
+def render_text(result):
+    """Return the plan tree, flags and suggested indexes as plain text."""
+    lines = []
+    for entry in result["nodes"]:
+        indent = "   " * entry["depth"]
+        arrow = "-> " if entry["depth"] else ""
+        lines.append(f"{indent}{arrow}{describe_node(entry)}")
+        for key, condition in entry["conditions"].items():
+            lines.append(f"{indent}      {key}: {condition}")
+        for flag in entry["flags"]:
+            lines.append(f"{indent}      !! {flag}")
+    if result["planning_ms"] is not None:
+        timing = f"Planning {result['planning_ms']:.2f} ms"
+        if result["execution_ms"] is not None:
+            timing += f", execution {result['execution_ms']:.2f} ms"
+        lines.append(timing)
+    if result["indexes"]:
+        lines.append("Candidate indexes:")
+        for index in result["indexes"]:
+            lines.append(f"  {index['statement']}  -- {index['reason']}")
+    return "\n".join(lines)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Profile SQL with EXPLAIN (ANALYZE, BUFFERS) and suggest indexes."
+    )
+    parser.add_argument(
+        "queries",
+        nargs="*",
+        help="SQL files (one statement each) or query_library query names",
+    )
+    parser.add_argument("--sql", help="profile this statement instead of files")
+    parser.add_argument(
+        "--param",
+        action="append",
+        metavar="NAME=VALUE",
+        help="value for the queries' :NAME parameter (repeatable; others use "
+        "their defaults from the file header)",
+    )
+    parser.add_argument(
+        "--no-analyze",
+        dest="analyze",
+        action="store_false",
+        help="show the estimated plan without running the statement",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=sql_runner.DEFAULT_TIMEOUT_MS // 1000,
+        help="statement timeout in seconds (default %(default)s)",
+    )
+    parser.add_argument(
+        "--large-rows",
+        type=int,
+        default=LARGE_TABLE_ROWS,
+        help="row estimate from which sequential scans are flagged "
+        "(default %(default)s)",
+    )
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+    if not args.queries and not args.sql:
+        parser.error("give SQL files, query names or --sql")
+    return args
+
+
+def main():
+    args = parse_args()
+    given = query_library.parse_params(args.param)
+    queries = []
+    if args.sql:
+        queries.append(("--sql", query_library.Query("sql", args.sql)))
+    for name in args.queries:
+        if os.path.exists(name):
+            with open(name) as f:
+                queries.append((name, query_library.parse_query(f.read(), name, name)))
+        else:
+            queries.append((name, query_library.get(name)))
+
+    engine = db.get_engine()
+    catalog = schema_catalog.get_catalog(engine)
+    results = []
+    failed = False
+    for name, query in queries:
+        params = {k: v for k, v in given.items() if k in query.params}
+        try:
+            result = profile(
+                engine,
+                query.sql,
+                args.analyze,
+                args.timeout * 1000,
+                catalog=catalog,
+                params=query.bind(params) if query.params else None,
+                large_rows=args.large_rows,
+            )
+        except Exception as e:
+            failed = True
+            print(f"{name}: {e}", file=sys.stderr)
+            continue
+        result["name"] = name
+        results.append(result)
+        if not args.json:
+            print(f"== {name}")
+            print(render_text(result))
+            print()
+    if args.json:
+        for result in results:
+            result.pop("plan")
+        print(json.dumps(results, indent=2, default=str))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
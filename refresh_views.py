@@ -0,0 +1,178 @@
+"""
+Refresh the monthly sales figures after ETL runs.
+
+Readers (the dashboard, sql_script/monthly_sales.sql) query the
+monthly_sales_summary table, which both strategies keep current:
+
+- concurrent: REFRESH MATERIALIZED VIEW CONCURRENTLY monthly_sales, then
+  copy the changed months into monthly_sales_summary. The view keeps
+  serving the old rows while the new ones are computed. This needs the
+  unique index on month that create_views.py builds. Views dropped by a
+  full load's CASCADE are recreated first.
+- incremental: recompute only the given months into monthly_sales_summary.
+  Each month is an index range scan on the date_key of fact_orders and
+  fact_order_lines, so the cost follows the size of the delta rather than
+  the whole order history. The monthly_sales view itself is left as it
+  was until the next concurrent refresh.
+
+Run directly to refresh by hand:
+    python refresh_views.py                       # concurrent refresh
+    python refresh_views.py --incremental 2025-01 2025-02
+    python refresh_views.py --incremental         # rebuild every month
+"""
+
+import argparse
+
+from sqlalchemy import text
+
+import create_views
+import db
+import metrics
+from mylogger import logger
+
+REFRESH_STRATEGIES = ("concurrent", "incremental", "none")
+
+MONTHLY_SUMMARY_TABLE = create_views.MONTHLY_SUMMARY_TABLE
+
+# Recompute the listed months; every month is a date_key range on the fact
+# tables (date keys are YYYYMMDD, so a month spans YYYYMM01..YYYYMM31).
+UPSERT_SUMMARY_MONTHS = f"""
+INSERT INTO public.{MONTHLY_SUMMARY_TABLE} AS s (month, orders_count, total_sales)
+SELECT
+  m.month,
+  (SELECT COUNT(*) FROM fact_orders o
+   WHERE o.date_key BETWEEN k.first_key AND k.first_key + 30),
+  (SELECT COALESCE(SUM(f.line_revenue), 0) FROM fact_order_lines f
+   WHERE f.date_key BETWEEN k.first_key AND k.first_key + 30)
+FROM unnest(CAST(:months AS date[])) AS m(month)
+CROSS JOIN LATERAL (
+  SELECT (EXTRACT(YEAR FROM m.month) * 10000 + EXTRACT(MONTH FROM m.month) * 100 + 1)::int
+    AS first_key
+) k
+ON CONFLICT (month) DO UPDATE
+SET orders_count = EXCLUDED.orders_count,
+    total_sales = EXCLUDED.total_sales,
+    refreshed_at = now()
+"""
+
+REBUILD_SUMMARY = f"""
+INSERT INTO public.{MONTHLY_SUMMARY_TABLE} (month, orders_count, total_sales)
+SELECT month, orders_count, total_sales
+FROM ({create_views.MONTHLY_SALES_QUERY}) monthly
+"""
+
+
+def monthly_sales_exists(conn):
+    """Return True if the monthly_sales materialized view exists."""
+    return (
+        conn.execute(
+            text("SELECT 1 FROM pg_matviews WHERE matviewname = 'monthly_sales'")
+        ).first()
+        is not None
+    )
+
+
+@metrics.timed("views.refresh_monthly_sales")
+def refresh_monthly_sales(engine):
+    """
+    Refresh monthly_sales without blocking readers, then sync
+    monthly_sales_summary from it. Missing views are
+    recreated (which also populates them); a view that has never been
+    populated falls back to a plain REFRESH, since CONCURRENTLY requires
+    existing contents.
+    """
+    with engine.connect() as conn:
+        exists = monthly_sales_exists(conn)
+    if not exists:
+        create_views.create_views(engine)
+        return
+
+    with engine.connect() as conn:
+        conn.execute(text(create_views.INDEX_MONTHLY_SALES))
+        populated = conn.execute(
+            text(
+                "SELECT ispopulated FROM pg_matviews WHERE matviewname = 'monthly_sales'"
+            )
+        ).scalar()
+        concurrently = "CONCURRENTLY " if populated else ""
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW {concurrently}monthly_sales"))
+        create_views.sync_monthly_summary(conn)
+        conn.commit()
+    logger.info(f"Refreshed materialized view {concurrently}monthly_sales")
+
+
+@metrics.timed("views.refresh_monthly_summary")
+def refresh_monthly_summary(engine, months=None):
+    """
+    Recompute monthly_sales_summary for the given months (first-of-month
+    dates or 'YYYY-MM-DD' strings). With months=None the whole table is
+    rebuilt, as it is when the table does not exist yet. Months left without
+    orders are removed.
+    """
+    with engine.connect() as conn:
+        exists = conn.execute(
+            text(f"SELECT to_regclass('public.{MONTHLY_SUMMARY_TABLE}')")
+        ).scalar()
+        conn.execute(text(create_views.CREATE_SUMMARY_TABLE))
+        if months is None or exists is None:
+            # DELETE rather than TRUNCATE: the dashboard reads this table.
+            conn.execute(text(f"DELETE FROM public.{MONTHLY_SUMMARY_TABLE}"))
+            conn.execute(text(REBUILD_SUMMARY))
+            label = "all months"
+        else:
+            months = sorted({str(month) for month in months})
+            if not months:
+                logger.info("No months to refresh in monthly_sales_summary.")
+                return
+            conn.execute(text(UPSERT_SUMMARY_MONTHS), {"months": months})
+            conn.execute(
+                text(
+                    f"DELETE FROM public.{MONTHLY_SUMMARY_TABLE} "
+                    "WHERE orders_count = 0 AND month = ANY(CAST(:months AS date[]))"
+                ),
+                {"months": months},
+            )
+            label = f"{len(months)} month(s)"
+        conn.commit()
+    logger.info(f"Refreshed {MONTHLY_SUMMARY_TABLE} for {label}.")
+
+
+def refresh_after_load(engine, strategy, months=None):
+    """
+    Called by etl_northwind.py once all tables have loaded. `months` are the
+    months touched by the orders just loaded, or None when every month may
+    have changed (a full load).
+    """
+    try:
+        if strategy == "concurrent":
+            refresh_monthly_sales(engine)
+        elif strategy == "incremental":
+            refresh_monthly_summary(engine, months)
+    except Exception as e:
+        logger.error(f"Error refreshing monthly sales ({strategy}): {e}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Refresh the monthly_sales view.")
+    parser.add_argument(
+        "--incremental",
+        nargs="*",
+        metavar="YYYY-MM",
+        help="recompute these months into monthly_sales_summary "
+        "(all months if none are given) instead of refreshing the view",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    engine = db.get_engine()
+    if args.incremental is None:
+        refresh_monthly_sales(engine)
+    else:
+        months = [f"{month}-01" for month in args.incremental] or None
+        refresh_monthly_summary(engine, months)
+
+
+if __name__ == "__main__":
+    main()
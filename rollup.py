@@ -0,0 +1,140 @@
+"""
+Pre-aggregated sales cube for the Analytics dashboard.
+
+sales_cube holds revenue, units and order counts over three dimensions
+    month     first day of the order month (dim_date.month_start)
+    category  product category (dim_product.category)
+    segment   RFM customer segment (customer_segments, see segmentation.py)
+grouped BY CUBE, so every combination of dimensions (including the grand
+total) is stored. grouping_id is GROUPING(month, category, segment): a set
+bit means that dimension is rolled up, so month-by-category rows have
+grouping_id 1 and the grand total has 7. The cube is a few thousand rows,
+so any slice the dashboard asks for is an index lookup instead of a scan
+of fact_order_lines, and slices are kept in query_cache until the next load.
+
+etl_northwind.py rebuilds the cube after the star schema and the customer
+segments. Run directly to rebuild it by hand:
+    python rollup.py
+"""
+
+from sqlalchemy import text
+
+import db
+import metrics
+from mylogger import logger
+import query_cache
+import segmentation
+
+CUBE_TABLE = "sales_cube"
+
+# Cube dimensions in GROUPING() order: the first is the highest bit.
+DIMENSIONS = ("month", "category", "segment")
+
+CREATE_CUBE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS public.{CUBE_TABLE} (
+  grouping_id SMALLINT NOT NULL,
+  month DATE,
+  category TEXT,
+  segment TEXT,
+  orders_count BIGINT NOT NULL,
+  units BIGINT NOT NULL,
+  revenue NUMERIC NOT NULL
+)
+"""
+
+CREATE_CUBE_INDEX = (
+    f"CREATE INDEX IF NOT EXISTS idx_{CUBE_TABLE}_grouping_id "
+    f"ON public.{CUBE_TABLE} (grouping_id, month)"
+)
+
+REBUILD_CUBE = f"""
+INSERT INTO public.{CUBE_TABLE}
+  (grouping_id, month, category, segment, orders_count, units, revenue)
+SELECT
+  GROUPING(d.month_start, p.category, COALESCE(s.segment, 'Unsegmented')),
+  d.month_start,
+  p.category,
+  COALESCE(s.segment, 'Unsegmented'),
+  COUNT(DISTINCT f.order_id),
+  COALESCE(SUM(f.quantity), 0),
+  COALESCE(SUM(f.line_revenue), 0)
+FROM fact_order_lines f
+JOIN dim_date d ON d.date_key = f.date_key
+JOIN dim_product p ON p.product_key = f.product_key
+LEFT JOIN {segmentation.SEGMENT_TABLE} s ON s.customer_key = f.customer_key
+GROUP BY CUBE (d.month_start, p.category, COALESCE(s.segment, 'Unsegmented'))
+"""
+
+
+def grouping_id(by):
+    """Return the grouping_id of the cube rows broken down by the dimensions `by`."""
+    unknown = set(by) - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown cube dimensions: {', '.join(sorted(unknown))}")
+    bits = len(DIMENSIONS)
+    return sum(1 << (bits - 1 - i) for i, dim in enumerate(DIMENSIONS) if dim not in by)
+
+
+@metrics.timed("model.refresh_cube")
+def refresh_cube(engine):
+    """
+    Rebuild sales_cube from the star schema in one transaction. Readers
+    keep seeing the previous cube until it commits. Returns the row count.
+    """
+    with engine.connect() as conn:
+        conn.execute(text(CREATE_CUBE_TABLE))
+        conn.execute(text(CREATE_CUBE_INDEX))
+        conn.execute(text(f"DELETE FROM public.{CUBE_TABLE}"))
+        rows = conn.execute(text(REBUILD_CUBE)).rowcount
+        conn.commit()
+    logger.info(f"Refreshed {CUBE_TABLE}: {rows} rows.")
+    return rows
+
+
+def cube_query(by=(), filters=None):
+    """
+    Return the SQL and parameters reading one slice of the cube (see
+    query_cube). Raises ValueError for dimensions, in `by` or `filters`,
+    that the cube does not have.
+    """
+    filters = filters or {}
+    unknown = (set(by) | set(filters)) - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown cube dimensions: {', '.join(sorted(unknown))}")
+    by = [dim for dim in DIMENSIONS if dim in by or dim in filters]
+    conditions = ["grouping_id = :grouping_id"]
+    params = {"grouping_id": grouping_id(by)}
+    for dim, values in filters.items():
+        if not isinstance(values, (list, tuple, set)):
+            values = [values]
+        conditions.append(f"{dim} = ANY(:{dim})")
+        params[dim] = list(values)
+    columns = ", ".join([*by, "orders_count", "units", "revenue"])
+    order_by = f" ORDER BY {', '.join(by)}" if by else ""
+    query = (
+        f"SELECT {columns} FROM public.{CUBE_TABLE} "
+        f"WHERE {' AND '.join(conditions)}{order_by}"
+    )
+    return query, params
+
+
+def query_cube(engine, by=(), filters=None):
+    """
+    Return one slice of the cube as a DataFrame: a row per combination of
+    the dimensions in `by`, with orders_count, units and revenue. `filters`
+    maps dimensions to a value or list of values to keep; filtered
+    dimensions are added to the breakdown, since order counts cannot be
+    summed across them.
+    """
+    query, params = cube_query(by, filters)
+    return query_cache.cached_query(engine, query, [CUBE_TABLE], params)
+
+
+def main():
+    engine = db.get_engine()
+    refresh_cube(engine)
+    query_cache.bump_versions(engine, [CUBE_TABLE])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Cached catalog of the tables and views in the public schema.
+
+The catalog is read from pg_catalog in four queries (relations, columns,
+primary keys, indexes) and kept in memory, so the dashboard and console
+look tables up with dictionary reads instead of SQLAlchemy inspection on
+every rerun. Each entry holds the relation's kind, its columns (with type,
+nullability and the description from COLUMN_DESCRIPTIONS), primary key,
+indexes and planner row estimate.
+
+The cached catalog is tied to a schema version kept in the data_versions
+table (see query_cache). etl_northwind.py and create_views.py bump it after
+they change tables or views, and the next lookup reloads the catalog.
+Setting NORTHWIND_CATALOG_CACHE to a file path also keeps the catalog on
+disk, so a new process can start without re-reading pg_catalog.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from sqlalchemy import text
+
+import query_cache
+
+# Key of the schema version in the data_versions table.
+SCHEMA_VERSION_KEY = "_schema"
+
+# Optional JSON file the catalog is also saved to and loaded from.
+DISK_CACHE_PATH = os.environ.get("NORTHWIND_CATALOG_CACHE")
+
+COLUMN_DESCRIPTIONS = {
+    "customers": {
+        "customer_id": "Unique ID for each customer",
+        "name": "Customer's full name",
+        "email": "Customer email address",
+        "registration_date": "Date when the customer registered",
+    },
+    "products": {
+        "product_id": "Unique product identifier",
+        "name": "Name of the product",
+        "category": "Product category",
+        "price": "Unit price",
+        "stock_quantity": "Quantity in stock",
+    },
+    "orders": {
+        "order_id": "Unique order identifier",
+        "customer_id": "ID of the customer who placed the order",
+        "order_date": "Order placement date",
+        "total_amount": "Total order amount",
+    },
+    "order_details": {
+        "order_item_id": "Unique ID for each order line",
+        "order_id": "Associated order ID",
+        "product_id": "Product identifier",
+        "quantity": "Quantity ordered",
+        "price_at_order": "Price at the time of order",
+        "order_date": "Date of the order (copied from orders when partitioned)",
+    },
+}
+
+NO_DESCRIPTION = "No description available"
+
+RELATION_KINDS = {
+    "r": "table",
+    "p": "partitioned table",
+    "v": "view",
+    "m": "materialized view",
+}
+
+TABLE_KINDS = ("table", "partitioned table")
+
+_RELATIONS = """
+SELECT c.relname, c.relkind, c.reltuples,
+       (SELECT SUM(GREATEST(p.reltuples, 0)) FROM pg_inherits i
+        JOIN pg_class p ON p.oid = i.inhrelid WHERE i.inhparent = c.oid)
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm')
+  AND NOT c.relispartition
+ORDER BY c.relname
+"""
+
+_COLUMNS = """
+SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod), NOT a.attnotnull
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm')
+  AND NOT c.relispartition AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY c.relname, a.attnum
+"""
+
+_PRIMARY_KEYS = """
+SELECT c.relname, a.attname
+FROM pg_index x
+JOIN pg_class c ON c.oid = x.indrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN LATERAL unnest(x.indkey) WITH ORDINALITY AS k(attnum, position) ON TRUE
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+WHERE n.nspname = 'public' AND x.indisprimary
+ORDER BY c.relname, k.position
+"""
+
+_INDEXES = """
+SELECT tablename, indexname, indexdef
+FROM pg_indexes
+WHERE schemaname = 'public'
+ORDER BY tablename, indexname
+"""
+
+_lock = threading.Lock()
+_catalog = None
+_catalog_key = None
+
+
+def _estimate(relkind, reltuples, partition_rows):
+    if relkind == "v":
+        return None
+    if relkind == "p":
+        return int(partition_rows or 0)
+    return int(reltuples) if reltuples >= 0 else None
+
+
+def load_catalog(engine):
+    """Read the catalog of the public schema from the database."""
+    with engine.connect() as conn:
+        relations = conn.execute(text(_RELATIONS)).all()
+        columns = conn.execute(text(_COLUMNS)).all()
+        primary_keys = conn.execute(text(_PRIMARY_KEYS)).all()
+        indexes = conn.execute(text(_INDEXES)).all()
+
+    catalog = {}
+    for name, relkind, reltuples, partition_rows in relations:
+        catalog[name] = {
+            "kind": RELATION_KINDS[relkind],
+            "columns": [],
+            "primary_key": [],
+            "indexes": [],
+            "estimated_rows": _estimate(relkind, reltuples, partition_rows),
+        }
+    descriptions = COLUMN_DESCRIPTIONS
+    for table, column, sql_type, nullable in columns:
+        if table in catalog:
+            catalog[table]["columns"].append(
+                {
+                    "name": column,
+                    "type": sql_type,
+                    "nullable": nullable,
+                    "description": descriptions.get(table, {}).get(
+                        column, NO_DESCRIPTION
+                    ),
+                }
+            )
+    for table, column in primary_keys:
+        if table in catalog:
+            catalog[table]["primary_key"].append(column)
+    for table, index_name, definition in indexes:
+        if table in catalog:
+            catalog[table]["indexes"].append(
+                {"name": index_name, "definition": definition}
+            )
+    return catalog
+
+
+def _database_id(engine):
+    url = engine.url.render_as_string(hide_password=True)
+    return hashlib.sha1(url.encode()).hexdigest()
+
+
+def _read_disk_cache(key):
+    try:
+        with open(DISK_CACHE_PATH) as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if payload.get("key") != list(key):
+        return None
+    return payload.get("catalog")
+
+
+def _write_disk_cache(key, catalog):
+    tmp_path = f"{DISK_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        directory = os.path.dirname(DISK_CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump({"key": list(key), "catalog": catalog}, f)
+        os.replace(tmp_path, DISK_CACHE_PATH)
+    except OSError:
+        pass
+
+
+def get_catalog(engine, refresh=False):
+    """
+    Return {relation name: entry} for the public schema, from memory (or
+    the disk cache) while the schema version is unchanged. refresh=True
+    reloads it from the database regardless.
+    """
+    global _catalog, _catalog_key
+    (version,) = query_cache.data_versions(engine, [SCHEMA_VERSION_KEY])
+    key = (_database_id(engine), version)
+    with _lock:
+        if not refresh and _catalog is not None and _catalog_key == key:
+            return _catalog
+        catalog = None
+        if not refresh and DISK_CACHE_PATH:
+            catalog = _read_disk_cache(key)
+        if catalog is None:
+            catalog = load_catalog(engine)
+            if DISK_CACHE_PATH:
+                _write_disk_cache(key, catalog)
+        _catalog, _catalog_key = catalog, key
+        return catalog
+
+
+def table_info(engine, table_name):
+    """
+    Return the catalog entry of one table or view. A relation missing from
+    the cached catalog triggers one reload before KeyError is raised.
+    """
+    catalog = get_catalog(engine)
+    if table_name not in catalog:
+        catalog = get_catalog(engine, refresh=True)
+    return catalog[table_name]
+
+
+def table_names(engine, kinds=TABLE_KINDS):
+    """Return the names of the relations of the given kinds (tables by default)."""
+    return [name for name, info in get_catalog(engine).items() if info["kind"] in kinds]
+
+
+def bump_schema_version(engine):
+    """Invalidate every cached catalog; call after creating or altering tables."""
+    global _catalog
+    query_cache.bump_versions(engine, [SCHEMA_VERSION_KEY])
+    with _lock:
+        _catalog = None
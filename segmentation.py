@@ -0,0 +1,205 @@
+"""
+RFM customer segmentation computed inside PostgreSQL.
+
+Every customer with orders gets three scores from 1 (worst) to
+SCORE_LEVELS (best), computed from the star schema in a single statement:
+
+    recency    days from the customer's last order to the reference date
+               (the latest order date unless `as_of` is given)
+    frequency  number of orders (fact_orders, including orders without lines)
+    monetary   total line revenue
+
+Scores are binned either by quantile (CUME_DIST, so equal values always get
+the same score) or by the fixed THRESHOLDS (a CASE ladder, which unlike
+width_bucket with an array also runs on DuckDB). SEGMENT_RULES
+then map the scores to a named segment. The result is materialized in the
+customer_segments table by etl_northwind.py after the star schema is
+built, and the dashboard reads only the per-segment aggregates
+(segment_counts), a handful of rows whatever the number of customers.
+
+Run directly to rebuild the table by hand and print the segment sizes:
+    python segmentation.py [--method threshold]
+"""
+
+import argparse
+
+from sqlalchemy import text
+
+import db
+import metrics
+from mylogger import logger
+import query_cache
+import query_library
+
+SEGMENT_TABLE = "customer_segments"
+
+SEGMENT_METHODS = ("quantile", "threshold")
+
+# Scores run from 1 to SCORE_LEVELS; each threshold list therefore holds
+# SCORE_LEVELS - 1 ascending boundaries.
+SCORE_LEVELS = 5
+
+THRESHOLDS = {
+    "recency_days": [30, 90, 180, 365],
+    "frequency": [2, 4, 6, 10],
+    "monetary": [500, 1500, 3000, 6000],
+}
+
+# (segment, condition on r, f and m) checked in order; the first match wins.
+SEGMENT_RULES = [
+    ("Champions", "r >= 4 AND f >= 4 AND m >= 4"),
+    ("Loyal Customers", "f >= 4"),
+    ("Potential Loyalists", "r >= 4 AND f >= 2"),
+    ("New Customers", "r >= 4"),
+    ("At Risk", "r <= 2 AND f >= 3"),
+    ("Hibernating", "r <= 2"),
+    ("Needs Attention", "TRUE"),
+]
+
+SEGMENT_NAMES = [name for name, _ in SEGMENT_RULES]
+
+CREATE_SEGMENT_TABLE = f"""
+CREATE TABLE IF NOT EXISTS public.{SEGMENT_TABLE} (
+  customer_key INTEGER PRIMARY KEY,
+  customer_id INTEGER NOT NULL,
+  recency_days INTEGER NOT NULL,
+  frequency INTEGER NOT NULL,
+  monetary NUMERIC NOT NULL,
+  r SMALLINT NOT NULL,
+  f SMALLINT NOT NULL,
+  m SMALLINT NOT NULL,
+  segment TEXT NOT NULL
+)
+"""
+
+CREATE_SEGMENT_INDEX = (
+    f"CREATE INDEX IF NOT EXISTS idx_{SEGMENT_TABLE}_segment "
+    f"ON public.{SEGMENT_TABLE} (segment)"
+)
+
+# {scores} is filled in by score_sql() for the chosen binning method.
+BUILD_SEGMENTS = f"""
+INSERT INTO public.{SEGMENT_TABLE}
+  (customer_key, customer_id, recency_days, frequency, monetary, r, f, m, segment)
+WITH order_revenue AS (
+  SELECT order_id, SUM(line_revenue) AS revenue
+  FROM fact_order_lines
+  GROUP BY order_id
+),
+totals AS (
+  SELECT
+    o.customer_key,
+    MAX(d.full_date) AS last_order,
+    COUNT(*) AS frequency,
+    COALESCE(SUM(r.revenue), 0) AS monetary
+  FROM fact_orders o
+  JOIN dim_date d ON d.date_key = o.date_key
+  LEFT JOIN order_revenue r ON r.order_id = o.order_id
+  GROUP BY o.customer_key
+),
+metrics AS (
+  SELECT
+    customer_key,
+    COALESCE(CAST(:as_of AS date), MAX(last_order) OVER ()) - last_order
+      AS recency_days,
+    frequency,
+    monetary
+  FROM totals
+),
+scores AS (
+  SELECT metrics.*, {{scores}}
+  FROM metrics
+)
+SELECT
+  s.customer_key, c.customer_id, s.recency_days, s.frequency, s.monetary,
+  s.r, s.f, s.m,
+  CASE {{rules}} END
+FROM scores s
+JOIN dim_customer c ON c.customer_key = s.customer_key
+"""
+
+
+def _bucket_sql(column, values):
+    """SQL counting the ascending `values` that `column` reaches: 0 to len(values)."""
+    steps = " ".join(
+        f"WHEN {column} >= {float(value)} THEN {i}"
+        for i, value in reversed(list(enumerate(values, 1)))
+    )
+    return f"CASE WHEN {column} IS NULL THEN NULL {steps} ELSE 0 END"
+
+
+def score_sql(method="quantile", thresholds=None):
+    """Return the SELECT-list computing the r, f and m scores."""
+    if method == "quantile":
+        return (
+            f"CEIL(CUME_DIST() OVER (ORDER BY recency_days DESC) * {SCORE_LEVELS}) AS r, "
+            f"CEIL(CUME_DIST() OVER (ORDER BY frequency) * {SCORE_LEVELS}) AS f, "
+            f"CEIL(CUME_DIST() OVER (ORDER BY monetary) * {SCORE_LEVELS}) AS m"
+        )
+    if method != "threshold":
+        raise ValueError(f"Unknown segmentation method: {method}")
+
+    thresholds = {**THRESHOLDS, **(thresholds or {})}
+    buckets = {}
+    for column, values in thresholds.items():
+        if len(values) != SCORE_LEVELS - 1 or list(values) != sorted(values):
+            raise ValueError(
+                f"{column} needs {SCORE_LEVELS - 1} ascending thresholds, got {values}"
+            )
+        buckets[column] = _bucket_sql(column, values)
+    # Fewer days since the last order is better, so recency counts down.
+    return (
+        f"{SCORE_LEVELS} - {buckets['recency_days']} AS r, "
+        f"1 + {buckets['frequency']} AS f, "
+        f"1 + {buckets['monetary']} AS m"
+    )
+
+
+def segments_sql(method="quantile", thresholds=None):
+    """Return the INSERT filling customer_segments (with an :as_of parameter)."""
+    rules = " ".join(f"WHEN {cond} THEN '{name}'" for name, cond in SEGMENT_RULES)
+    return BUILD_SEGMENTS.format(scores=score_sql(method, thresholds), rules=rules)
+
+
+@metrics.timed("model.build_segments")
+def build_segments(engine, method="quantile", thresholds=None, as_of=None):
+    """
+    Recompute customer_segments in one transaction; readers keep the old
+    segments until it commits. `thresholds` overrides entries of THRESHOLDS
+    for method="threshold"; `as_of` ('YYYY-MM-DD') is the date recency is
+    measured from. Returns the number of customers segmented.
+    """
+    sql = segments_sql(method, thresholds)
+    with engine.connect() as conn:
+        conn.execute(text(CREATE_SEGMENT_TABLE))
+        conn.execute(text(CREATE_SEGMENT_INDEX))
+        conn.execute(text(f"DELETE FROM public.{SEGMENT_TABLE}"))
+        rows = conn.execute(text(sql), {"as_of": as_of}).rowcount
+        conn.commit()
+    logger.info(f"Segmented {rows} customers into {SEGMENT_TABLE} ({method}).")
+    return rows
+
+
+def segment_counts(engine):
+    """
+    Return one row per segment with its customer count, revenue and mean
+    recency/frequency, aggregated in the database (sql_script/
+    segment_counts.sql) and cached until the next load changes the segments.
+    """
+    return query_library.run(engine, "segment_counts")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the RFM customer segments.")
+    parser.add_argument("--method", choices=SEGMENT_METHODS, default="quantile")
+    parser.add_argument("--as-of", help="measure recency from this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    engine = db.get_engine()
+    build_segments(engine, args.method, as_of=args.as_of)
+    query_cache.bump_versions(engine, [SEGMENT_TABLE])
+    print(segment_counts(engine).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
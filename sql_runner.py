@@ -0,0 +1,196 @@
+"""
+Execution engine for the dashboard's SQL Runner.
+
+A QueryRun executes one statement on a background thread so the page can
+keep rendering and offer a cancel button while it runs:
+
+- Row-returning statements are read through a server-side cursor
+  (stream_results), `fetch_size` rows at a time, so only the rows kept for
+  display are ever held in memory.
+- Fetching stops at `max_rows` rows or `max_bytes` of DataFrame memory;
+  the result is then marked truncated and the cursor is closed.
+- `timeout_ms` is applied with SET LOCAL statement_timeout, so the server
+  aborts the statement itself when it runs too long.
+- cancel() sends pg_cancel_backend() for the query's backend over another
+  connection.
+
+Statements run in a transaction that is rolled back when they finish, as
+the SQL Runner has always done.
+"""
+
+import re
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+DEFAULT_MAX_ROWS = 10_000
+DEFAULT_MAX_BYTES = 50 * 2**20
+DEFAULT_TIMEOUT_MS = 30_000
+DEFAULT_FETCH_SIZE = 1_000
+
+# PostgreSQL's SQLSTATE for a statement cancelled by a timeout or request.
+QUERY_CANCELED = "57014"
+
+# Statements a server-side cursor can be declared for.
+_CURSOR_STATEMENT = re.compile(r"^\s*(\(\s*)*(select|with|values|table)\b", re.I)
+_LEADING_COMMENTS = re.compile(r"^(\s*(--[^\n]*\n|/\*.*?\*/))*", re.S)
+
+
+def returns_cursor_rows(sql):
+    """Return True if the statement can be streamed through a server-side cursor."""
+    return bool(_CURSOR_STATEMENT.match(_LEADING_COMMENTS.sub("", sql, count=1)))
+
+
+class QueryRun:
+    """
+    One statement executing on a background thread. Progress (rows and
+    bytes fetched, elapsed time, status) can be read while it runs; the
+    rows fetched so far are in `chunks`.
+    status is one of: running, done, error, cancelled, timeout.
+    """
+
+    def __init__(
+        self,
+        engine,
+        sql,
+        max_rows=DEFAULT_MAX_ROWS,
+        max_bytes=DEFAULT_MAX_BYTES,
+        timeout_ms=DEFAULT_TIMEOUT_MS,
+        fetch_size=DEFAULT_FETCH_SIZE,
+    ):
+        self.engine = engine
+        self.sql = sql
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.timeout_ms = timeout_ms
+        self.fetch_size = fetch_size
+        self.status = "running"
+        self.error = None
+        self.columns = None
+        self.chunks = []
+        self.rows = 0
+        self.bytes = 0
+        self.rowcount = None
+        self.truncated = False
+        self.backend_pid = None
+        self.started = None
+        self.finished = None
+        self._cancel_requested = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self.status == "running"
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.started
+
+    def wait(self, timeout=None):
+        """Block until the statement finishes (or `timeout` seconds pass)."""
+        self._thread.join(timeout)
+        return not self.running
+
+    def _run(self):
+        try:
+            with self.engine.connect() as conn:
+                self.backend_pid = conn.execute(
+                    text("SELECT pg_backend_pid()")
+                ).scalar()
+                conn.exec_driver_sql(
+                    f"SET LOCAL statement_timeout = {int(self.timeout_ms)}"
+                )
+                # no_parameters: the driver gets no parameter dict, so a %
+                # in the statement (LIKE 'A%', x % 7) is not a placeholder.
+                options = {"no_parameters": True}
+                if returns_cursor_rows(self.sql):
+                    options.update(stream_results=True, max_row_buffer=self.fetch_size)
+                result = conn.execution_options(**options).exec_driver_sql(self.sql)
+                if result.returns_rows:
+                    self._fetch(result)
+                else:
+                    self.rowcount = result.rowcount
+                conn.rollback()
+            self.status = "cancelled" if self._cancel_requested.is_set() else "done"
+        except Exception as e:
+            if getattr(getattr(e, "orig", None), "pgcode", None) == QUERY_CANCELED:
+                self.status = (
+                    "cancelled" if self._cancel_requested.is_set() else "timeout"
+                )
+            else:
+                self.status = "error"
+            self.error = e
+        finally:
+            self.finished = time.monotonic()
+
+    def _fetch(self, result):
+        self.columns = list(result.keys())
+        try:
+            for partition in result.partitions(self.fetch_size):
+                if not self._keep(pd.DataFrame(partition, columns=self.columns)):
+                    break
+        finally:
+            result.close()
+
+    def _keep(self, df):
+        """
+        Append one fetched chunk, cut at `max_rows` rows or `max_bytes`.
+        Returns False once fetching should stop.
+        """
+        if self.rows + len(df) > self.max_rows:
+            df = df.iloc[: self.max_rows - self.rows]
+            self.truncated = True
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if self.bytes + nbytes > self.max_bytes:
+            # Keep the share of the chunk that still fits.
+            keep = int(len(df) * (self.max_bytes - self.bytes) / nbytes)
+            df = df.iloc[:keep]
+            nbytes = int(df.memory_usage(index=True, deep=True).sum())
+            self.truncated = True
+        self.chunks.append(df)
+        self.rows += len(df)
+        self.bytes += nbytes
+        return not (self.truncated or self._cancel_requested.is_set())
+
+    def cancel(self):
+        """
+        Ask the server to cancel the statement. Fetching also stops at the
+        next chunk if the statement has already finished executing.
+        """
+        self._cancel_requested.set()
+        if self.running and self.backend_pid is not None:
+            with self.engine.connect() as conn:
+                conn.execute(
+                    text("SELECT pg_cancel_backend(:pid)"), {"pid": self.backend_pid}
+                )
+
+    def result(self):
+        """Return the rows fetched so far as one DataFrame."""
+        if not self.chunks:
+            return pd.DataFrame(columns=self.columns or [])
+        return pd.concat(self.chunks, ignore_index=True)
+
+    def describe(self):
+        """Return a one-line progress summary."""
+        summary = (
+            f"{self.status}: {self.rows:,} rows, "
+            f"{self.bytes / 2**20:.1f} MiB in {self.elapsed:.2f}s"
+        )
+        if self.truncated:
+            summary += (
+                f" (truncated at {self.max_rows:,} rows / "
+                f"{self.max_bytes / 2**20:.0f} MiB)"
+            )
+        if self.rowcount is not None and self.rowcount >= 0:
+            summary += f"; {self.rowcount:,} rows affected (rolled back)"
+        return summary
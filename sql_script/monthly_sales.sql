@@ -1,6 +1,12 @@
+-- description: Orders and sales per month, from the monthly_sales_summary table
+-- tables: monthly_sales_summary
+-- param: start_date date
+-- param: end_date date
 SELECT 
     month,
     orders_count,
     total_sales
-FROM monthly_sales
+FROM monthly_sales_summary
+WHERE (:start_date IS NULL OR month >= :start_date)
+  AND (:end_date IS NULL OR month <= :end_date)
 ORDER BY month;
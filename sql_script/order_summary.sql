@@ -1,3 +1,9 @@
+-- description: Orders with each customer's running total
+-- tables: orders
+-- param: customer_id integer
+-- param: start_date date
+-- param: end_date date
+-- batch: no
 SELECT 
     o.order_id,
     o.customer_id,
@@ -5,4 +11,7 @@ SELECT
     o.total_amount,
     SUM(o.total_amount) OVER (PARTITION BY o.customer_id ORDER BY o.order_date) AS running_total
 FROM orders o
+WHERE (:customer_id IS NULL OR o.customer_id = :customer_id)
+  AND (:start_date IS NULL OR o.order_date >= :start_date)
+  AND (:end_date IS NULL OR o.order_date <= :end_date)
 ORDER BY o.customer_id, o.order_date;
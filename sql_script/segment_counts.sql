@@ -0,0 +1,10 @@
+-- description: Customers, revenue and mean recency/frequency per RFM segment
+-- tables: customer_segments
+SELECT segment,
+       COUNT(*) AS customers,
+       SUM(monetary) AS revenue,
+       ROUND(AVG(recency_days), 1) AS avg_recency_days,
+       ROUND(AVG(frequency), 1) AS avg_frequency
+FROM public.customer_segments
+GROUP BY segment
+ORDER BY customers DESC;
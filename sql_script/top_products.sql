@@ -1,13 +1,21 @@
+-- description: Best-selling products by revenue
+-- tables: fact_order_lines, dim_product, dim_date
+-- param: top_n integer = 10
+-- param: start_date date
+-- param: end_date date
 WITH product_sales AS (
     SELECT 
         p.product_id,
         p.name,
-        SUM(od.quantity * od.price_at_order) AS total_sales
-    FROM products p
-    JOIN order_details od ON p.product_id = od.product_id
+        SUM(f.line_revenue) AS total_sales
+    FROM fact_order_lines f
+    JOIN dim_product p ON p.product_key = f.product_key
+    JOIN dim_date d ON d.date_key = f.date_key
+    WHERE (:start_date IS NULL OR d.full_date >= :start_date)
+      AND (:end_date IS NULL OR d.full_date <= :end_date)
     GROUP BY p.product_id, p.name
 )
 SELECT *
 FROM product_sales
 ORDER BY total_sales DESC
-LIMIT 10;
+LIMIT :top_n;
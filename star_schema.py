@@ -0,0 +1,323 @@
+"""
+Star-schema warehouse layer built from the raw Northwind tables.
+
+    fact_order_lines  one row per order line, with integer surrogate keys
+                      and the line revenue (quantity * price) precomputed
+    fact_orders       one row per order (including orders without lines),
+                      with its date and customer keys: order counts come
+                      from here, revenue from fact_order_lines
+    dim_date          one row per calendar day, keyed YYYYMMDD
+    dim_customer      customers, keyed by a surrogate customer_key
+    dim_product       products, keyed by a surrogate product_key
+
+etl_northwind.py calls build_star_schema() after the raw tables load: a
+full load rebuilds every table, an incremental load upserts the orders and
+order lines the ETL wrote (their order ids are queued in
+star_pending_orders) plus any past the facts' highest ids, and upserts
+changed customers and products. A rebuild deletes and reloads the facts
+in one transaction, so the dashboard keeps reading the old rows until it
+commits instead of waiting on a TRUNCATE lock. The views in
+create_views.py and the dashboard queries read from these tables, so they
+scan the narrow fact table and join small dimensions instead of re-joining
+orders, order_details and products.
+
+Run directly to rebuild (or append) by hand:
+    python star_schema.py [--append]
+"""
+
+import argparse
+
+from sqlalchemy import text
+
+import db
+import metrics
+from mylogger import logger
+
+MODEL_MODES = ("rebuild", "append", "none")
+
+# Order ids written by the incremental ETL since the last model build.
+PENDING_ORDERS_TABLE = "star_pending_orders"
+
+# Raw tables whose upserts queue their order ids (see queue_pending_orders).
+PENDING_ORDER_SOURCES = ("orders", "order_details")
+
+CREATE_PENDING_ORDERS = (
+    f"CREATE TABLE IF NOT EXISTS public.{PENDING_ORDERS_TABLE} "
+    "(order_id INTEGER PRIMARY KEY)"
+)
+
+CREATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS public.dim_date (
+      date_key INTEGER PRIMARY KEY,
+      full_date DATE NOT NULL UNIQUE,
+      year SMALLINT NOT NULL,
+      quarter SMALLINT NOT NULL,
+      month SMALLINT NOT NULL,
+      month_start DATE NOT NULL,
+      day SMALLINT NOT NULL,
+      day_of_week SMALLINT NOT NULL,
+      is_weekend BOOLEAN NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS public.dim_customer (
+      customer_key INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+      customer_id INTEGER NOT NULL UNIQUE,
+      name TEXT,
+      email TEXT,
+      registration_date DATE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS public.dim_product (
+      product_key INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+      product_id INTEGER NOT NULL UNIQUE,
+      name TEXT,
+      category TEXT,
+      price NUMERIC(12, 2)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS public.fact_orders (
+      order_id INTEGER PRIMARY KEY,
+      date_key INTEGER NOT NULL REFERENCES public.dim_date (date_key),
+      customer_key INTEGER NOT NULL REFERENCES public.dim_customer (customer_key),
+      total_amount NUMERIC(12, 2)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS public.fact_order_lines (
+      order_item_id INTEGER PRIMARY KEY,
+      order_id INTEGER NOT NULL,
+      date_key INTEGER NOT NULL REFERENCES public.dim_date (date_key),
+      customer_key INTEGER NOT NULL REFERENCES public.dim_customer (customer_key),
+      product_key INTEGER NOT NULL REFERENCES public.dim_product (product_key),
+      quantity INTEGER NOT NULL,
+      unit_price NUMERIC(12, 2) NOT NULL,
+      line_revenue NUMERIC(14, 2) NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_fact_order_lines_date_key "
+    "ON public.fact_order_lines (date_key)",
+    "CREATE INDEX IF NOT EXISTS idx_fact_order_lines_customer_key "
+    "ON public.fact_order_lines (customer_key)",
+    "CREATE INDEX IF NOT EXISTS idx_fact_order_lines_product_key "
+    "ON public.fact_order_lines (product_key)",
+    "CREATE INDEX IF NOT EXISTS idx_fact_orders_date_key "
+    "ON public.fact_orders (date_key)",
+    "CREATE INDEX IF NOT EXISTS idx_fact_orders_customer_key "
+    "ON public.fact_orders (customer_key)",
+    "CREATE INDEX IF NOT EXISTS idx_dim_date_month_start "
+    "ON public.dim_date (month_start)",
+    CREATE_PENDING_ORDERS,
+]
+
+# A rebuild empties the facts and dim_date and drops dimension rows whose
+# source row is gone; the remaining dimension rows keep their keys.
+CLEAR_TABLES = [
+    "DELETE FROM public.fact_order_lines",
+    "DELETE FROM public.fact_orders",
+    "DELETE FROM public.dim_date",
+    "DELETE FROM public.dim_customer d WHERE NOT EXISTS "
+    "(SELECT 1 FROM public.customers c WHERE c.customer_id = d.customer_id)",
+    "DELETE FROM public.dim_product d WHERE NOT EXISTS "
+    "(SELECT 1 FROM public.products p WHERE p.product_id = d.product_id)",
+]
+
+# Calendar days between the first and last order date not yet in dim_date.
+LOAD_DIM_DATE = """
+INSERT INTO public.dim_date
+SELECT
+  (EXTRACT(YEAR FROM d) * 10000 + EXTRACT(MONTH FROM d) * 100 + EXTRACT(DAY FROM d))::int,
+  d::date,
+  EXTRACT(YEAR FROM d),
+  EXTRACT(QUARTER FROM d),
+  EXTRACT(MONTH FROM d),
+  DATE_TRUNC('month', d)::date,
+  EXTRACT(DAY FROM d),
+  EXTRACT(ISODOW FROM d),
+  EXTRACT(ISODOW FROM d) >= 6
+FROM generate_series(
+  (SELECT MIN(order_date) FROM public.orders),
+  (SELECT MAX(order_date) FROM public.orders),
+  INTERVAL '1 day'
+) AS d
+ON CONFLICT (date_key) DO NOTHING
+"""
+
+UPSERT_DIM_CUSTOMER = """
+INSERT INTO public.dim_customer AS t (customer_id, name, email, registration_date)
+SELECT customer_id, name, email, registration_date FROM public.customers
+ON CONFLICT (customer_id) DO UPDATE
+SET name = EXCLUDED.name,
+    email = EXCLUDED.email,
+    registration_date = EXCLUDED.registration_date
+WHERE (t.name, t.email, t.registration_date)
+  IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.email, EXCLUDED.registration_date)
+"""
+
+UPSERT_DIM_PRODUCT = """
+INSERT INTO public.dim_product AS t (product_id, name, category, price)
+SELECT product_id, name, category, price FROM public.products
+ON CONFLICT (product_id) DO UPDATE
+SET name = EXCLUDED.name,
+    category = EXCLUDED.category,
+    price = EXCLUDED.price
+WHERE (t.name, t.category, t.price)
+  IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.category, EXCLUDED.price)
+"""
+
+# {where} restricts the orders read; empty for a rebuild.
+UPSERT_FACT_ORDERS = """
+INSERT INTO public.fact_orders AS t (order_id, date_key, customer_key, total_amount)
+SELECT
+  o.order_id,
+  (EXTRACT(YEAR FROM o.order_date) * 10000
+    + EXTRACT(MONTH FROM o.order_date) * 100
+    + EXTRACT(DAY FROM o.order_date))::int,
+  c.customer_key,
+  o.total_amount
+FROM public.orders o
+JOIN public.dim_customer c ON c.customer_id = o.customer_id
+{where}
+ON CONFLICT (order_id) DO UPDATE
+SET date_key = EXCLUDED.date_key,
+    customer_key = EXCLUDED.customer_key,
+    total_amount = EXCLUDED.total_amount
+WHERE (t.date_key, t.customer_key, t.total_amount)
+  IS DISTINCT FROM (EXCLUDED.date_key, EXCLUDED.customer_key, EXCLUDED.total_amount)
+"""
+
+# {where} restricts the order lines read; empty for a rebuild.
+UPSERT_FACT_ORDER_LINES = """
+INSERT INTO public.fact_order_lines AS t (
+  order_item_id, order_id, date_key, customer_key, product_key,
+  quantity, unit_price, line_revenue
+)
+SELECT
+  od.order_item_id,
+  od.order_id,
+  (EXTRACT(YEAR FROM o.order_date) * 10000
+    + EXTRACT(MONTH FROM o.order_date) * 100
+    + EXTRACT(DAY FROM o.order_date))::int,
+  c.customer_key,
+  p.product_key,
+  od.quantity,
+  od.price_at_order,
+  od.quantity * od.price_at_order
+FROM public.order_details od
+JOIN public.orders o ON o.order_id = od.order_id
+JOIN public.dim_customer c ON c.customer_id = o.customer_id
+JOIN public.dim_product p ON p.product_id = od.product_id
+{where}
+ON CONFLICT (order_item_id) DO UPDATE
+SET order_id = EXCLUDED.order_id,
+    date_key = EXCLUDED.date_key,
+    customer_key = EXCLUDED.customer_key,
+    product_key = EXCLUDED.product_key,
+    quantity = EXCLUDED.quantity,
+    unit_price = EXCLUDED.unit_price,
+    line_revenue = EXCLUDED.line_revenue
+WHERE (t.order_id, t.date_key, t.customer_key, t.product_key, t.quantity, t.unit_price)
+  IS DISTINCT FROM (EXCLUDED.order_id, EXCLUDED.date_key, EXCLUDED.customer_key,
+                    EXCLUDED.product_key, EXCLUDED.quantity, EXCLUDED.unit_price)
+"""
+
+# Orders (and the lines of orders) queued by the incremental ETL, plus any
+# past the highest id already in the fact table.
+APPEND_ORDERS_WHERE = f"""
+WHERE o.order_id > (SELECT COALESCE(MAX(order_id), 0) FROM public.fact_orders)
+   OR o.order_id IN (SELECT order_id FROM public.{PENDING_ORDERS_TABLE})
+"""
+
+APPEND_LINES_WHERE = f"""
+WHERE od.order_item_id > (SELECT COALESCE(MAX(order_item_id), 0) FROM public.fact_order_lines)
+   OR od.order_id IN (SELECT order_id FROM public.{PENDING_ORDERS_TABLE})
+"""
+
+
+def queue_pending_orders(cursor, table_name, stage):
+    """
+    Queue the order ids of the rows staged in `stage` for the next append,
+    on the caller's DBAPI cursor (and so in its transaction).
+    """
+    if table_name not in PENDING_ORDER_SOURCES:
+        return
+    cursor.execute(CREATE_PENDING_ORDERS)
+    cursor.execute(
+        f"INSERT INTO public.{PENDING_ORDERS_TABLE} (order_id) "
+        f"SELECT DISTINCT order_id FROM {stage} WHERE order_id IS NOT NULL "
+        "ON CONFLICT DO NOTHING"
+    )
+
+
+def create_tables(engine):
+    """Create the star-schema tables and indexes if they do not exist."""
+    with engine.connect() as conn:
+        for statement in CREATE_TABLES:
+            conn.execute(text(statement))
+        conn.commit()
+
+
+@metrics.timed("model.build_star_schema")
+def build_star_schema(engine, mode="rebuild"):
+    """
+    Populate the star schema from the raw tables in one transaction.
+    mode="rebuild" deletes and reloads every table (surrogate keys are
+    kept); mode="append" keeps existing rows, upserts the dimensions and
+    upserts the orders and order lines queued in star_pending_orders or
+    past the facts' highest ids. Either way the queue is emptied.
+    Returns the number of order-line fact rows written.
+    """
+    if mode == "none":
+        return 0
+    create_tables(engine)
+    with engine.connect() as conn:
+        if mode == "rebuild":
+            for statement in CLEAR_TABLES:
+                conn.execute(text(statement))
+        conn.execute(text(LOAD_DIM_DATE))
+        conn.execute(text(UPSERT_DIM_CUSTOMER))
+        conn.execute(text(UPSERT_DIM_PRODUCT))
+        append = mode == "append"
+        orders_where = APPEND_ORDERS_WHERE if append else ""
+        lines_where = APPEND_LINES_WHERE if append else ""
+        orders = conn.execute(
+            text(UPSERT_FACT_ORDERS.format(where=orders_where))
+        ).rowcount
+        facts = conn.execute(
+            text(UPSERT_FACT_ORDER_LINES.format(where=lines_where))
+        ).rowcount
+        conn.execute(text(f"DELETE FROM public.{PENDING_ORDERS_TABLE}"))
+        conn.commit()
+
+    # Fresh statistics so the planner sizes the fact/dimension joins well.
+    with engine.connect() as conn:
+        conn.execute(
+            text(
+                "ANALYZE public.fact_order_lines, public.fact_orders, public.dim_customer, "
+                "public.dim_product, public.dim_date"
+            )
+        )
+        conn.commit()
+    logger.info(
+        f"Star schema {mode}: wrote {orders} rows to fact_orders "
+        f"and {facts} rows to fact_order_lines."
+    )
+    return facts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the star-schema tables.")
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="upsert queued and new orders instead of rebuilding every table",
+    )
+    args = parser.parse_args()
+    build_star_schema(db.get_engine(), "append" if args.append else "rebuild")
+
+
+if __name__ == "__main__":
+    main()
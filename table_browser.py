@@ -0,0 +1,184 @@
+"""
+Server-side paginated browsing of a table, one small query per page.
+
+Pages are fetched with keyset pagination: rows are ordered by the primary
+key (or by a chosen column with the primary key as tie-breaker) and each
+page asks for the rows after the last key of the previous one, with
+LIMIT pushed to the server. An index on the ordering columns makes every
+page an index range scan however deep into the table it is. Tables and
+views without a primary key fall back to LIMIT/OFFSET, ordered by every
+column (after the sort column, if any) so that pages neither repeat nor
+skip rows.
+
+Columns, primary key and row count come from the cached schema catalog
+(schema_catalog.py), so opening a browser runs no catalog queries. Row
+counts are PostgreSQL's planner estimates (pg_class.reltuples, summed over
+partitions for a partitioned table), so showing the size of a huge table
+never runs COUNT(*).
+"""
+
+import pandas as pd
+from sqlalchemy import text
+
+import schema_catalog
+
+DEFAULT_PAGE_SIZE = 50
+
+PAGE_SIZES = (10, 25, 50, 100, 500)
+
+# Column types that cannot be ordered, left out of the OFFSET fallback's ORDER BY.
+UNORDERABLE_TYPES = ("json", "xml")
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+class TableBrowser:
+    """
+    Pages through one table. Call fetch() for the current page and
+    next_page()/prev_page() to move; the browser remembers the keys that
+    start each page visited, so going back is a keyset query too.
+    `sort` is an optional column to order by, ascending unless
+    `descending`; NULLs come last either way. Only tables and views in
+    the public schema can be browsed. `info` is the table's catalog
+    entry, looked up in schema_catalog unless given.
+    """
+
+    def __init__(
+        self,
+        engine,
+        table_name,
+        page_size=DEFAULT_PAGE_SIZE,
+        sort=None,
+        descending=False,
+        info=None,
+    ):
+        self.engine = engine
+        self.table_name = table_name
+        self.page_size = page_size
+        self.descending = descending
+        if info is None:
+            info = schema_catalog.table_info(engine, table_name)
+        self.columns = [col["name"] for col in info["columns"]]
+        self.orderable = [
+            col["name"]
+            for col in info["columns"]
+            if col.get("type") not in UNORDERABLE_TYPES
+        ]
+        if sort is not None and sort not in self.columns:
+            raise ValueError(f"Unknown column {sort!r} in {table_name}")
+        self.sort = sort
+        self.key_columns = list(info["primary_key"])
+        self.estimated_rows = info["estimated_rows"]
+        # Start key of each page visited so far; None starts the first page.
+        self.page_starts = [None]
+        self.last_key = None
+        self.has_next = False
+
+    @property
+    def page_number(self):
+        return len(self.page_starts)
+
+    @property
+    def has_prev(self):
+        return len(self.page_starts) > 1
+
+    @property
+    def keyset(self):
+        """True if pages are fetched by key rather than by OFFSET."""
+        return bool(self.key_columns)
+
+    def next_page(self):
+        if self.has_next:
+            self.page_starts.append(self.last_key)
+
+    def prev_page(self):
+        if self.has_prev:
+            self.page_starts.pop()
+
+    def _sort_prefix(self):
+        """True if the sort column goes in front of the primary key."""
+        return self.sort is not None and self.sort != self.key_columns[0]
+
+    def _order_columns(self):
+        # Sorting by the leading key column keeps the primary key as the
+        # order; any other column (a later column of a composite key too)
+        # goes first, with the rest of the key as tie-breaker.
+        if self._sort_prefix():
+            return [self.sort, *[k for k in self.key_columns if k != self.sort]]
+        return self.key_columns
+
+    def _query(self, start):
+        """Return the SQL and parameters for the page starting after `start`."""
+        direction = "DESC" if self.descending else "ASC"
+        table = f"public.{_quote(self.table_name)}"
+        select = f"SELECT * FROM {table}"
+        limit = self.page_size + 1
+        params = {"limit": limit}
+
+        if not self.keyset:
+            order = []
+            if self.sort is not None:
+                order.append(f"{_quote(self.sort)} {direction} NULLS LAST")
+            order += [_quote(col) for col in self.orderable if col != self.sort]
+            order = f" ORDER BY {', '.join(order)}" if order else ""
+            params["offset"] = (self.page_number - 1) * self.page_size
+            return f"{select}{order} LIMIT :limit OFFSET :offset", params
+
+        columns = self._order_columns()
+        key_direction = direction if self.sort is not None else "ASC"
+        order = ", ".join(
+            f"{_quote(col)} {key_direction} NULLS LAST" for col in columns
+        )
+        where = ""
+        if start is not None:
+            op = "<" if key_direction == "DESC" else ">"
+            for i, value in enumerate(start):
+                params[f"k{i}"] = value
+            prefix = self._sort_prefix()
+            keys = [_quote(col) for col in (columns[1:] if prefix else columns)]
+            key_params = [
+                f":k{i}" for i in range(len(columns) - len(keys), len(columns))
+            ]
+            key_after = f"({', '.join(keys)}) {op} ({', '.join(key_params)})"
+            if prefix:
+                # A sort column in front of the key; its NULLs sort last.
+                sort_col = _quote(self.sort)
+                if start[0] is None:
+                    where = f" WHERE {sort_col} IS NULL AND {key_after}"
+                else:
+                    where = (
+                        f" WHERE (({sort_col}, {', '.join(keys)}) {op} "
+                        f"(:k0, {', '.join(key_params)}) OR {sort_col} IS NULL)"
+                    )
+            else:
+                where = f" WHERE {key_after}"
+        return f"{select}{where} ORDER BY {order} LIMIT :limit", params
+
+    def fetch(self):
+        """Return the current page as a DataFrame (at most page_size rows)."""
+        sql, params = self._query(self.page_starts[-1])
+        columns, rows = self._fetch_rows(sql, params)
+        self.has_next = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if rows and self.keyset:
+            positions = [columns.index(col) for col in self._order_columns()]
+            self.last_key = tuple(rows[-1][pos] for pos in positions)
+        return pd.DataFrame(rows, columns=columns)
+
+    def _fetch_rows(self, sql, params):
+        """Run the page query and return (column names, rows)."""
+        with self.engine.connect() as conn:
+            result = conn.execute(text(sql), params)
+            return list(result.keys()), result.fetchall()
+
+    def describe(self):
+        """Return a one-line summary of the current page position."""
+        first = (self.page_number - 1) * self.page_size + 1
+        total = (
+            f"~{self.estimated_rows:,} rows (estimated)"
+            if self.estimated_rows is not None
+            else "row count unknown"
+        )
+        return f"Page {self.page_number} (rows from {first:,}) of {total}"
@@ -0,0 +1,81 @@
+"""Prometheus text rendering of recorded metrics."""
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def recording():
+    was_enabled = metrics.enabled()
+    metrics.configure(enabled=True)
+    metrics.reset()
+    yield
+    metrics.reset()
+    metrics.configure(enabled=was_enabled)
+
+
+def test_nothing_recorded_while_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "_enabled", False)
+    metrics.reset()
+    metrics.count("etl_rows", 5, table="orders")
+    assert metrics.render_prometheus() == "\n"
+
+
+def test_render_prometheus(recording):
+    # Families come out by kind, then name: counters, gauges, summaries.
+    metrics.count("etl_rows", 5, table="orders")
+    metrics.count("etl_rows", 2, table="orders")
+    metrics.gauge("process_peak_rss_bytes", 1024, process="etl")
+    metrics.observe("db_query_seconds", 0.25, statement="select")
+    metrics.observe("db_query_seconds", 0.5, statement="select")
+    assert metrics.render_prometheus().splitlines() == [
+        "# HELP northwind_etl_rows Rows loaded per table.",
+        "# TYPE northwind_etl_rows counter",
+        'northwind_etl_rows{table="orders"} 7',
+        "# HELP northwind_process_peak_rss_bytes Peak resident set size of the process.",
+        "# TYPE northwind_process_peak_rss_bytes gauge",
+        'northwind_process_peak_rss_bytes{process="etl"} 1024',
+        "# HELP northwind_db_query_seconds Duration of SQL statements, by statement type.",
+        "# TYPE northwind_db_query_seconds summary",
+        'northwind_db_query_seconds_count{statement="select"} 2',
+        'northwind_db_query_seconds_sum{statement="select"} 0.750000',
+    ]
+
+
+def test_openmetrics_counters_and_eof(recording):
+    metrics.count("custom_events")
+    lines = metrics.render_prometheus(openmetrics=True).splitlines()
+    assert lines == [
+        "# HELP northwind_custom_events custom events",
+        "# TYPE northwind_custom_events counter",
+        "northwind_custom_events_total 1",
+        "# EOF",
+    ]
+
+
+def test_label_values_are_escaped(recording):
+    metrics.gauge("panel", 1, title='say "hi"\\\n')
+    assert (
+        'northwind_panel{title="say \\"hi\\"\\\\\\n"} 1' in metrics.render_prometheus()
+    )
+
+
+def test_failed_statements_do_not_skew_query_timings(recording):
+    from sqlalchemy import create_engine, exc, text
+
+    engine = metrics.instrument_engine(create_engine("sqlite://"))
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(exc.OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+        conn.execute(text("SELECT 1"))
+        assert not any(key.startswith("metrics") for key in conn.info)
+    samples = {
+        labels: value
+        for (kind, name, labels), value in metrics.snapshot().items()
+        if name == "db_query_seconds"
+    }
+    count, seconds = samples[(("statement", "SELECT"),)]
+    assert count == 1
+    assert 0 <= seconds < 1
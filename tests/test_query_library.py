@@ -0,0 +1,107 @@
+"""Header parsing and placeholder rewriting of named queries; no database needed."""
+
+import pytest
+
+import query_library
+
+SQL = """\
+-- name: top-products
+-- description: Best-selling products by revenue
+-- tables: fact_order_lines, dim_product
+-- param: top_n integer = 10
+-- param: start_date date
+-- param: categories text[] = NULL
+SELECT p.product_name, SUM(f.line_revenue) AS revenue
+FROM fact_order_lines f
+JOIN dim_product p ON p.product_key = f.product_key
+WHERE (:start_date IS NULL OR f.date_key >= :start_date)
+  AND (:categories IS NULL OR p.category = ANY(:categories))
+  AND p.product_name NOT LIKE 'Discontinued%'
+  AND f.date_key::date IS NOT NULL
+GROUP BY p.product_name
+ORDER BY revenue DESC
+LIMIT :top_n;
+"""
+
+
+def test_header_lines_describe_the_query():
+    query = query_library.parse_query(SQL, "top_products")
+    assert query.name == "top-products"
+    assert query.description == "Best-selling products by revenue"
+    assert query.tables == ["fact_order_lines", "dim_product"]
+    assert query.params == {
+        "top_n": ("integer", 10),
+        "start_date": ("date", None),
+        "categories": ("text[]", None),
+    }
+    assert query.batch
+    assert not query.sql.endswith(";")
+
+
+def test_statement_name_is_a_valid_identifier():
+    query = query_library.parse_query(SQL, "top_products")
+    assert query.statement_name.startswith("nw_top_products_")
+
+
+def test_missing_header_falls_back_to_file_name_and_from_clause():
+    query = query_library.parse_query(
+        "WITH recent AS (SELECT * FROM orders)\n"
+        "SELECT * FROM recent JOIN customers c USING (customer_id)",
+        "recent_orders",
+    )
+    assert query.name == "recent_orders"
+    assert query.tables == ["customers", "orders"]
+    assert query.params == {}
+
+
+@pytest.mark.parametrize(
+    "value, batch", [("no", False), ("false", False), ("yes", True)]
+)
+def test_batch_header(value, batch):
+    query = query_library.parse_query(f"-- batch: {value}\nSELECT 1", "q")
+    assert query.batch is batch
+
+
+def test_header_stops_at_the_statement():
+    query = query_library.parse_query("SELECT 1\n-- description: not a header", "q")
+    assert query.description == ""
+
+
+def test_bad_param_line_is_rejected():
+    with pytest.raises(ValueError, match="bad param line"):
+        query_library.parse_query("-- param: 10\nSELECT 1", "q")
+
+
+def test_bind_fills_defaults_and_rejects_unknown_parameters():
+    query = query_library.parse_query(SQL, "top_products")
+    assert query.bind({"top_n": 3}) == {
+        "top_n": 3,
+        "start_date": None,
+        "categories": None,
+    }
+    with pytest.raises(ValueError, match="Unknown parameters"):
+        query.bind({"limit": 3})
+
+
+def test_placeholder_styles():
+    query = query_library.parse_query(SQL, "top_products")
+    positional = query.positional_sql()
+    assert "LIMIT $1" in positional and ":start_date" not in positional
+    # A :: cast is not a placeholder.
+    assert "f.date_key::date" in positional
+    assert "LIKE 'Discontinued%%'" in query.pyformat_sql()
+    assert "CAST($top_n AS integer)" in query.dollar_sql()
+    assert query.prepare_sql().startswith(
+        f"PREPARE {query.statement_name} (integer, date, text[]) AS "
+    )
+    assert query.execute_sql() == (
+        f"EXECUTE {query.statement_name}(:top_n, :start_date, :categories)"
+    )
+
+
+def test_batch_sql_renames_each_querys_placeholders():
+    first = query_library.parse_query("SELECT :n AS n", "first")
+    second = query_library.parse_query("SELECT :n AS n", "second")
+    sql = query_library.batch_sql([first, second])
+    assert "(SELECT :q0_n AS n) q0" in sql
+    assert "(SELECT :q1_n AS n) q1" in sql
@@ -0,0 +1,124 @@
+"""Flags and index advice from hand-written JSON plans; no database needed."""
+
+import query_profiler
+
+CATALOG = {
+    "orders": {
+        "estimated_rows": 50_000,
+        "columns": [{"name": "order_id"}, {"name": "customer_id"}],
+        "indexes": [
+            {"definition": "CREATE UNIQUE INDEX ON orders USING btree (order_id)"}
+        ],
+    },
+    "order_details": {
+        "estimated_rows": 100_000,
+        "columns": [{"name": "order_id"}, {"name": "quantity"}],
+        "indexes": [],
+    },
+}
+
+
+def scan(relation, rows, plan_rows, removed=0, loops=1, node="Seq Scan"):
+    return {
+        "Node Type": node,
+        "Relation Name": relation,
+        "Alias": relation,
+        "Plan Rows": plan_rows,
+        "Actual Rows": rows,
+        "Actual Loops": loops,
+        "Actual Total Time": 0.1,
+        "Rows Removed by Filter": removed,
+        "Filter": "(quantity = 3)",
+    }
+
+
+def append(children, rows, plan_rows):
+    return {
+        "Plan": {
+            "Node Type": "Append",
+            "Plan Rows": plan_rows,
+            "Actual Rows": rows,
+            "Actual Loops": 1,
+            "Actual Total Time": 1.0,
+            "Plans": children,
+        }
+    }
+
+
+def flags(plan, large_rows=query_profiler.LARGE_TABLE_ROWS):
+    nodes = query_profiler.flatten_plan(plan, CATALOG, large_rows)
+    return {entry["relation"] or entry["node"]: entry["flags"] for entry in nodes}
+
+
+def test_sequential_scan_of_large_table():
+    plan = {"Plan": scan("orders", 120, 100, removed=49_880)}
+    assert flags(plan)["orders"] == ["sequential scan of orders (~50,000 rows)"]
+
+
+def test_partitions_are_judged_by_the_rows_they_read():
+    plan = append(
+        [
+            scan("order_details_p2024_01", 300, 290, removed=2_700),
+            scan("order_details_p2024_02", 1_200, 1_000, removed=10_800),
+        ],
+        rows=1_500,
+        plan_rows=1_290,
+    )
+    result = flags(plan)
+    assert result["order_details_p2024_01"] == []
+    assert result["order_details_p2024_02"] == [
+        "sequential scan of order_details_p2024_02 "
+        "(partition of order_details, ~12,000 rows)"
+    ]
+    nodes = query_profiler.flatten_plan(plan, CATALOG)
+    assert [
+        index["statement"] for index in query_profiler.advise_indexes(nodes, CATALOG)
+    ] == ["CREATE INDEX ON public.order_details (quantity);"]
+
+
+def test_partition_misestimates_under_an_accurate_append_are_not_flagged():
+    plan = append(
+        [
+            scan("order_details_p2024_01", 1_000, 1_000),
+            # An empty, never analyzed partition is assumed to hold rows.
+            scan("order_details_pdefault", 0, 1_270),
+        ],
+        rows=1_000,
+        plan_rows=2_270,
+    )
+    assert flags(plan) == {
+        "Append": [],
+        "order_details_p2024_01": [],
+        "order_details_pdefault": [],
+    }
+
+
+def test_partition_misestimates_under_a_misestimated_append_are_flagged():
+    plan = append(
+        [
+            scan("order_details_p2024_01", 5_000, 100),
+            scan("order_details_p2024_02", 5_000, 100),
+        ],
+        rows=10_000,
+        plan_rows=200,
+    )
+    result = flags(plan)
+    assert result["Append"] == ["rows under-estimated 50x"]
+    assert result["order_details_p2024_01"] == ["rows under-estimated 50x"]
+
+
+def test_never_executed_nodes_are_not_compared():
+    plan = {
+        "Plan": {
+            "Node Type": "Nested Loop",
+            "Plan Rows": 10,
+            "Actual Rows": 10,
+            "Actual Loops": 1,
+            "Actual Total Time": 1.0,
+            "Plans": [
+                scan("orders", 10, 10, node="Index Scan"),
+                scan("order_details_p2024_03", 0, 5_000, loops=0, node="Index Scan"),
+            ],
+        }
+    }
+    assert flags(plan)["order_details_p2024_03"] == []
@@ -0,0 +1,48 @@
+"""SQL built for slices of the sales cube; no database needed."""
+
+import pytest
+
+import rollup
+
+
+def test_grouping_id_sets_a_bit_per_dimension_rolled_up():
+    assert rollup.grouping_id(rollup.DIMENSIONS) == 0
+    assert rollup.grouping_id(()) == 0b111
+    assert rollup.grouping_id(["category"]) == 0b101
+
+
+def test_grand_total():
+    sql, params = rollup.cube_query()
+    assert sql == (
+        "SELECT orders_count, units, revenue FROM public.sales_cube "
+        "WHERE grouping_id = :grouping_id"
+    )
+    assert params == {"grouping_id": 0b111}
+
+
+def test_breakdown_follows_dimension_order():
+    sql, params = rollup.cube_query(by=["segment", "month"])
+    assert sql.startswith("SELECT month, segment, orders_count")
+    assert sql.endswith("ORDER BY month, segment")
+    assert params == {"grouping_id": 0b010}
+
+
+def test_filtered_dimensions_join_the_breakdown():
+    sql, params = rollup.cube_query(by=["month"], filters={"category": "Books"})
+    assert "category = ANY(:category)" in sql
+    assert sql.endswith("ORDER BY month, category")
+    assert params == {"grouping_id": 0b001, "category": ["Books"]}
+
+
+@pytest.mark.parametrize(
+    "by, filters",
+    [
+        (["region"], None),
+        ([], {"region": "EU"}),
+        # Filter keys become SQL identifiers, so they are checked as well.
+        ([], {"category = category OR TRUE; --": "x"}),
+    ],
+)
+def test_unknown_dimensions_are_rejected(by, filters):
+    with pytest.raises(ValueError, match="Unknown cube dimensions"):
+        rollup.cube_query(by, filters)
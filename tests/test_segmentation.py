@@ -0,0 +1,55 @@
+"""RFM score SQL; the threshold ladder is evaluated with DuckDB when installed."""
+
+import pytest
+
+import segmentation
+
+
+def test_quantile_scores_use_cume_dist():
+    sql = segmentation.score_sql("quantile")
+    assert "CUME_DIST() OVER (ORDER BY recency_days DESC)" in sql
+    assert sql.endswith("AS m")
+
+
+@pytest.mark.parametrize(
+    "thresholds",
+    [
+        {"frequency": [1, 2, 3]},
+        {"monetary": [100, 50, 200, 300]},
+    ],
+)
+def test_thresholds_must_be_ascending_and_complete(thresholds):
+    with pytest.raises(ValueError, match="ascending thresholds"):
+        segmentation.score_sql("threshold", thresholds)
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError, match="Unknown segmentation method"):
+        segmentation.score_sql("kmeans")
+
+
+def test_segments_sql_checks_rules_in_order():
+    sql = segmentation.segments_sql("threshold")
+    positions = [sql.index(f"THEN '{name}'") for name in segmentation.SEGMENT_NAMES]
+    assert positions == sorted(positions)
+
+
+@pytest.mark.parametrize(
+    "recency_days, frequency, monetary, expected",
+    [
+        (10, 1, 100, (5, 1, 1)),
+        (30, 2, 500, (4, 2, 2)),
+        (200, 6, 2999.99, (2, 4, 3)),
+        (400, 25, 10_000, (1, 5, 5)),
+        (None, None, None, (None, None, None)),
+    ],
+)
+def test_threshold_scores(recency_days, frequency, monetary, expected):
+    duckdb = pytest.importorskip("duckdb")
+    sql = (
+        f"SELECT {segmentation.score_sql('threshold')} FROM "
+        "(SELECT ?::DOUBLE AS recency_days, ?::DOUBLE AS frequency, "
+        "?::DOUBLE AS monetary)"
+    )
+    row = duckdb.connect().execute(sql, [recency_days, frequency, monetary]).fetchone()
+    assert row == expected
@@ -0,0 +1,95 @@
+"""
+Checks for the SQL Runner. Statement classification and the row and byte
+caps need no database; the rest run against the configured database
+(secret.py or NORTHWIND_DATABASE_URL) and are skipped when none is reachable.
+"""
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import db
+import sql_runner
+
+
+@pytest.mark.parametrize(
+    "sql, streamed",
+    [
+        ("SELECT 1", True),
+        ("  with t AS (SELECT 1) SELECT * FROM t", True),
+        ("((SELECT 1) UNION (SELECT 2))", True),
+        ("VALUES (1)", True),
+        ("TABLE orders", True),
+        ("-- latest orders\n/* note */ SELECT 1", True),
+        ("EXPLAIN SELECT 1", False),
+        ("SHOW work_mem", False),
+        ("UPDATE orders SET total_amount = 0", False),
+        ("selection", False),
+    ],
+)
+def test_returns_cursor_rows(sql, streamed):
+    assert sql_runner.returns_cursor_rows(sql) is streamed
+
+
+def _chunk(rows):
+    return pd.DataFrame({"n": range(rows)})
+
+
+def test_keep_stops_at_max_rows():
+    run = sql_runner.QueryRun(None, "SELECT 1", max_rows=25)
+    assert run._keep(_chunk(10))
+    assert not run._keep(_chunk(20))
+    assert run.rows == 25 and run.truncated
+    assert len(run.result()) == 25
+
+
+def test_keep_stops_at_max_bytes():
+    chunk = _chunk(100)
+    chunk_bytes = int(chunk.memory_usage(index=True, deep=True).sum())
+    run = sql_runner.QueryRun(None, "SELECT 1", max_bytes=chunk_bytes * 3 // 2)
+    assert run._keep(chunk)
+    assert not run._keep(_chunk(100))
+    # Only the share of the second chunk that fits is kept.
+    assert run.truncated
+    assert 100 < run.rows < 200
+
+
+def test_result_without_rows_keeps_columns():
+    run = sql_runner.QueryRun(None, "SELECT 1")
+    run.columns = ["n"]
+    assert list(run.result().columns) == ["n"]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    try:
+        engine = db.get_engine()
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        pytest.skip(f"no database available: {e}")
+    return engine
+
+
+@pytest.mark.parametrize(
+    "sql, expected",
+    [
+        ("SELECT 'Abc' AS name WHERE 'Abc' LIKE 'A%'", [("Abc",)]),
+        ("SELECT 10 % 7 AS remainder", [(3,)]),
+        ("VALUES ('100%')", [("100%",)]),
+    ],
+)
+def test_percent_is_not_a_placeholder(engine, sql, expected):
+    run = sql_runner.QueryRun(engine, sql).start()
+    assert run.wait(30)
+    assert run.status == "done", run.error
+    assert [tuple(row) for row in run.result().itertuples(index=False)] == expected
+
+
+def test_statement_without_rows_reports_rowcount(engine):
+    run = sql_runner.QueryRun(
+        engine, "CREATE TEMP TABLE t_pct AS SELECT 1 AS x"
+    ).start()
+    assert run.wait(30)
+    assert run.status == "done", run.error
+    assert run.columns is None
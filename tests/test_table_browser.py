@@ -0,0 +1,94 @@
+"""
+Page queries built by TableBrowser, checked without a database: the
+catalog entry is passed in and only the SQL is inspected.
+"""
+
+import pytest
+
+from table_browser import TableBrowser
+
+PARTITIONED_ORDERS = {
+    "columns": [
+        {"name": "order_id", "type": "integer"},
+        {"name": "customer_id", "type": "integer"},
+        {"name": "order_date", "type": "date"},
+        {"name": "total_amount", "type": "numeric"},
+    ],
+    # A partitioned load adds the partition key to the primary key.
+    "primary_key": ["order_id", "order_date"],
+    "estimated_rows": 5000,
+}
+
+
+def browser(**options):
+    return TableBrowser(None, "orders", info=PARTITIONED_ORDERS, **options)
+
+
+def test_sort_by_later_key_column_goes_first():
+    pages = browser(sort="order_date")
+    assert pages._order_columns() == ["order_date", "order_id"]
+    sql, _ = pages._query(None)
+    assert sql.endswith(
+        'ORDER BY "order_date" ASC NULLS LAST, "order_id" ASC NULLS LAST LIMIT :limit'
+    )
+
+
+def test_sort_by_later_key_column_pages_by_sort_then_key():
+    pages = browser(sort="order_date", descending=True)
+    sql, params = pages._query(("2024-05-12", 7))
+    assert '(("order_date", "order_id") < (:k0, :k1) OR "order_date" IS NULL)' in sql
+    assert params == {"limit": 51, "k0": "2024-05-12", "k1": 7}
+
+
+def test_sort_by_leading_key_column_keeps_key_order():
+    pages = browser(sort="order_id", descending=True)
+    assert pages._order_columns() == ["order_id", "order_date"]
+    sql, _ = pages._query((10, "2024-01-01"))
+    assert 'WHERE ("order_id", "order_date") < (:k0, :k1)' in sql
+
+
+def test_first_page_orders_by_key():
+    sql, params = browser()._query(None)
+    assert sql == (
+        'SELECT * FROM public."orders" '
+        'ORDER BY "order_id" ASC NULLS LAST, "order_date" ASC NULLS LAST LIMIT :limit'
+    )
+    assert params == {"limit": 51}
+
+
+def test_sort_by_other_column_after_null_sort_value():
+    pages = browser(sort="customer_id")
+    assert pages._order_columns() == ["customer_id", "order_id", "order_date"]
+    sql, params = pages._query((None, 7, "2024-05-12"))
+    assert (
+        ' WHERE "customer_id" IS NULL AND ("order_id", "order_date") > (:k1, :k2)'
+        in sql
+    )
+    assert params == {"limit": 51, "k0": None, "k1": 7, "k2": "2024-05-12"}
+
+
+def test_unknown_sort_column_is_rejected():
+    with pytest.raises(ValueError, match="Unknown column"):
+        browser(sort="missing")
+
+
+def test_table_without_key_pages_by_offset():
+    info = {
+        "columns": [
+            {"name": "id", "type": "integer"},
+            {"name": "payload", "type": "json"},
+            {"name": "label", "type": "text"},
+        ],
+        "primary_key": [],
+        "estimated_rows": 10,
+    }
+    pages = TableBrowser(None, "events", page_size=10, sort="label", info=info)
+    assert not pages.keyset
+    pages.page_starts.append(None)
+    sql, params = pages._query(None)
+    # json cannot be ordered, so it is left out of the tie-breakers.
+    assert sql == (
+        'SELECT * FROM public."events" ORDER BY "label" ASC NULLS LAST, "id" '
+        "LIMIT :limit OFFSET :offset"
+    )
+    assert params == {"limit": 11, "offset": 10}
@@ -0,0 +1,219 @@
+"""
+Data-quality and referential-integrity checks run by etl_northwind.py
+between transform and load.
+
+Every chunk goes through one vectorized pass: null checks, number checks
+on money columns (read as text), range checks and foreign-key membership
+tests against hashed indexes of the parent tables'
+keys. Rows failing any rule are dropped from the load and appended to a
+per-table reject CSV together with the first rule they broke. For
+order_details, line totals are also summed per order across all chunks and
+reconciled against orders.total_amount once the table is done; mismatches
+are reported (the orders are already loaded) rather than quarantined.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from mylogger import logger
+
+# Default directory for reject files, one CSV per table.
+REJECT_DIR = "rejects"
+
+# Largest difference between an order's total_amount and the sum of its
+# lines that is still treated as equal (rounding of money values).
+TOTAL_TOLERANCE = 0.01
+
+# Checks per table:
+#   not_null     - columns that must have a value
+#   ranges       - column -> (minimum, maximum), either bound may be None;
+#                  text columns must also parse as numbers
+#   foreign_keys - column -> (parent table, parent key column)
+RULES = {
+    "customers": {
+        "not_null": ["customer_id", "name", "email", "registration_date"],
+        "ranges": {},
+        "foreign_keys": {},
+    },
+    "products": {
+        "not_null": ["product_id", "name", "category", "price"],
+        "ranges": {"price": (0, None), "stock_quantity": (0, None)},
+        "foreign_keys": {},
+    },
+    "orders": {
+        "not_null": ["order_id", "customer_id", "order_date", "total_amount"],
+        "ranges": {"total_amount": (0, None)},
+        "foreign_keys": {"customer_id": ("customers", "customer_id")},
+    },
+    "order_details": {
+        "not_null": [
+            "order_item_id",
+            "order_id",
+            "product_id",
+            "quantity",
+            "price_at_order",
+        ],
+        "ranges": {"quantity": (1, None), "price_at_order": (0, None)},
+        "foreign_keys": {
+            "order_id": ("orders", "order_id"),
+            "product_id": ("products", "product_id"),
+        },
+    },
+}
+
+
+class TableValidator:
+    """
+    Validates the chunks of one table. Parent keys are read from the
+    database once, when the validator is created, so the parent tables must
+    already be loaded.
+    """
+
+    def __init__(self, engine, table_name, reject_dir=REJECT_DIR, reconcile=True):
+        self.table_name = table_name
+        self.rules = RULES.get(table_name, {})
+        self.reject_path = os.path.join(reject_dir, f"{table_name}.csv")
+        self.reject_dir = reject_dir
+        self.counts = {}
+        self.checked = 0
+        self._rejects_written = False
+        self.mismatch_path = os.path.join(reject_dir, "order_total_mismatches.csv")
+        # Reports from a previous run would be mistaken for this run's.
+        stale = [self.reject_path]
+        if table_name == "order_details":
+            stale.append(self.mismatch_path)
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+
+        # Hashed indexes of each parent table's keys for FK membership tests.
+        self.parent_keys = {}
+        for column, (parent, key) in self.rules.get("foreign_keys", {}).items():
+            try:
+                keys = pd.read_sql_query(f"SELECT {key} FROM public.{parent}", engine)
+                self.parent_keys[column] = pd.Index(keys[key].to_numpy()).unique()
+            except Exception as e:
+                logger.warning(
+                    f"Skipping {column} foreign key check ({parent} not readable): {e}"
+                )
+
+        # Order totals to reconcile line sums against (order_details only),
+        # held in dense arrays indexed by order_id so each chunk's lines are
+        # accumulated in O(rows) with np.add.at.
+        self.order_totals = None
+        if reconcile and table_name == "order_details":
+            try:
+                totals = pd.read_sql_query(
+                    "SELECT order_id, total_amount FROM public.orders", engine
+                )
+                size = int(totals["order_id"].max()) + 1 if len(totals) else 0
+                self.order_totals = np.full(size, np.nan)
+                self.order_totals[totals["order_id"].to_numpy()] = totals[
+                    "total_amount"
+                ].astype("float64")
+                self.line_totals = np.zeros(size)
+                self.has_lines = np.zeros(size, dtype=bool)
+            except Exception as e:
+                logger.warning(f"Skipping order total reconciliation: {e}")
+
+    def validate(self, df):
+        """
+        Check one chunk in a single vectorized pass. Returns the rows that
+        passed; failing rows are written to the reject file.
+        """
+        checks = []
+        for column in self.rules.get("not_null", []):
+            checks.append((f"null_{column}", df[column].isna().to_numpy()))
+        for column, (low, high) in self.rules.get("ranges", {}).items():
+            values = df[column]
+            if values.dtype == object:
+                numbers = pd.to_numeric(values, errors="coerce")
+                invalid = (numbers.isna() & values.notna()).to_numpy()
+                checks.append((f"invalid_{column}", invalid))
+                values = numbers
+            failed = np.zeros(len(df), dtype=bool)
+            if low is not None:
+                failed |= (values < low).to_numpy(dtype=bool, na_value=False)
+            if high is not None:
+                failed |= (values > high).to_numpy(dtype=bool, na_value=False)
+            checks.append((f"range_{column}", failed))
+        for column, index in self.parent_keys.items():
+            keys = df[column].to_numpy(dtype="int64", na_value=-1)
+            missing = index.get_indexer(keys) == -1
+            checks.append((f"missing_{column}", missing))
+
+        self.checked += len(df)
+        if checks:
+            names = [name for name, _ in checks]
+            masks = [mask for _, mask in checks]
+            rejected = np.logical_or.reduce(masks)
+        else:
+            rejected = np.zeros(len(df), dtype=bool)
+
+        if rejected.any():
+            # Report the first rule each rejected row broke.
+            reasons = np.select(masks, names, default="")
+            bad = df[rejected].assign(reject_reason=reasons[rejected])
+            for reason, count in bad["reject_reason"].value_counts().items():
+                self.counts[reason] = self.counts.get(reason, 0) + int(count)
+            self._write_rejects(bad, self.reject_path)
+            df = df[~rejected]
+
+        if self.order_totals is not None and not df.empty:
+            order_ids = df["order_id"].to_numpy(dtype="int64")
+            known = order_ids < len(self.order_totals)
+            amounts = (df["quantity"] * pd.to_numeric(df["price_at_order"])).to_numpy(
+                dtype="float64"
+            )
+            np.add.at(self.line_totals, order_ids[known], amounts[known])
+            self.has_lines[order_ids[known]] = True
+        return df
+
+    def _write_rejects(self, df, path):
+        os.makedirs(self.reject_dir, exist_ok=True)
+        first = not self._rejects_written
+        df.to_csv(path, mode="w" if first else "a", header=first, index=False)
+        self._rejects_written = True
+
+    def finish(self):
+        """
+        Reconcile order totals (for order_details), print the table's
+        validation summary and return the number of rejected rows.
+        """
+        rejected = sum(self.counts.values())
+        if self.order_totals is not None:
+            order_ids = np.flatnonzero(self.has_lines)
+            expected = self.order_totals[order_ids]
+            line_total = self.line_totals[order_ids].round(2)
+            difference = (expected - line_total).round(2)
+            mismatched = np.abs(difference) > TOTAL_TOLERANCE
+            if mismatched.any():
+                report = pd.DataFrame(
+                    {
+                        "order_id": order_ids[mismatched],
+                        "total_amount": expected[mismatched],
+                        "line_total": line_total[mismatched],
+                        "difference": difference[mismatched],
+                    }
+                )
+                os.makedirs(self.reject_dir, exist_ok=True)
+                report.to_csv(self.mismatch_path, index=False)
+                logger.warning(
+                    f"Validation: {int(mismatched.sum())} orders have a total_amount "
+                    f"that differs from the sum of their lines "
+                    f"(see {self.mismatch_path})."
+                )
+
+        if rejected:
+            details = ", ".join(f"{k}={v}" for k, v in sorted(self.counts.items()))
+            logger.warning(
+                f"Validation: rejected {rejected} of {self.checked} rows from "
+                f"{self.table_name} ({details}); see {self.reject_path}."
+            )
+        else:
+            logger.info(
+                f"Validation: all {self.checked} rows of {self.table_name} passed."
+            )
+        return rejected